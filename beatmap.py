@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+beatmap.py
+
+Compiled Rhythm beatmaps.
+
+gameMode3 used to read the chart CSV (beat_index,time_s,pad) with csv.reader
+on every launch, build a dict per beat and sort them. load() now compiles
+the CSV once into a flat binary file and maps that file on later launches;
+the Rhythm loop reads the columns straight out of the mapping.
+
+Compiled file (little-endian):
+
+  header   struct "<4sHHIddqq20s", 64 bytes
+             magic          b"FFBM"
+             version        2
+             flags          0
+             n              beats
+             offset_s       chart offset added to every time_s
+             beat_offset_s  how long a note is shown before it is due
+             src_mtime_ns   CSV mtime when compiled
+             src_size       CSV size
+             src_sha1       CSV digest
+  columns  sorted by t_appear, then t_hit (see note_lanes.py)
+             t_hit     float64[n]   time_s + offset_s, >= 0
+             t_appear  float64[n]   max(0, t_hit - beat_offset_s)
+             beat      int32[n]
+             pad       uint8[n]
+
+The compiled file is reused while it was built with the same offsets from a
+CSV with the same mtime and size; when only the mtime moved, the digest
+decides (and the header is brought up to date). Anything else recompiles.
+
+Compiled files live in BEATMAP_CACHE_DIR (default ~/.cache/fitfighter/beatmaps),
+named after the CSV's absolute path.
+
+The chart offset (where beat 0 of the CSV sits in the audio file) belongs
+to the chart, not to the cabinet; per-rig latency is rig_calibration.py's.
+It comes from, in order: the start command (the kiosk's csvOffset), a
+"# offset_s=1.12" line above the CSV header (`python3 beatmap.py chart.csv
+--set-offset 1.12` writes one), the offsets of the charts that shipped
+before that line existed, or 0.
+"""
+
+import csv
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"FFBM"
+VERSION = 2
+HEADER = struct.Struct("<4sHHIddqq20s")
+CSV_HEADER = ["beat_index", "time_s", "pad"]
+CACHE_DIR = os.getenv("BEATMAP_CACHE_DIR", os.path.expanduser("~/.cache/fitfighter/beatmaps"))
+
+# charts that predate the "# offset_s=" line
+LEGACY_OFFSETS = {
+    "Daikirai_Beatmap.csv": 1.73,
+    "Shape_of_You_Beatmap.csv": 1.12,
+    "PPPP.csv": 1.19,
+}
+
+# column (name, memoryview format, item size), in file order
+COLUMNS = (("t_hit", "d", 8), ("t_appear", "d", 8), ("beat", "i", 4), ("pad", "B", 1))
+
+
+class Beatmap:
+    """Column views of a compiled beatmap: t_hit[i], t_appear[i], beat[i], pad[i]."""
+
+    def __init__(self, buf, n, offset_s, beat_offset_s, source=None, mm=None):
+        self.n = n
+        self.offset_s = offset_s
+        self.beat_offset_s = beat_offset_s
+        self.source = source             # "compiled" | "cached" | "csv" | None
+        self._mm = mm
+        self._views = []
+        pos = HEADER.size
+        for name, fmt, size in COLUMNS:
+            view = memoryview(buf)[pos:pos + n * size].cast(fmt)
+            self._views.append(view)
+            setattr(self, name, view)
+            pos += n * size
+
+    def __len__(self):
+        return self.n
+
+    @classmethod
+    def empty(cls, offset_s=0.0, beat_offset_s=0.0):
+        return cls(_pack([], offset_s, beat_offset_s, 0, 0, b"\0" * 20), 0, offset_s, beat_offset_s)
+
+    def close(self):
+        for view in self._views: view.release()
+        self._views = []
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+# ------------------------------
+# Compile
+# ------------------------------
+def parse_meta(lines):
+    """{key: value} from the "# key=value" lines above the CSV header."""
+    meta = {}
+    for line in lines:
+        line = line.strip()
+        if not line.startswith("#"): break
+        key, sep, value = line[1:].partition("=")
+        if sep: meta[key.strip()] = value.strip()
+    return meta
+
+
+def chart_offset(csv_path):
+    """The chart's own offset: its "# offset_s=" line, else LEGACY_OFFSETS, else 0."""
+    with open(csv_path, encoding="utf-8-sig") as f:
+        head = []
+        for line in f:
+            head.append(line)
+            if not line.lstrip().startswith("#"): break
+    value = parse_meta(head).get("offset_s")
+    try:
+        return float(value) if value is not None else LEGACY_OFFSETS.get(os.path.basename(csv_path), 0.0)
+    except ValueError:
+        raise ValueError(f"{csv_path}: bad offset_s '{value}'")
+
+
+def set_offset(csv_path, offset_s):
+    """Write (or replace) the CSV's "# offset_s=" line."""
+    with open(csv_path, encoding="utf-8-sig") as f:
+        lines = f.readlines()
+    k = 0
+    while k < len(lines) and lines[k].lstrip().startswith("#"): k += 1
+    meta = [l for l in lines[:k] if l[1:].partition("=")[0].strip() != "offset_s"]
+    tmp = f"{csv_path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.writelines(meta + [f"# offset_s={offset_s:g}\n"] + lines[k:])
+    os.replace(tmp, csv_path)
+
+
+def parse_csv(data, offset_s, beat_offset_s):
+    """(t_hit, t_appear, beat, pad) rows from CSV bytes, sorted by t_appear and t_hit."""
+    lines = data.decode("utf-8-sig").splitlines()
+    k = 0
+    while k < len(lines) and lines[k].lstrip().startswith("#"): k += 1
+    r = csv.reader(lines[k:])
+    header = next(r, None)
+    if not header or [h.strip().lower() for h in header] != CSV_HEADER:
+        raise ValueError("[Mode 3] CSV must have header: beat_index,time_s,pad")
+    rows, bad_pads = [], []
+    for row in r:
+        if len(row) < 3: continue
+        pad = int(row[2])
+        if not 1 <= pad <= 8:
+            bad_pads.append(r.line_num + k)         # the rig has pads 1..8; the note is skipped
+            continue
+        t_hit = max(0.0, float(row[1]) + offset_s)
+        rows.append((t_hit, max(0.0, t_hit - beat_offset_s), int(row[0]), pad))
+    if bad_pads:
+        print(f"[beatmap] skipped {len(bad_pads)} row(s) with a pad outside 1..8 (line {bad_pads[0]}"
+              + (" ..." if len(bad_pads) > 1 else "") + ")")
+    # by t_appear, then t_hit (ties at t_appear 0): each pad's notes come due in order
+    rows.sort(key=lambda e: (e[1], e[0]))
+    return rows
+
+
+def _pack(rows, offset_s, beat_offset_s, mtime_ns, size, digest):
+    out = bytearray(HEADER.pack(MAGIC, VERSION, 0, len(rows), offset_s, beat_offset_s, mtime_ns, size, digest))
+    for i, (_, fmt, _) in enumerate(COLUMNS):
+        out += struct.pack(f"<{len(rows)}{fmt}", *(row[i] for row in rows))
+    return out
+
+
+def cache_path(csv_path, cache_dir=None):
+    key = hashlib.sha1(os.path.abspath(csv_path).encode()).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir or CACHE_DIR, f"{name}-{key}.ffbm")
+
+
+def compile_csv(csv_path, out_path, offset_s=0.0, beat_offset_s=1.0):
+    with open(csv_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        data = f.read()
+    rows = parse_csv(data, offset_s, beat_offset_s)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_pack(rows, offset_s, beat_offset_s, st.st_mtime_ns, st.st_size, hashlib.sha1(data).digest()))
+    os.replace(tmp, out_path)
+    return len(rows)
+
+
+# ------------------------------
+# Load
+# ------------------------------
+def _header(path):
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(raw) != HEADER.size:
+        return None
+    h = HEADER.unpack(raw)
+    return h if h[0] == MAGIC and h[1] == VERSION else None
+
+
+def _current(out_path, csv_path, offset_s, beat_offset_s):
+    """True if out_path can be used for csv_path as it is now."""
+    h = _header(out_path)
+    if h is None:
+        return False
+    _, _, _, n, off, beat_off, mtime_ns, size, digest = h
+    if off != offset_s or beat_off != beat_offset_s:
+        return False
+    st = os.stat(csv_path)
+    if st.st_size != size:
+        return False
+    if st.st_mtime_ns == mtime_ns:
+        return os.path.getsize(out_path) == HEADER.size + n * sum(c[2] for c in COLUMNS)
+    with open(csv_path, "rb") as f:
+        if hashlib.sha1(f.read()).digest() != digest:
+            return False
+    # touched, not changed: keep the compiled file, remember the new mtime
+    try:
+        with open(out_path, "r+b") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, n, off, beat_off, st.st_mtime_ns, size, digest))
+    except OSError:
+        pass
+    return True
+
+
+def _in_memory(csv_path, offset_s, beat_offset_s):
+    with open(csv_path, "rb") as f:
+        rows = parse_csv(f.read(), offset_s, beat_offset_s)
+    return Beatmap(_pack(rows, offset_s, beat_offset_s, 0, 0, b"\0" * 20), len(rows), offset_s, beat_offset_s, "csv")
+
+
+def load(csv_path, offset_s=None, beat_offset_s=1.0, cache_dir=None):
+    """Beatmap for csv_path, compiled on first use and mapped read-only afterwards.
+
+    offset_s None means the chart's own offset (chart_offset()).
+    """
+    offset_s = chart_offset(csv_path) if offset_s is None else float(offset_s)
+    beat_offset_s = float(beat_offset_s)
+    if sys.byteorder != "little":
+        return _in_memory(csv_path, offset_s, beat_offset_s)      # the columns are little-endian
+    out_path = cache_path(csv_path, cache_dir)
+    source = "cached"
+    if not _current(out_path, csv_path, offset_s, beat_offset_s):
+        try:
+            compile_csv(csv_path, out_path, offset_s, beat_offset_s)
+        except OSError as e:
+            print(f"[beatmap] cannot write {out_path} ({e}); using the CSV directly")
+            return _in_memory(csv_path, offset_s, beat_offset_s)
+        source = "compiled"
+    with open(out_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    n = HEADER.unpack_from(mm)[3]
+    return Beatmap(mm, n, offset_s, beat_offset_s, source, mm)
+
+
+if __name__ == "__main__":
+    # python3 beatmap.py <csv> [--set-offset S]   compile (or check) one chart
+    if len(sys.argv) > 3 and sys.argv[2] == "--set-offset":
+        set_offset(sys.argv[1], float(sys.argv[3]))
+    bm = load(sys.argv[1])
+    print(f"{len(bm)} beats, offset {bm.offset_s:+g}s ({bm.source}) -> {cache_path(sys.argv[1])}")
+    bm.close()
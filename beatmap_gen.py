@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+beatmap_gen.py
+
+Rhythm chart generator: audio file in, beat_index,time_s,pad CSV out, ready
+for gameMode3 (beatmap.py loads it like a hand-authored chart).
+
+USAGE
+  python3 beatmap_gen.py <audio> [--difficulty intermediate] [--out CSV]
+                         [--force] [--json]
+
+The launcher runs it for a "generate" control action (mqtt_pi_game.py).
+
+Analysis (numpy, streaming: the audio is read in CHUNK_S pieces, so memory
+stays flat whatever the track length):
+  decode     WAV with the wave module, anything else through ffmpeg; mixed
+             to mono and decimated to about ANALYSIS_SR
+  STFT       N_FFT-point Hann frames every HOP samples, log-compressed
+             magnitudes; the last frame of a chunk carries over
+  flux       half-wave rectified spectral flux per frame, in total and for
+             the low (< LOW_HZ) and high (>= HIGH_HZ) bands
+  onsets     flux peaks above a moving mean, refined to sub-frame time
+  tempo      autocorrelation of the flux over 70..190 bpm, summed over the
+             first TEMPO_HARMONICS multiples of each lag (so a 3/2 beat
+             hat / kick pattern does not pass for the beat) and weighted
+             towards ~120 bpm; beats are then tracked along the grid, each
+             snapped to nearby flux so a live drummer's drift is followed
+
+The analysis of a track is cached by the SHA-1 of the audio file in
+BEATMAP_GEN_CACHE_DIR (default ~/.cache/fitfighter/analysis), so each
+difficulty after the first only costs the charting step.
+
+Charting, per DIFFICULTIES: onsets are snapped to the beat grid (divided into
+`subdiv` steps), ranked by strength (on-beat first) and the top `keep`
+fraction is kept with at least `min_gap_beats` (and MIN_GAP_S) between notes.
+Pads follow the punch layout of gameMode1 (1-3 jabs, 4/6 hooks, 5 uppercut,
+7/8 body shots):
+  - low-band hits (kicks) go to body shots / uppercut, high-band hits
+    (snares, hats) to jabs, the rest to hooks (falling back to the nearest
+    pads in play on easier difficulties)
+  - a strong hit on a bar's downbeat is a power punch (uppercut, or the
+    straight jab where that pad is not in play)
+  - notes less than a beat apart never repeat a pad and switch hands; no
+    pad gets more than MAX_REPEAT notes in a row
+  - ties are broken by an RNG seeded from the audio hash, so a track always
+    gives the same chart
+
+The CSV starts with "# key=value" metadata (generator, difficulty, bpm,
+audio_sha1, offset_s=0: generated times are audio times). An existing CSV
+without the generator line is hand-authored and is only replaced with
+--force.
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import beatmap
+
+GENERATOR = "beatmap_gen v1"
+ANALYSIS_VERSION = 1
+CACHE_DIR = os.getenv("BEATMAP_GEN_CACHE_DIR", os.path.expanduser("~/.cache/fitfighter/analysis"))
+
+ANALYSIS_SR = 11025
+N_FFT = 512
+HOP = 128
+CHUNK_S = 10.0
+GAMMA = 100.0           # log compression: log1p(GAMMA * |X|)
+LOW_HZ = 200.0
+HIGH_HZ = 2500.0
+ONSET_BIAS_S = 0.008    # a sharp onset peaks the flux this long before the frame centre reaches it
+PEAK_HALF_S = 0.035     # onset = flux maximum within +-this
+MEAN_HALF_S = 0.5       # ... and above the moving mean over +-this
+MIN_ONSET_GAP_S = 0.05
+BPM_MIN, BPM_MAX, BPM_PRIOR = 70.0, 190.0, 120.0
+TEMPO_HARMONICS = 4
+SNAP_FRAC = 0.1         # a tracked beat moves at most this fraction of a beat
+
+LEAD_IN_S = 1.5         # no notes before this (they show BEAT_OFFSET early)
+MIN_GAP_S = 0.15        # fastest punch rate on any difficulty
+
+PADS_LEFT, PADS_RIGHT = (1, 4, 7), (3, 6, 8)
+PADS_BY_BAND = {"low": (7, 8, 5, 4, 6), "mid": (4, 6, 5, 2), "high": (1, 3, 2)}     # by preference
+BAND_CHOICES = 3        # the first this many band pads in play are candidates
+MAX_REPEAT = 2          # never more than this many notes in a row on one pad
+DIFFICULTIES = {
+    "beginner":     {"subdiv": 1, "keep": 0.50, "min_gap_beats": 1.0,  "pads": (1, 2, 3)},
+    "intermediate": {"subdiv": 2, "keep": 0.60, "min_gap_beats": 0.5,  "pads": (1, 2, 3, 4, 6)},
+    "advanced":     {"subdiv": 2, "keep": 0.85, "min_gap_beats": 0.5,  "pads": (1, 2, 3, 4, 5, 6)},
+    "expert":       {"subdiv": 4, "keep": 0.90, "min_gap_beats": 0.25, "pads": (1, 2, 3, 4, 5, 6, 7, 8)},
+}
+SUB_WEIGHT = (1.0, 0.7, 0.85, 0.7)      # on the beat, 1/4, 1/2, 3/4 (by position in 4)
+
+
+# ------------------------------
+# Decode
+# ------------------------------
+def sha1_file(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _wav_chunks(path):
+    """(sample_rate, iterator of mono float32 chunks) for a PCM WAV."""
+    w = wave.open(path, "rb")
+    sr, ch, width = w.getframerate(), w.getnchannels(), w.getsampwidth()
+    if width not in (1, 2, 3, 4):
+        w.close()
+        raise ValueError(f"{path}: unsupported sample width {width}")
+
+    def chunks():
+        with w:
+            while True:
+                data = w.readframes(int(CHUNK_S * sr))
+                if not data:
+                    return
+                if width == 1:
+                    x = np.frombuffer(data, np.uint8).astype(np.float32) - 128.0
+                elif width == 3:
+                    b = np.frombuffer(data, np.uint8).reshape(-1, 3)
+                    x = (b[:, 0].astype(np.int32) | (b[:, 1].astype(np.int32) << 8)
+                         | (b[:, 2].astype(np.int8).astype(np.int32) << 16)).astype(np.float32)
+                else:
+                    x = np.frombuffer(data, "<i2" if width == 2 else "<i4").astype(np.float32)
+                yield x.reshape(-1, ch).mean(axis=1) / float(1 << (8 * width - 1))
+    return sr, chunks()
+
+
+def _ffmpeg_chunks(path):
+    """Anything ffmpeg reads, as mono 16-bit at ANALYSIS_SR."""
+    if not shutil.which("ffmpeg"):
+        raise ValueError(f"{path}: not a WAV file and ffmpeg is not installed")
+    proc = subprocess.Popen(["ffmpeg", "-v", "error", "-i", path, "-f", "s16le", "-ac", "1",
+                             "-ar", str(ANALYSIS_SR), "-"], stdout=subprocess.PIPE)
+
+    def chunks():
+        try:
+            while True:
+                data = proc.stdout.read(2 * int(CHUNK_S * ANALYSIS_SR))
+                if not data:
+                    break
+                yield np.frombuffer(data[:len(data) & ~1], "<i2").astype(np.float32) / 32768.0
+        finally:
+            proc.stdout.close()
+            if proc.wait() != 0:
+                raise ValueError(f"{path}: ffmpeg failed (rc={proc.returncode})")
+    return ANALYSIS_SR, chunks()
+
+
+def read_audio(path):
+    """(analysis sample rate, iterator of mono float32 chunks at that rate)."""
+    try:
+        sr, chunks = _wav_chunks(path)
+    except (wave.Error, EOFError):
+        sr, chunks = _ffmpeg_chunks(path)
+    q = max(1, int(round(sr / ANALYSIS_SR)))
+    if q == 1:
+        return float(sr), chunks
+
+    def decimated():
+        # boxcar average over q samples: crude, but only onsets matter here
+        rest = np.zeros(0, np.float32)
+        for x in chunks:
+            x = np.concatenate((rest, x))
+            n = len(x) // q * q
+            rest = x[n:]
+            yield x[:n].reshape(-1, q).mean(axis=1)
+    return sr / q, decimated()
+
+
+# ------------------------------
+# Analysis
+# ------------------------------
+def spectral_flux(chunks, sr):
+    """Per-frame flux (total, low band, high band) over the whole stream."""
+    window = np.hanning(N_FFT).astype(np.float32)
+    freqs = np.fft.rfftfreq(N_FFT, 1.0 / sr)
+    low, high = freqs < LOW_HZ, freqs >= HIGH_HZ
+    carry = np.zeros(N_FFT - HOP, np.float32)
+    prev = None
+    out = ([], [], [])
+    for x in chunks:
+        buf = np.concatenate((carry, x))
+        n = (len(buf) - N_FFT) // HOP + 1
+        if n <= 0:
+            carry = buf
+            continue
+        frames = sliding_window_view(buf, N_FFT)[::HOP][:n]
+        mag = np.log1p(GAMMA * np.abs(np.fft.rfft(frames * window, axis=1))).astype(np.float32)
+        d = np.diff(mag, axis=0, prepend=mag[:1] if prev is None else prev)
+        np.maximum(d, 0.0, out=d)
+        out[0].append(d.sum(axis=1))
+        out[1].append(d[:, low].sum(axis=1))
+        out[2].append(d[:, high].sum(axis=1))
+        prev = mag[-1:]
+        carry = buf[n * HOP:]
+    if not out[0]:
+        return np.zeros(0, np.float32), np.zeros(0, np.float32), np.zeros(0, np.float32)
+    return tuple(np.concatenate(parts) for parts in out)
+
+
+def _moving_mean(x, half):
+    c = np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+    i = np.arange(len(x))
+    lo, hi = np.maximum(i - half, 0), np.minimum(i + half + 1, len(x))
+    return (c[hi] - c[lo]) / (hi - lo)
+
+
+def pick_onsets(flux, fps):
+    """(frame positions (float), strengths) of the onset peaks in flux."""
+    if len(flux) < 3:
+        return np.zeros(0), np.zeros(0)
+    half = max(1, int(round(PEAK_HALF_S * fps)))
+    padded = np.pad(flux, half, mode="constant", constant_values=-np.inf)
+    local_max = sliding_window_view(padded, 2 * half + 1).max(axis=1)
+    thresh = _moving_mean(flux, int(MEAN_HALF_S * fps)) + 0.1 * flux.std()
+    k = np.flatnonzero((flux == local_max) & (flux > thresh))
+    k = k[(k > 0) & (k < len(flux) - 1)]
+    # parabolic interpolation around each peak
+    a, b, c = flux[k - 1], flux[k], flux[k + 1]
+    den = a - 2.0 * b + c
+    frac = np.where(den < 0, 0.5 * (a - c) / np.where(den < 0, den, 1.0), 0.0)
+    pos, strength = k + np.clip(frac, -0.5, 0.5), b - thresh[k]
+    keep, last = [], -np.inf
+    for j, p in enumerate(pos):
+        if p - last >= MIN_ONSET_GAP_S * fps:
+            keep.append(j); last = p
+        elif strength[j] > strength[keep[-1]]:
+            keep[-1] = j; last = p
+    return pos[keep], strength[keep]
+
+
+def estimate_period(flux, fps):
+    """Beat period in frames, from the autocorrelation of the flux."""
+    x = flux - flux.mean()
+    n = len(x)
+    spec = np.fft.rfft(x, 2 * n)
+    ac = np.fft.irfft(spec * np.conj(spec))[:n]
+    lag_lo, lag_hi = int(60.0 * fps / BPM_MAX), int(np.ceil(60.0 * fps / BPM_MIN))
+    if TEMPO_HARMONICS * (lag_hi + 1) >= n:
+        return 60.0 * fps / BPM_PRIOR
+    lags = np.arange(lag_lo, lag_hi + 1)
+    prior = np.exp(-0.5 * np.log2(lags / (60.0 * fps / BPM_PRIOR)) ** 2)
+    score = sum(ac[h * lags] for h in range(1, TEMPO_HARMONICS + 1)) * prior
+    k = int(np.argmax(score))
+    if 0 < k < len(lags) - 1:
+        a, b, c = score[k - 1], score[k], score[k + 1]
+        den = a - 2.0 * b + c
+        return lags[k] + (0.5 * (a - c) / den if den < 0 else 0.0)
+    return float(lags[k])
+
+
+def track_beats(flux, period):
+    """Beat positions in frames: the best-fitting grid, each beat snapped to nearby flux."""
+    n = len(flux)
+    m = int(n / period)
+    if m < 2:
+        return np.zeros(0)
+    phases = np.arange(int(period))
+    grid = (phases[:, None] + period * np.arange(m)[None, :]).astype(int)
+    grid = np.minimum(grid, n - 1)
+    t = float(phases[int(np.argmax(flux[grid].sum(axis=1)))])
+    reach = max(1, int(SNAP_FRAC * period))
+    beats = []
+    while t < n:
+        lo, hi = max(0, int(t) - reach), min(n, int(t) + reach + 1)
+        seg = flux[lo:hi]
+        if len(seg) and seg.max() > 0:
+            # prefer flux near the expected beat
+            w = np.exp(-0.5 * ((np.arange(lo, hi) - t) / reach) ** 2)
+            snapped = lo + int(np.argmax(seg * w))
+            t = 0.5 * (t + snapped)
+        beats.append(t)
+        t += period
+    return np.array(beats)
+
+
+def analyse(audio_path, digest=None, cache_dir=None):
+    """Onsets, band shares and beat grid of audio_path (cached by the file's SHA-1)."""
+    digest = digest or sha1_file(audio_path)
+    cache_dir = cache_dir or CACHE_DIR
+    path = os.path.join(cache_dir, f"{digest}-v{ANALYSIS_VERSION}.npz")
+    try:
+        with np.load(path) as z:
+            return {k: z[k] for k in z.files}, True
+    except (OSError, ValueError):
+        pass
+
+    sr, chunks = read_audio(audio_path)
+    flux, low, high = spectral_flux(chunks, sr)
+    fps = sr / HOP
+    pos, strength = pick_onsets(flux, fps)
+    period = estimate_period(flux, fps) if len(flux) else 60.0 * fps / BPM_PRIOR
+    beats = track_beats(flux, period)
+    if len(beats) > 1:
+        period = float(np.median(np.diff(beats)))
+    # band share of the flux around each onset
+    k = np.clip(np.round(pos).astype(int), 0, max(0, len(flux) - 1))
+    total = flux[k] + 1e-9 if len(flux) else np.zeros(0)
+    # frame f is centred on sample f * HOP + HOP - N_FFT / 2 (the stream starts with N_FFT - HOP zeros)
+    to_s = lambda f: (np.asarray(f) * HOP + HOP - N_FFT / 2) / sr + ONSET_BIAS_S
+    result = {
+        "onset_s": to_s(pos), "strength": strength,
+        "low": low[k] / total if len(flux) else total, "high": high[k] / total if len(flux) else total,
+        "beat_s": to_s(beats), "bpm": np.array(60.0 * fps / period), "length_s": np.array(len(flux) / fps),
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **result)
+    os.replace(tmp, path)
+    return result, False
+
+
+# ------------------------------
+# Charting
+# ------------------------------
+def chart(analysis, difficulty, seed=0):
+    """[(time_s, pad)] for one difficulty."""
+    rule = DIFFICULTIES[difficulty]
+    beats = analysis["beat_s"]
+    if len(beats) < 2:
+        return []
+    sub = rule["subdiv"]
+    # grid points between tracked beats; the last beat's spacing repeats once past the end
+    beats = np.append(beats, 2 * beats[-1] - beats[-2])
+    steps = np.arange(sub) / sub
+    grid = (beats[:-1, None] + np.diff(beats)[:, None] * steps[None, :]).ravel()
+    step_s = float(np.median(np.diff(beats))) / sub
+
+    onset_s, strength = analysis["onset_s"], analysis["strength"]
+    best = {}               # grid index -> onset index
+    for j in range(len(onset_s)):
+        g = int(np.searchsorted(grid, onset_s[j]))
+        near = min((i for i in (g - 1, g) if 0 <= i < len(grid)), key=lambda i: abs(grid[i] - onset_s[j]), default=None)
+        if near is None or abs(grid[near] - onset_s[j]) > 0.3 * step_s or grid[near] < LEAD_IN_S:
+            continue
+        if near not in best or strength[j] > strength[best[near]]:
+            best[near] = j
+    if not best:
+        return []
+
+    def weight(g):
+        return SUB_WEIGHT[(g % sub) * 4 // sub] * strength[best[g]]
+    ranked = sorted(best, key=weight, reverse=True)[:max(1, int(round(rule["keep"] * len(best))))]
+    min_gap = max(MIN_GAP_S, rule["min_gap_beats"] * step_s * sub - 0.3 * step_s)
+    taken, picked = [], []          # sorted note times; (time, grid index) kept
+    for g in ranked:
+        t = grid[g]
+        i = bisect.bisect_left(taken, t)
+        if (i > 0 and t - taken[i - 1] < min_gap) or (i < len(taken) and taken[i] - t < min_gap):
+            continue
+        taken.insert(i, t)
+        picked.append((t, g))
+    picked.sort()
+
+    rng = random.Random(seed)
+    low_cut = np.quantile(analysis["low"], 0.66) if len(analysis["low"]) else 1.0
+    high_cut = np.quantile(analysis["high"], 0.66) if len(analysis["high"]) else 1.0
+    strong = np.quantile([strength[best[g]] for _, g in picked], 0.75)
+    pool = rule["pads"]
+    beat_s = step_s * sub
+    notes, prev_pad, prev_t, run = [], None, -1e9, 0
+    for t, g in picked:
+        j = best[g]
+        band = "low" if analysis["low"][j] >= low_cut else "high" if analysis["high"][j] >= high_cut else "mid"
+        close = t - prev_t < beat_s - 0.3 * step_s
+        if g % sub == 0 and (g // sub) % 4 == 0 and strength[j] >= strong:
+            choices = [5 if 5 in pool else 2]
+        else:
+            choices = [p for p in PADS_BY_BAND[band] if p in pool][:BAND_CHOICES] or list(pool)
+        # each rule only narrows the choice if something is left
+        for keep in ((lambda p: p != prev_pad) if close or run >= MAX_REPEAT else None,
+                     (lambda p: p not in (PADS_LEFT if prev_pad in PADS_LEFT else PADS_RIGHT if prev_pad in PADS_RIGHT else ())) if close else None):
+            if keep is None: continue
+            narrowed = [p for p in choices if keep(p)]
+            if not narrowed:
+                narrowed = [p for p in pool if keep(p)]
+            choices = narrowed or choices
+        pad = rng.choice(choices)
+        notes.append((round(float(onset_s[j]), 3), pad))     # the hit itself, not the grid point
+        run = run + 1 if pad == prev_pad else 1
+        prev_pad, prev_t = pad, t
+    return notes
+
+
+def write_csv(path, notes, meta):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        for k, v in meta.items():
+            f.write(f"# {k}={v}\n")
+        f.write(",".join(beatmap.CSV_HEADER) + "\n")
+        for i, (t, pad) in enumerate(notes):
+            f.write(f"{i},{t:.3f},{pad}\n")
+    os.replace(tmp, path)
+
+
+def generate(audio_path, difficulty="intermediate", out_path=None, force=False, cache_dir=None):
+    """Write the chart for audio_path; returns a summary dict."""
+    difficulty = difficulty.strip().lower()
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f"unknown difficulty '{difficulty}' ({', '.join(DIFFICULTIES)})")
+    out_path = out_path or f"{os.path.splitext(audio_path)[0]}_{difficulty}.gen.csv"
+    if os.path.exists(out_path) and not force:
+        with open(out_path, encoding="utf-8-sig") as f:
+            if "generator" not in beatmap.parse_meta(f):
+                raise ValueError(f"{out_path} is a hand-authored chart (use --force to replace it)")
+    t0 = time.perf_counter()
+    digest = sha1_file(audio_path)
+    analysis, cached = analyse(audio_path, digest, cache_dir)
+    notes = chart(analysis, difficulty, seed=int(digest[:8], 16))
+    bpm = float(analysis["bpm"])
+    write_csv(out_path, notes, {"generator": GENERATOR, "difficulty": difficulty, "bpm": f"{bpm:.2f}",
+                                "audio_sha1": digest, "offset_s": 0})
+    return {"csv": out_path, "audio": audio_path, "difficulty": difficulty, "bpm": round(bpm, 2),
+            "notes": len(notes), "onsets": len(analysis["onset_s"]), "length_s": round(float(analysis["length_s"]), 2),
+            "cached": cached, "elapsed_s": round(time.perf_counter() - t0, 3)}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Generate a Rhythm chart from an audio file.")
+    ap.add_argument("audio")
+    ap.add_argument("--difficulty", default="intermediate", help=", ".join(DIFFICULTIES))
+    ap.add_argument("--out", help="CSV path (default <audio>_<difficulty>.gen.csv)")
+    ap.add_argument("--force", action="store_true", help="replace a hand-authored CSV")
+    ap.add_argument("--json", action="store_true", help="print the summary as one JSON line")
+    args = ap.parse_args()
+    try:
+        summary = generate(args.audio, args.difficulty, args.out, args.force)
+    except (OSError, ValueError) as e:
+        if args.json: print(json.dumps({"ok": False, "error": str(e)}))
+        else: print(f"[gen] {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(dict(summary, ok=True)))
+    else:
+        print(f"[gen] {summary['notes']} notes at {summary['bpm']} bpm ({summary['difficulty']}) "
+              f"-> {summary['csv']} in {summary['elapsed_s']}s" + (" (cached analysis)" if summary["cached"] else ""))
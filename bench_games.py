@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+bench_games.py
+
+Headless frame-time / CPU benchmark for the three game modes.
+
+Each case runs one game script as a child process on the virtual backend
+(hw_backend.py) and drives it with a press stream: synthetic (seeded Poisson
+presses on random pads; beat-aligned presses for Rhythm) or recorded
+(--presses FILE, "<t_seconds> <pad>" lines). Cases cover every Combo user
+(user 1 and the user>=2 preview path), every Friend-or-Foe level and one
+Rhythm chart per --bpm value.
+
+USAGE
+  python3 bench_games.py [--duration 20] [--modes 1,2,3] [--presses FILE]
+                         [--rate 4.0] [--bpm 120,180] [--show-ms 19]
+                         [--seed 1] [--out bench.json] [--compare old.json]
+
+Per case it reports loop iterations/s, p50/p99 frame build time, p50/p99
+time blocked in show() (waiting for the previous frame's emulated transfer),
+show() calls/s (from the game's FrameScheduler), CPU seconds and peak RSS
+(from wait4 rusage). The report is JSON (stdout or --out); --compare prints the
+relative change of each metric against an earlier report.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PYTHON = os.getenv("PYTHON_BIN", sys.executable)
+METRICS = ("loop_iter_per_s", "build_p50_ms", "build_p99_ms", "show_p99_ms", "shows_per_s", "cpu_s", "peak_rss_kb")
+
+
+# ------------------------------
+# Press streams / charts
+# ------------------------------
+def synthetic_presses(duration, rate, seed):
+    rng = random.Random(seed)
+    t, out = 0.5, []
+    while t < duration:
+        out.append((t, rng.randint(1, 8)))
+        t += rng.expovariate(rate)
+    return out
+
+
+def synthetic_chart(duration, bpm, seed):
+    """Rhythm chart rows (beat_index, time_s, pad) plus presses near each beat."""
+    rng = random.Random(seed)
+    step = 60.0 / bpm
+    rows, presses = [], []
+    t, i = 1.5, 0
+    while t < duration - 0.5:
+        pad = rng.randint(1, 8)
+        rows.append((i, round(t, 3), pad))
+        # ~0.25 s of settle/start-up before the song clock starts, plus player noise
+        presses.append((t + 0.25 + rng.gauss(0.0, 0.04), pad))
+        t += step; i += 1
+    return rows, presses
+
+
+def write_presses(path, presses):
+    with open(path, "w") as f:
+        for t, pad in sorted(presses):
+            f.write(f"{max(0.0, t):.4f} {pad}\n")
+
+
+# ------------------------------
+# Cases
+# ------------------------------
+def build_cases(args, tmp):
+    cases = []
+    modes = {m.strip() for m in args.modes.split(",") if m.strip()}
+    dur = int(args.duration)
+    recorded = args.presses
+
+    def press_file(name, presses):
+        if recorded: return recorded
+        path = os.path.join(tmp, f"{name}.presses")
+        write_presses(path, presses)
+        return path
+
+    if "1" in modes:
+        for user in (1, 2, 3, 4):
+            name = f"combo_user{user}"
+            cases.append(dict(name=name, mode="gameMode1", level=user,
+                              cmd=[PYTHON, os.path.join(HERE, "gameMode1.py"), str(user), str(dur), "false"],
+                              presses=press_file(name, synthetic_presses(dur, args.rate, args.seed + user))))
+    if "2" in modes:
+        for level in (1, 2, 3, 4):
+            name = f"fof_level{level}"
+            cases.append(dict(name=name, mode="gameMode2", level=level,
+                              cmd=[PYTHON, os.path.join(HERE, "gameMode2.py"), str(level), str(dur)],
+                              presses=press_file(name, synthetic_presses(dur, args.rate, args.seed + 10 + level))))
+    if "3" in modes:
+        audio = os.path.join(tmp, "bench_song.wav")        # virtual player only needs a path
+        open(audio, "wb").close()
+        for bpm in [int(b) for b in args.bpm.split(",") if b.strip()]:
+            name = f"rhythm_{bpm}bpm"
+            rows, presses = synthetic_chart(dur, bpm, args.seed + bpm)
+            csv_path = os.path.join(tmp, f"{name}.csv")
+            with open(csv_path, "w") as f:
+                f.write("beat_index,time_s,pad\n")
+                for r in rows: f.write(f"{r[0]},{r[1]},{r[2]}\n")
+            cases.append(dict(name=name, mode="gameMode3", level=bpm,
+                              cmd=[PYTHON, os.path.join(HERE, "gameMode3.py"), "1", audio, csv_path],
+                              presses=press_file(name, presses)))
+    return cases
+
+
+def run_case(case, args, tmp):
+    stats_path = os.path.join(tmp, f"{case['name']}.stats.json")
+    env = dict(os.environ)
+    env.update({
+        "FITFIGHTER_BACKEND": "virtual",
+        "FITFIGHTER_PRESS_SCRIPT": case["presses"],
+        "FITFIGHTER_FRAME_STATS": stats_path,
+        "FITFIGHTER_VIRTUAL_SHOW_MS": str(args.show_ms),
+        "FITFIGHTER_VIRTUAL_SONG_S": str(args.duration),
+        "FITFIGHTER_VIRTUAL_FRAMES": "1",
+        "FITFIGHTER_NO_UPLOAD": "1",            # Friend-or-Foe would save every case to Firestore
+        "FITFIGHTER_SESSION_LOG_DIR": "",       # no session logs (session_log.py) for synthetic play
+        "PYTHONPATH": os.pathsep.join(filter(None, [HERE, env.get("PYTHONPATH")])),
+    })
+    t0 = time.monotonic()
+    proc = subprocess.Popen(case["cmd"], cwd=HERE, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    err = proc.stderr.read()
+    _, status, ru = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.monotonic() - t0
+
+    try:
+        with open(stats_path) as f: st = json.load(f)
+    except Exception:
+        st = {}
+    elapsed = st.get("elapsed_s") or 0.0
+    res = {
+        "case": case["name"], "mode": case["mode"], "level": case["level"],
+        "returncode": proc.returncode,
+        "wall_s": round(wall, 3),
+        "cpu_s": round(ru.ru_utime + ru.ru_stime, 3),
+        "peak_rss_kb": ru.ru_maxrss,
+        "loop_iter_per_s": st.get("loop_hz", 0.0),
+        "build_p50_ms": st.get("build_p50_ms", 0.0),
+        "build_p99_ms": st.get("build_p99_ms", 0.0),
+        "show_p50_ms": st.get("show_p50_ms", 0.0),
+        "show_p99_ms": st.get("show_p99_ms", 0.0),
+        "shows_per_s": round(st.get("frames", 0) / elapsed, 2) if elapsed > 0 else 0.0,
+        "frames": st.get("frames", 0),
+        "overruns": st.get("overruns", 0),
+        "dropped": st.get("dropped", 0),
+    }
+    if proc.returncode != 0:
+        res["stderr_tail"] = err.decode(errors="replace").strip().splitlines()[-3:]
+    return res
+
+
+# ------------------------------
+# Report / compare
+# ------------------------------
+def git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(report, old_path):
+    with open(old_path) as f: old = {r["case"]: r for r in json.load(f).get("results", [])}
+    print(f"{'case':<18}" + "".join(f"{m:>17}" for m in METRICS), file=sys.stderr)
+    for r in report["results"]:
+        o = old.get(r["case"])
+        if not o: continue
+        cells = []
+        for m in METRICS:
+            a, b = o.get(m) or 0.0, r.get(m) or 0.0
+            cells.append(f"{((b - a) / a * 100.0):+16.1f}%" if a else f"{'n/a':>17}")
+        print(f"{r['case']:<18}" + "".join(cells), file=sys.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Headless FitFighter game-loop benchmark")
+    ap.add_argument("--duration", type=int, default=20, help="seconds per case")
+    ap.add_argument("--modes", default="1,2,3")
+    ap.add_argument("--presses", help="recorded press stream to use for every case")
+    ap.add_argument("--rate", type=float, default=4.0, help="synthetic presses per second")
+    ap.add_argument("--bpm", default="120", help="Rhythm chart densities, comma separated")
+    ap.add_argument("--show-ms", type=float, default=19.0, help="emulated strip transfer time per frame")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out")
+    ap.add_argument("--compare")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ffbench-") as tmp:
+        results = []
+        for case in build_cases(args, tmp):
+            print(f"[bench] {case['name']} ...", file=sys.stderr)
+            results.append(run_case(case, args, tmp))
+
+    report = {
+        "meta": {"rev": git_rev(), "python": platform.python_version(), "machine": platform.machine(),
+                 "duration_s": args.duration, "show_ms": args.show_ms, "seed": args.seed,
+                 "presses": args.presses or "synthetic", "ts": int(time.time())},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f: f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Latency calibration (for Rhythm)
+
+USAGE
+  python3 calibrate.py [beats] [bpm] [alsa_dev]
+  --backend virtual  run without GPIO/LEDs (see hw_backend.py)
+
+The launcher hosts it like a game mode ("game": "calibrate"); run as a
+script it builds its own Rig.
+
+Two phases of `beats` beats each (default 16 at 100 bpm):
+  1. listen  a click track plays, the strip stays dim blue; tap any pad on
+             every click
+  2. watch   silence; every pad flashes white on the beat; tap on every flash
+
+The taps give this rig's audio and visual latency (rig_calibration.py),
+which are saved under the rig's device id and applied by gameMode3. A phase
+with too few usable taps keeps its previous value.
+"""
+
+import os, sys, tempfile, time, wave
+import signal
+from array import array
+from queue import Queue
+from hw_backend import Color, vlc
+from game_rig import Rig
+from frame_scheduler import FrameScheduler
+from game_runtime import GameRuntime
+from flash_manager import FlashManager
+from song_clock import SongClock
+import rig_calibration
+
+# ------------------------------
+# CLI
+# ------------------------------
+def parse_args(argv):
+    """[beats] [bpm] [alsa_dev] -> params dict (argv without the script name)."""
+    return {
+        "beats":    int(argv[0]) if len(argv) > 0 else 16,
+        "bpm":      float(argv[1]) if len(argv) > 1 else 100.0,
+        "alsa_dev": argv[2] if len(argv) > 2 and argv[2] != "-" else None,
+    }
+
+def configure(params):
+    global beats, bpm, alsa_dev
+    beats    = max(rig_calibration.MIN_TAPS, params["beats"])
+    bpm      = params["bpm"]
+    alsa_dev = params["alsa_dev"]
+
+# ------------------------------
+# Session state
+# ------------------------------
+rig = fb = frames = flashes = runtime = tele = None
+event_q = Queue()
+
+def begin_session(rig_):
+    global rig, fb, frames, flashes, event_q, runtime, tele
+    rig = rig_; fb = rig.fb; tele = rig.telemetry
+    frames = FrameScheduler(fb)
+    flashes = FlashManager(fb)
+    event_q = rig.event_queue()
+    runtime = GameRuntime(event_q, frames, max_sleep=0.1, stop=rig.stop_requested)
+    runtime.add_source(flashes.next_expiry)
+    rig.attach(event_q, record=False)      # not a game: nothing to replay
+
+def end_session():
+    try: rig.detach()
+    except: pass
+    try: flashes.cancel_all(); fb.fill_all(Color(0,0,0)); frames.flush()
+    except: pass
+
+COLOR_LISTEN = Color(0, 0, 40)
+COLOR_FLASH  = Color(255, 255, 255)
+FLASH_DUR    = 0.08
+LEAD_IN_S    = 2.0
+GAP_BEATS    = 3
+SAMPLE_RATE  = 44100
+STARTUP_SETTLE_S = 0.20
+
+# ------------------------------
+# Click track
+# ------------------------------
+def click_track(clicks, length_s):
+    """Mono 16-bit WAV with a 15 ms 2 kHz click at each time in clicks; returns its path."""
+    path = os.path.join(tempfile.gettempdir(), f"fitfighter-clicks-{len(clicks)}-{clicks[0]:.3f}-{clicks[-1]:.3f}.wav")
+    if os.path.exists(path): return path
+    samples = array("h", bytes(2 * int(length_s * SAMPLE_RATE)))
+    n_click = int(0.015 * SAMPLE_RATE)
+    # ~2 kHz square-ish burst with a linear decay; cheap and very audible
+    burst = [int(20000 * (1.0 - k / n_click)) * (1 if (k * 4000 // SAMPLE_RATE) % 2 == 0 else -1) for k in range(n_click)]
+    for t in clicks:
+        i = int(t * SAMPLE_RATE)
+        samples[i:i + n_click] = array("h", burst[:len(samples) - i])
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with wave.open(tmp, "wb") as w:
+        w.setnchannels(1); w.setsampwidth(2); w.setframerate(SAMPLE_RATE)
+        w.writeframes(samples.tobytes())
+    os.replace(tmp, path)
+    return path
+
+# ------------------------------
+# Main
+# ------------------------------
+def main():
+    print("Starting latency calibration ...")
+    period = 60.0 / bpm
+    clicks = [LEAD_IN_S + k * period for k in range(beats)]
+    flash_at = [LEAD_IN_S + (beats + GAP_BEATS + k) * period for k in range(beats)]
+    split = LEAD_IN_S + (beats + GAP_BEATS / 2.0) * period     # taps before this belong to the clicks
+    end_s = flash_at[-1] + 2 * period
+    audio_path = click_track(clicks, end_s)
+
+    if os.geteuid() == 0:
+        dev = alsa_dev or "plughw:0,0"
+        inst = rig.vlc_instance("--aout=alsa", f"--alsa-audio-device={dev}",
+                                "--no-audio-time-stretch", "--file-caching=150")
+    else:
+        inst = rig.vlc_instance("--no-audio-time-stretch", "--file-caching=150")
+    player = inst.media_player_new()
+    player.set_media(inst.media_new(audio_path))
+    rig.armed(game="calibrate", beats=beats, bpm=bpm)
+    player.audio_set_volume(80)
+    player.play()
+
+    song_clock = SongClock(player.get_time)
+    t_lock_start = time.perf_counter()
+    while song_clock.t is None:
+        if player.get_state() in (vlc.State.Error, vlc.State.Ended, vlc.State.Stopped):
+            print("[calibrate] Could not lock the audio timebase; aborting.")
+            return {}
+        t_ms = player.get_time()
+        if t_ms is not None and t_ms >= 0 and (time.perf_counter() - t_lock_start) >= STARTUP_SETTLE_S:
+            song_clock.lock(t_ms)
+        time.sleep(0.005)
+    runtime.add_source(lambda: time.monotonic() + max(0.0, song_clock.next_sample - time.perf_counter()))
+
+    def song_at(t_mono):
+        return song_clock.now() - (time.monotonic() - t_mono)
+
+    taps_audio, taps_visual, shown = [], [], []
+    pending = [False]          # a flash was written; the next show() is when it went out
+    def on_show(t_done):
+        if pending[0]:
+            pending[0] = False
+            shown.append(song_at(t_done))
+    frames.listeners.append(on_show)
+
+    fb.fill_all(COLOR_LISTEN); frames.flush()
+    next_flash = 0
+    listening = True
+    try:
+        while True:
+            now = song_clock.update()
+            if now >= end_s or player.get_state() in (vlc.State.Ended, vlc.State.Error, vlc.State.Stopped):
+                break
+            if listening and now >= split:
+                listening = False
+                fb.fill_all(Color(0,0,0))
+            while next_flash < len(flash_at) and now >= flash_at[next_flash]:
+                for pid in rig.pad_gpio.keys(): flashes.start(pid, COLOR_FLASH, FLASH_DUR)
+                pending[0] = True
+                next_flash += 1
+            flashes.tick()
+            frames.present()
+            if next_flash < len(flash_at):
+                runtime.schedule(time.monotonic() + song_clock.until(flash_at[next_flash]))
+            elif listening:
+                runtime.schedule(time.monotonic() + song_clock.until(split))
+            runtime.schedule(time.monotonic() + song_clock.until(end_s))
+            item = runtime.wait()
+            if item is not None and item[0] == "press":
+                t_tap = song_at(item[2])
+                (taps_audio if t_tap < split else taps_visual).append(t_tap)
+                tele.emit("tap", pad=item[1], phase="listen" if t_tap < split else "watch")
+    finally:
+        player.stop()
+        frames.listeners.remove(on_show)
+
+    window = period / 2.0
+    audio = rig_calibration.estimate(taps_audio, clicks, window)
+    visual = rig_calibration.estimate(taps_visual, shown, window)
+    values = {}
+    if audio: values.update(audio_ms=audio["offset_ms"], audio_spread_ms=audio["spread_ms"], audio_taps=audio["taps"])
+    if visual: values.update(visual_ms=visual["offset_ms"], visual_spread_ms=visual["spread_ms"], visual_taps=visual["taps"])
+    cal = rig_calibration.save(rig.device_id, **values) if values else rig_calibration.load(rig.device_id)
+
+    print("---- Calibration ----")
+    print(f"Rig           : {rig.device_id}")
+    print(f"Audio         : {audio if audio else f'too few taps ({len(taps_audio)}); kept'} -> {cal['audio_ms']} ms")
+    print(f"Visual        : {visual if visual else f'too few taps ({len(taps_visual)}); kept'} -> {cal['visual_ms']} ms")
+    print(f"Clock         : {song_clock.summary()}")
+    stats = dict(deviceId=rig.device_id, audioMs=cal["audio_ms"], visualMs=cal["visual_ms"],
+                 audioTaps=len(taps_audio), visualTaps=len(taps_visual),
+                 audioOk=audio is not None, visualOk=visual is not None)
+    tele.emit("final", **stats)
+    return stats
+
+def run(params, rig_):
+    """Host entry point: one calibration on rig_ (see game_host.py)."""
+    configure(params)
+    begin_session(rig_)
+    tele.emit("start", game="calibrate", params=params)
+    try:
+        stats = main()
+    finally:
+        end_session()
+    return {"stats": stats or {}}
+
+def _sig_handler(signum, frame): sys.exit(0)
+
+if __name__ == "__main__":
+    params = parse_args(sys.argv[1:])
+    signal.signal(signal.SIGINT, _sig_handler)
+    signal.signal(signal.SIGTERM, _sig_handler)
+    rig_ = Rig.from_env()
+    try:
+        run(params, rig_)
+    except KeyboardInterrupt:
+        print("\nStopping calibration.")
+    finally:
+        rig_.close()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+difficulty_sim.py
+
+Monte Carlo difficulty simulator for Friend-or-Foe (gameMode2 PRESETS) and
+Combo (gameMode1 USER_PRESETS).
+
+USAGE
+  python3 difficulty_sim.py [--games gameMode2,gameMode1] [--levels 1,2,3,4]
+                            [--bots novice,regular,athlete]
+                            [--bot NAME:rt=0.4,sd=0.1,accuracy=0.95,travel=0.3,confusion=0.05]
+                            [--set [LEVEL.]KEY=VALUE ...] [--sessions 200]
+                            [--duration 60] [--seed 1] [--jobs N] [--json] [--out FILE]
+
+Every simulated session is the game's own run(params, rig) on the virtual
+backend (hw_backend.py), so the rules being tuned are the ones that ship.
+A SimRig stands in for the cabinet: its clock is virtual (session_replay.py's
+VirtualClock) and only moves when the game waits, and its pads are pressed
+by a bot that watches the LEDs:
+
+  Friend-or-Foe  punches a pad when it turns foe red or bonus purple, and a
+                 friend green one with probability `confusion`; a friend that
+                 flips to foe is a red onset like any other
+  Combo user 1   punches each new target pad
+  Combo user 2+  remembers the blue preview, waits for the all-yellow cue to
+                 go dark and punches the combo from memory
+
+Bot knobs: reaction time from the onset (lognormal, mean `rt` and sd `sd`
+seconds), `accuracy` (chance a punch lands on the pad it was aimed at; a
+miss lands on another pad and is retried after a reaction time, from the
+top for Combo user 4) and `travel` (seconds before the same hand can punch
+again, so targets queue up behind each other).
+
+Sessions are spread over a process pool (--jobs, default one per CPU); a
+60 s session takes a few tens of ms. Per game, level and bot the report
+gives the score distribution (mean, p10 / p50 / p90), how many lives were
+lost (share of sessions losing 0..3) and survival (share reaching the timer,
+median time to the last life lost otherwise).
+
+--set retunes a preset for the run without editing the game: KEY is a
+Friend-or-Foe preset key (spawn_interval, ttl, max_active, fake_flip_prob,
+...) or a Combo one (interval, showTime, lives); LEVEL (1..4) limits it to
+one level, e.g. --set 4.ttl=1.1 --set spawn_interval=0.9.
+"""
+
+import argparse
+import ast
+import importlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import deque
+from queue import Empty
+
+# session_replay forces the virtual backend and drops the launcher's pipes and press scripts
+from session_replay import VirtualClock
+from hw_backend import Color
+from game_rig import Rig
+from telemetry import Telemetry
+
+GAMES = ("gameMode2", "gameMode1")
+LIVES = 3                   # both games start a session with three lives
+LEDS_PER_PAD = 79           # the cabinet's layout: bar animations wake the game as often as on the rig
+FLASH_IGNORE_S = 0.4        # red on a pad the bot just punched is its own miss flash, not a foe
+MAX_TRIES = 3               # punches at one target before the bot gives up on it
+
+# what the bot looks for (the first pixel of each pad: bars are lit from there)
+BLACK = Color(0, 0, 0)
+BLUE = Color(0, 0, 255)
+YELLOW = Color(251, 255, 0)
+GREEN = Color(0, 255, 0)
+FOE = Color(255, 0, 0)
+FRIEND = Color(0, 255, 0)
+BONUS = Color(144, 0, 255)
+
+BOTS = {
+    "novice":  dict(rt=0.55, sd=0.15, accuracy=0.90, travel=0.45, confusion=0.10),
+    "regular": dict(rt=0.42, sd=0.10, accuracy=0.95, travel=0.32, confusion=0.05),
+    "athlete": dict(rt=0.32, sd=0.06, accuracy=0.98, travel=0.22, confusion=0.02),
+}
+
+
+# ------------------------------
+# Bot player
+# ------------------------------
+class Bot:
+    """A player with a reaction time, an aim and one hand, reacting to what the strip shows."""
+
+    def __init__(self, knobs, strategy, seed):
+        self.rt_mean = knobs["rt"]
+        sigma2 = math.log(1.0 + (knobs["sd"] / knobs["rt"]) ** 2)
+        self.mu, self.sigma = math.log(knobs["rt"]) - sigma2 / 2.0, math.sqrt(sigma2)
+        self.accuracy = knobs["accuracy"]
+        self.travel = knobs["travel"]
+        self.confusion = knobs["confusion"]
+        self.strategy = strategy        # "friendfoe" | "follow" | "memory" | "memory_reset"
+        self.rng = random.Random(seed)
+        self.presses = deque()          # (t, pad), in time order
+        self.free_at = 0.0
+        self.punched = {}               # pad -> when the bot last punched it
+        self.seen = {}
+        self.combo = []
+        self.cued = False
+
+    def _rt(self):
+        return self.rng.lognormvariate(self.mu, self.sigma)
+
+    def _land(self, pad, pads):
+        if self.rng.random() < self.accuracy: return pad
+        return self.rng.choice([p for p in pads if p != pad])
+
+    def _punch(self, t, pad):
+        t = max(t, self.free_at)
+        self.free_at = t + self.travel
+        self.presses.append((t, pad))
+        self.punched[pad] = t
+        return t
+
+    def strike(self, seq, t, pads, reset=False):
+        """Punch the pads of seq in order from t + a reaction time; a miss is noticed and retried."""
+        k = misses = 0
+        t += self._rt()
+        while k < len(seq) and misses < MAX_TRIES:
+            pad = self._land(seq[k], pads)
+            t = self._punch(t, pad)
+            if pad == seq[k]:
+                k += 1
+            else:
+                misses += 1
+                t += self._rt()             # sees the red flash
+                if reset: k = 0
+
+    def shown(self, fb, now):
+        """A frame went out at `now`: react to the pads that changed colour."""
+        buf, pads = fb.buf, list(fb.segments)
+        colors = {pid: buf[s] for pid, (s, _) in fb.segments.items()}
+        onsets = [pid for pid, c in colors.items() if c != self.seen.get(pid)]
+        self.seen = colors
+        if not onsets: return
+        if self.strategy in ("friendfoe", "follow"):
+            for pid in onsets:
+                c = colors[pid]
+                if self.strategy == "follow":
+                    aim = c in (BLUE, YELLOW)
+                elif c == FOE:
+                    aim = now - self.punched.get(pid, -math.inf) >= FLASH_IGNORE_S
+                else:
+                    aim = c == BONUS or (c == FRIEND and self.rng.random() < self.confusion)
+                if aim: self.strike([pid], now, pads)
+            return
+        # Combo user 2+: remember the preview, punch it back once the all-yellow cue goes dark
+        lit = set(colors.values())
+        if lit == {YELLOW}:
+            self.cued = True
+        elif lit == {GREEN}:
+            self.combo = []; self.cued = False        # combo done, a new preview follows
+        elif self.cued and lit == {BLACK}:
+            self.cued = False
+            seq, self.combo = self.combo, []
+            self.strike(seq, now, pads, reset=self.strategy == "memory_reset")
+        elif not self.cued:
+            self.combo += [pid for pid in onsets if colors[pid] == BLUE]
+
+
+class BotQueue:
+    """The session's pad event queue on virtual time, fed by the bot's punches."""
+
+    def __init__(self, rig):
+        self.clock = rig.clock
+        self.bot = rig.bot
+        self.items = deque()
+
+    def put(self, item):
+        self.items.append(item)
+
+    def _arrive(self, now):
+        presses = self.bot.presses
+        while presses and presses[0][0] <= now:
+            t, pad = presses.popleft()
+            self.items.append(("press", pad, t))
+
+    def get(self, block=True, timeout=None):
+        clock = self.clock
+        now = clock()
+        self._arrive(now)
+        if self.items: return self.items.popleft()
+        if block:
+            presses = self.bot.presses
+            deadline = math.inf if timeout is None else now + timeout
+            if presses and presses[0][0] <= deadline:
+                clock.advance_to(presses[0][0])
+                self._arrive(clock())
+                return self.items.popleft()
+            if math.isinf(deadline): raise Empty      # nothing will ever come: the caller's stop applies
+            clock.advance_to(deadline)
+        raise Empty
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+
+class SimRig(Rig):
+    def __init__(self, bot):
+        super().__init__(num_leds=8 * LEDS_PER_PAD, device_id="sim")
+        self.bot = bot
+        self.events = []
+        self.upload = False
+        self.clock = VirtualClock(0.0)
+        self.telemetry = Telemetry(self.events.append, clock=self.clock)
+        self.gate = None
+
+    def event_queue(self):
+        return BotQueue(self)
+
+    def attach(self, event_q, record=True):
+        super().attach(event_q, record=False)
+
+    def sleep(self, dt):
+        self.clock.sleep(dt)
+
+    def _shown(self):
+        self.bot.shown(self.fb, self.clock())
+
+
+# ------------------------------
+# Sessions (run in the pool's workers)
+# ------------------------------
+_PRESETS = {}
+
+
+def _preset_table(mod):
+    return mod.PRESETS if mod.__name__ == "gameMode2" else mod.USER_PRESETS
+
+
+def _preset_key(mod, level):
+    return mod.LEVEL_TO_DIFF[level] if mod.__name__ == "gameMode2" else level
+
+
+def _strategy(game, level):
+    if game == "gameMode2": return "friendfoe"
+    if level == 1: return "follow"
+    return "memory_reset" if level == 4 else "memory"
+
+
+def simulate(task):
+    """One session: task = (game, level, bot name, bot knobs, preset overrides, duration, seed)."""
+    game, level, bot_name, knobs, overrides, duration, seed = task
+    mod = importlib.import_module(game)
+    table = _preset_table(mod)
+    if game not in _PRESETS: _PRESETS[game] = {k: dict(v) for k, v in table.items()}
+    key = _preset_key(mod, level)
+    table[key] = {**_PRESETS[game][key], **overrides}
+    rng = random.Random(seed)
+    if game == "gameMode2":
+        params = {"user_level": level, "timer": duration}
+    else:
+        params = {"user": level, "timer": duration, "endless": False}
+    params["seed"] = rng.randrange(2**32)
+
+    rig = SimRig(Bot(knobs, _strategy(game, level), rng.randrange(2**32)))
+    try:
+        with open(os.devnull, "w") as null:
+            stdout, sys.stdout = sys.stdout, null
+            try:
+                stats = mod.run(params, rig)["stats"]
+            finally:
+                sys.stdout = stdout
+    finally:
+        rig.close()
+    t_start = next((ev["t"] for ev in rig.events if ev["k"] == "start"), 0.0)
+    t_dead = next((ev["t"] for ev in rig.events if ev.get("lives") == 0), None)
+    return {"game": game, "level": level, "bot": bot_name, "score": stats["score"],
+            "lives_lost": LIVES - stats["lives"], "survived": stats["lives"] > 0,
+            "t_dead": None if t_dead is None else t_dead - t_start}
+
+
+# ------------------------------
+# Report
+# ------------------------------
+def _pct(xs, q):
+    """Nearest-rank percentile of a sorted list."""
+    if not xs: return None
+    return xs[min(len(xs) - 1, max(0, int(math.ceil(q / 100.0 * len(xs))) - 1))]
+
+
+def summarize(results):
+    """Per (game, level, bot): score, lives-lost and survival distributions."""
+    groups = {}
+    for r in results:
+        groups.setdefault((r["game"], r["level"], r["bot"]), []).append(r)
+    rows = []
+    for (game, level, bot), rs in sorted(groups.items()):
+        n = len(rs)
+        scores = sorted(r["score"] for r in rs)
+        deaths = sorted(r["t_dead"] for r in rs if r["t_dead"] is not None)
+        rows.append({
+            "game": game, "level": level, "bot": bot, "sessions": n,
+            "score": {"mean": round(sum(scores) / n, 2), "p10": _pct(scores, 10),
+                      "p50": _pct(scores, 50), "p90": _pct(scores, 90)},
+            "lives_lost": [round(sum(1 for r in rs if min(LIVES, r["lives_lost"]) == k) / n, 3) for k in range(LIVES + 1)],
+            "survived": round(sum(1 for r in rs if r["survived"]) / n, 3),
+            "t_dead": {"p10": _round(_pct(deaths, 10)), "p50": _round(_pct(deaths, 50)), "p90": _round(_pct(deaths, 90))},
+        })
+    return rows
+
+
+def _round(x):
+    return None if x is None else round(x, 2)
+
+
+def print_report(rows, wall_s, n):
+    print(f"{n} sessions in {wall_s:.1f} s")
+    print(f"{'game':<10} {'lvl':>3} {'bot':<8} {'n':>5}  {'score mean':>10} {'p10':>5} {'p50':>5} {'p90':>5}"
+          f"  {'lives lost 0/1/2/3 %':<22} {'survive':>7} {'dead p50':>8}")
+    for r in rows:
+        sc, ll = r["score"], "/".join(f"{100 * x:.0f}" for x in r["lives_lost"])
+        dead = r["t_dead"]["p50"]
+        print(f"{r['game']:<10} {r['level']:>3} {r['bot']:<8} {r['sessions']:>5}  {sc['mean']:>10} {sc['p10']:>5} {sc['p50']:>5}"
+              f" {sc['p90']:>5}  {ll:<22} {100 * r['survived']:>6.0f}% {'-' if dead is None else f'{dead:.1f} s':>8}")
+
+
+# ------------------------------
+# CLI
+# ------------------------------
+def _value(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_bot(spec):
+    """NAME:rt=0.4,sd=0.1,... (knobs not given come from 'regular' or the named built-in bot)."""
+    name, _, rest = spec.partition(":")
+    knobs = dict(BOTS.get(name, BOTS["regular"]))
+    for item in filter(None, rest.split(",")):
+        k, _, v = item.partition("=")
+        if k not in knobs: raise ValueError(f"unknown bot knob {k!r} (expected {', '.join(knobs)})")
+        knobs[k] = float(v)
+    return name, knobs
+
+
+def parse_sets(sets, games, levels):
+    """--set [LEVEL.]KEY=VALUE -> {(game, level): {key: value}}."""
+    import gameMode1, gameMode2
+    keys = {"gameMode2": set(gameMode2.BASE), "gameMode1": set(gameMode1.USER_PRESETS[1])}
+    out = {(g, l): {} for g in games for l in levels}
+    for spec in sets:
+        lhs, sep, v = spec.partition("=")
+        if not sep: raise ValueError(f"--set {spec!r}: expected [LEVEL.]KEY=VALUE")
+        lvl, _, key = lhs.rpartition(".")
+        owners = [g for g in games if key in keys[g]]
+        if not owners: raise ValueError(f"--set {spec!r}: no preset key {key!r} in {', '.join(games)}")
+        value = _value(v)
+        for g in owners:
+            for l in levels:
+                if not lvl or int(lvl) == l: out[(g, l)][key] = value
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Monte Carlo difficulty simulator for Friend-or-Foe and Combo presets.")
+    ap.add_argument("--games", default=",".join(GAMES))
+    ap.add_argument("--levels", default="1,2,3,4")
+    ap.add_argument("--bots", default=",".join(BOTS))
+    ap.add_argument("--bot", action="append", default=[], help="NAME:rt=..,sd=..,accuracy=..,travel=..,confusion=..")
+    ap.add_argument("--set", action="append", default=[], dest="sets", help="[LEVEL.]KEY=VALUE preset override")
+    ap.add_argument("--sessions", type=int, default=200, help="sessions per game, level and bot")
+    ap.add_argument("--duration", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--json", action="store_true")
+    ap.add_argument("--out")
+    args = ap.parse_args(argv)
+
+    games = [g for g in args.games.split(",") if g]
+    for g in games:
+        if g not in GAMES: ap.error(f"unknown game {g!r} (expected {', '.join(GAMES)})")
+    levels = [max(1, min(4, int(l))) for l in args.levels.split(",") if l]
+    try:
+        bots = [(name, dict(BOTS[name])) for name in args.bots.split(",") if name]
+        bots += [parse_bot(spec) for spec in args.bot]
+        overrides = parse_sets(args.sets, games, levels)
+    except KeyError as e:
+        ap.error(f"unknown bot {e.args[0]!r} (expected {', '.join(BOTS)})")
+    except ValueError as e:
+        ap.error(str(e))
+
+    tasks = []
+    for g in games:
+        for l in levels:
+            for name, knobs in bots:
+                for i in range(args.sessions):
+                    seed = random.Random(f"{args.seed}:{g}:{l}:{name}:{i}").randrange(2**32)
+                    tasks.append((g, l, name, knobs, overrides[(g, l)], args.duration, seed))
+
+    t0 = time.perf_counter()
+    if args.jobs <= 1:
+        results = [simulate(t) for t in tasks]
+    else:
+        with multiprocessing.Pool(args.jobs) as pool:
+            results = pool.map(simulate, tasks, chunksize=max(1, len(tasks) // (args.jobs * 8)))
+    wall_s = time.perf_counter() - t0
+
+    rows = summarize(results)
+    report = {"sessions": len(tasks), "wall_s": round(wall_s, 2), "duration": args.duration, "seed": args.seed,
+              "bots": dict(bots), "overrides": {f"{g}/{l}": o for (g, l), o in overrides.items() if o},
+              "results": rows}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(rows, wall_s, len(tasks))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
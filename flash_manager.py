@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+flash_manager.py
+
+Pad flash/effect manager shared by all game modes (replaces the
+start_flash / tick_flash_cleanup / flash_expiry copies in each script).
+
+Each pad has a stack of flash layers; start() pushes a layer and paints it,
+and the pad's retained colour (what shows once its last layer is gone) is
+set by the most recent start(). Expiries sit in one min-heap, so starting,
+expiring and cancelling a flash are O(log n) instead of a scan of every
+pending flash, and cancelled layers are dropped lazily when they surface.
+When the top layer expires the next live layer underneath is repainted,
+so a short flash over a longer one hands the pad back to the longer one.
+
+Renderers skip pads that are overlaid: `pid in flashes.overlaid` is O(1).
+Writes only touch the FrameBuffer; the frame scheduler shows them.
+"""
+
+import heapq
+import time
+
+BLACK = 0
+
+
+class FlashManager:
+    def __init__(self, fb, clock=time.monotonic):
+        self.fb = fb
+        self.clock = clock
+        self._heap = []          # (expiry, seq, pid)
+        self._layers = {}        # pid -> [(seq, color), ...] oldest first
+        self._live = {}          # seq -> pid for layers not yet expired/cancelled
+        self._retained = {}      # pid -> colour once the last layer ends
+        self._seq = 0
+        self.overlaid = set()
+
+    def start(self, pid, color, duration, retained=BLACK):
+        self._seq += 1
+        seq = self._seq
+        heapq.heappush(self._heap, (self.clock() + duration, seq, pid))
+        self._layers.setdefault(pid, []).append((seq, color))
+        self._live[seq] = pid
+        self._retained[pid] = BLACK if retained is None else retained
+        self.overlaid.add(pid)
+        self.fb.fill_pad(pid, color)
+
+    def cancel(self, pid):
+        """Forget pid's flashes without repainting (the caller paints next)."""
+        for seq, _ in self._layers.pop(pid, ()):
+            self._live.pop(seq, None)
+        self._retained.pop(pid, None)
+        self.overlaid.discard(pid)
+
+    def cancel_all(self):
+        self._heap.clear(); self._layers.clear(); self._live.clear()
+        self._retained.clear(); self.overlaid.clear()
+
+    def next_expiry(self):
+        """Earliest live expiry or None (runtime deadline source)."""
+        heap, live = self._heap, self._live
+        while heap and heap[0][1] not in live:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def tick(self, now=None):
+        """Expire due layers and repaint the pads whose top layer changed."""
+        now = self.clock() if now is None else now
+        heap, live = self._heap, self._live
+        repaint = set()
+        while heap and heap[0][0] <= now:
+            _, seq, pid = heapq.heappop(heap)
+            if live.pop(seq, None) is None:
+                continue                                   # cancelled earlier
+            stack = self._layers[pid]
+            if stack[-1][0] == seq:
+                stack.pop(); repaint.add(pid)
+            else:
+                stack[:] = [l for l in stack if l[0] != seq]   # hidden layer: no repaint
+        for pid in repaint:
+            stack = self._layers.get(pid)
+            if stack:
+                self.fb.fill_pad(pid, stack[-1][1])
+            else:
+                self._layers.pop(pid, None)
+                self.overlaid.discard(pid)
+                self.fb.fill_pad(pid, self._retained.pop(pid, BLACK))
+        return bool(repaint)
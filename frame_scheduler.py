@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+frame_scheduler.py
+
+Fixed-cadence presenter for the LED framebuffer.
+
+Game loops keep ticking as fast as they like and only write into the
+FrameBuffer; present() latches the buffer onto the strip at most once per
+frame period (LED_FRAME_HZ, default 60). Everything written between two
+presents (flash starts/cleanups, renderers) goes out in a single show().
+
+A full 632-LED WS2811 transfer takes ~19 ms. rpi_ws281x runs it by DMA
+after show() returns, so show() itself only blocks while the previous
+frame is still going out; a show() that blocks longer than a period counts
+as an overrun, and frame slots that passed while a frame was pending count
+as dropped.
+
+Every present() call counts as one game-loop iteration. The time from a
+frame slot opening (first due() that returned True) to the start of
+fb.show() is sampled as the frame build time, and the time spent in
+fb.show() as the show time. With FITFIGHTER_FRAME_STATS=<path> the
+final stats() are written there as JSON on exit (used by bench_games.py).
+"""
+
+import atexit
+import json
+import os
+import time
+from collections import deque
+
+DEFAULT_FPS = float(os.getenv("LED_FRAME_HZ", "60"))
+
+
+class FrameScheduler:
+    def __init__(self, fb, fps=DEFAULT_FPS, clock=time.monotonic):
+        self.fb = fb
+        self.clock = clock
+        self.period = 1.0 / max(1.0, float(fps))
+        self.next_at = 0.0
+        self.frames = 0
+        self.overruns = 0
+        self.dropped = 0
+        self.max_show_s = 0.0
+        self._started = None
+        self._pending_since = None
+        self.loop_iterations = 0
+        self.listeners = []            # called with the show-complete timestamp
+        self._build_t0 = None
+        self.build_samples = deque(maxlen=20000)
+        self.show_samples = deque(maxlen=20000)
+        stats_path = os.getenv("FITFIGHTER_FRAME_STATS")
+        if stats_path:
+            atexit.register(self._dump_stats, stats_path)
+
+    def due(self, now=None):
+        """True when a present() right now would be allowed to show."""
+        now = self.clock() if now is None else now
+        if now < self.next_at: return False
+        if self._build_t0 is None: self._build_t0 = now
+        return True
+
+    def time_to_next(self, now=None):
+        return max(0.0, self.next_at - (self.clock() if now is None else now))
+
+    def _show(self, now):
+        if self._started is None: self._started = now
+        pending_since = self._pending_since
+        build_t0 = self._build_t0 if self._build_t0 is not None else now
+        self._pending_since = None
+        self._build_t0 = None
+        t_show = self.clock()
+        if not self.fb.show():
+            return False
+        done = self.clock()
+        show_s = done - t_show
+        self.build_samples.append(t_show - build_t0)
+        self.show_samples.append(show_s)
+        for cb in self.listeners: cb(done)
+        self.frames += 1
+        if show_s > self.max_show_s: self.max_show_s = show_s
+        if show_s > self.period: self.overruns += 1
+        # frame slots that went by while this frame was waiting to go out
+        if pending_since is not None and now - pending_since >= self.period:
+            self.dropped += int((now - pending_since) // self.period)
+        self.next_at = done + self.period     # from the return: the strip is still busy with this frame
+        return True
+
+    def present(self, now=None):
+        """Show pending writes if the frame slot is open; otherwise keep them buffered."""
+        now = self.clock() if now is None else now
+        self.loop_iterations += 1
+        if self._started is None: self._started = now
+        if not self.fb.pending:
+            self._pending_since = None
+            self._build_t0 = None
+            return False
+        if self._pending_since is None:
+            self._pending_since = max(now, self.next_at)
+        if now < self.next_at:
+            return False
+        return self._show(now)
+
+    def flush(self):
+        """Show pending writes now, ignoring the cadence (blocking sequences, shutdown)."""
+        return self._show(self.clock())
+
+    def _pct(self, samples, q):
+        if not samples: return 0.0
+        xs = sorted(samples)
+        return round(xs[min(len(xs) - 1, int(q * len(xs)))] * 1000.0, 3)
+
+    def stats(self):
+        elapsed = (self.clock() - self._started) if self._started is not None else 0.0
+        return {
+            "fps_target": round(1.0 / self.period, 2),
+            "frames": self.frames,
+            "fps": round(self.frames / elapsed, 2) if elapsed > 0 else 0.0,
+            "overruns": self.overruns,
+            "dropped": self.dropped,
+            "max_show_ms": round(self.max_show_s * 1000.0, 2),
+            "elapsed_s": round(elapsed, 3),
+            "loop_iterations": self.loop_iterations,
+            "loop_hz": round(self.loop_iterations / elapsed, 1) if elapsed > 0 else 0.0,
+            "build_p50_ms": self._pct(self.build_samples, 0.50),
+            "build_p99_ms": self._pct(self.build_samples, 0.99),
+            "show_p50_ms": self._pct(self.show_samples, 0.50),
+            "show_p99_ms": self._pct(self.show_samples, 0.99),
+        }
+
+    def _dump_stats(self, path):
+        try:
+            with open(path, "w") as f: json.dump(self.stats(), f)
+        except Exception as e:
+            print("[frames] stats dump failed", e)
+
+    def summary(self):
+        st = self.stats()
+        return (f"{st['frames']} frames @ {st['fps']}/{st['fps_target']} Hz, "
+                f"overruns={st['overruns']} dropped={st['dropped']} max_show={st['max_show_ms']}ms")
@@ -8,6 +8,10 @@ USAGE
   <user>            1..4
   [timer_seconds]   default 60 (ignored if endless=True)
   [endless]         true/false/1/0/y/n (case-insensitive)
+  --backend virtual  run without GPIO/LEDs (see hw_backend.py)
+
+The launcher hosts it in-process via parse_args(argv) + run(params, rig)
+(see game_host.py); run as a script it builds its own Rig.
 
 Examples:
   python3 game1.py 1               # user=1, timer=60
@@ -17,9 +21,13 @@ Examples:
 
 import time, random, sys, os, re, subprocess
 from queue import Queue, Empty
-from gpiozero import Button
-from rpi_ws281x import PixelStrip, Color, ws
-import atexit, signal
+from hw_backend import Color
+import signal
+from game_rig import Rig
+from frame_scheduler import FrameScheduler
+from latency_stats import PressLatency
+from game_runtime import GameRuntime
+from flash_manager import FlashManager
 
 # ------------------------------
 # CLI parsing (tolerant booleans)
@@ -27,26 +35,44 @@ import atexit, signal
 def _as_bool(s):
     return str(s).strip().lower() in ("1","true","t","yes","y")
 
-user = int(sys.argv[1]) if len(sys.argv) > 1 else 1
-setG1_timer = int(sys.argv[2]) if len(sys.argv) > 2 else 60
-isEndless   = _as_bool(sys.argv[3]) if len(sys.argv) > 3 else False
-if isEndless:
-    setG1_timer = 999999
-
-# Per-user difficulty knobs (same as your original)
-setG1_lives     = 3
-setG1_interval  = 0.5
-setG1_showTime  = 0.3
-if user == 3:
-    setG1_interval = 0.4
-    setG1_showTime = 0.3
-elif user == 4:
-    setG1_interval = 0.3
-    setG1_showTime = 0.25
+def parse_args(argv):
+    """<user> [timer_seconds] [endless] -> params dict (argv without the script name)."""
+    return {
+        "user":    int(argv[0]) if len(argv) > 0 else 1,
+        "timer":   int(argv[1]) if len(argv) > 1 else 60,
+        "endless": _as_bool(argv[2]) if len(argv) > 2 else False,
+    }
+
+def configure(params):
+    global user, setG1_timer, isEndless, setG1_lives, setG1_interval, setG1_showTime, seed
+    user = params["user"]
+    seed = params.get("seed")
+    if seed is None: seed = params["seed"] = random.SystemRandom().randrange(2**32)     # in "start": replayable
+    rng.seed(seed)
+    setG1_timer = params["timer"]
+    isEndless   = params["endless"]
+    if isEndless:
+        setG1_timer = 999999
+
+    # Per-user difficulty knobs
+    knobs = USER_PRESETS.get(user, USER_PRESETS[1])
+    setG1_lives     = knobs["lives"]
+    setG1_interval  = knobs["interval"]
+    setG1_showTime  = knobs["showTime"]
+
+# Per-user difficulty presets: lives, gap between combo steps (s), how long each step is shown (s)
+USER_PRESETS = {
+    1: dict(lives=3, interval=0.5, showTime=0.3),
+    2: dict(lives=3, interval=0.5, showTime=0.3),
+    3: dict(lives=3, interval=0.4, showTime=0.3),
+    4: dict(lives=3, interval=0.3, showTime=0.25),
+}
 
 # ------------------------------
 # Static data (unchanged)
 # ------------------------------
+rng = random.Random()       # pads and combos; seeded per session (configure)
+
 punch_types = {
     1:"jabLeft", 2:"straightJab", 3:"jabRight", 4:"leftHook",
     5:"uppercut", 6:"rightHook", 7:"leftBodyShot", 8:"rightBodyShot"
@@ -61,102 +87,53 @@ punchCombos = [
     [2,2,8,1], [2,6,7], [2,2,4], [2,2,3,1], [2,6,1,1], [1,2], [2,3,1,3],
 ]
 
-pad_gpio = { 1:6, 2:17, 3:27, 4:22, 5:24, 6:25, 7:26, 8:16 }
-
 # ------------------------------
-# WS281x init (same config)
+# Session state (strip/buttons belong to the Rig and outlive the session)
 # ------------------------------
-testMode = False
-LED_PIN   = 21            # GPIO21 = PWM0/Ch0
-NUM_LEDS  = 632
-LEDS_PER_PAD = NUM_LEDS // 8
-BRIGHTNESS   = 40
-FREQ_HZ      = 800000
-DMA          = 10
-INVERT       = False
-CHANNEL      = 0
-STRIP_TYPE   = ws.WS2811_STRIP_GRB
-
-# derive led_address to match 79-per-pad layout
-led_address = {i:(i-1)*LEDS_PER_PAD for i in range(1,9)}
-
-if testMode:
-    NUM_LEDS = 24
-    LEDS_PER_PAD = NUM_LEDS // 8
-    led_address = {1:0,2:3,3:6,4:9,5:12,6:15,7:18,8:21}
-
-strip = PixelStrip(NUM_LEDS, LED_PIN, FREQ_HZ, DMA, INVERT, BRIGHTNESS, CHANNEL, STRIP_TYPE)
-strip.begin()
+rig = fb = frames = latency = flashes = runtime = tele = None
+event_q = Queue()
+clock, sleep = time.monotonic, time.sleep      # the rig's (virtual under replay)
+inputs_locked = False
+lock_release_time = 0.0
 
-# ------------------------------
-# LED helpers (global versions)
-# ------------------------------
+def begin_session(rig_):
+    global rig, fb, frames, latency, flashes, event_q, runtime, tele, inputs_locked, lock_release_time, clock, sleep
+    rig = rig_; fb = rig.fb; tele = rig.telemetry
+    clock, sleep = rig.clock, rig.sleep
+    frames = FrameScheduler(fb, clock=clock)
+    latency = PressLatency(frames, clock=clock)
+    flashes = FlashManager(fb, clock=clock)
+    event_q = rig.event_queue()
+    runtime = GameRuntime(event_q, frames, clock=clock, stop=rig.stop_requested)
+    runtime.add_source(flashes.next_expiry)
+    inputs_locked = False; lock_release_time = 0.0
+    rig.attach(event_q)
+
+def end_session():
+    try: lock_inputs(); rig.detach(); drain_events()
+    except: pass
+    try: flashes.cancel_all(); off_allStrips()
+    except: pass
+
+# immediate helpers: used around blocking sleeps, so they bypass the frame cadence
 def off_allStrips():
-    for i in range(NUM_LEDS):
-        strip.setPixelColor(i, Color(0,0,0))
-    strip.show()
+    fb.fill_all(Color(0,0,0))
+    frames.flush()
 
 def on_allStrips(color=Color(0,0,255)):
-    for i in range(NUM_LEDS):
-        strip.setPixelColor(i, color)
-    strip.show()
+    fb.fill_all(color)
+    frames.flush()
 
 def on_oneStrip(pid, color):
-    start = led_address[pid]; end = min(start+LEDS_PER_PAD, NUM_LEDS)
-    for i in range(start, end):
-        strip.setPixelColor(i, color)
-    strip.show()
+    fb.fill_pad(pid, color)
+    frames.flush()
 
 def off_oneStrip(pid):
     on_oneStrip(pid, Color(0,0,0))
 
-flash_expiry = {}
-flash_retainedColors = {}
-
-def start_flash(pid, color=Color(255,0,0), duration=1.0, retainedColor=None):
-    start = led_address[pid]; end = min(start+LEDS_PER_PAD, NUM_LEDS)
-    for i in range(start, end):
-        strip.setPixelColor(i, color)
-    strip.show()
-    flash_expiry[pid] = time.monotonic() + duration
-    if retainedColor is not None:
-        flash_retainedColors[pid] = retainedColor
-    else:
-        flash_retainedColors.pop(pid, None)
-
-def tick_flash_cleanup():
-    now = time.monotonic()
-    expired = [pid for pid,t in flash_expiry.items() if now >= t]
-    if not expired: return
-    for pid in expired:
-        start = led_address[pid]; end = min(start+LEDS_PER_PAD, NUM_LEDS)
-        retained = flash_retainedColors.pop(pid, 0)
-        for i in range(start, end):
-            strip.setPixelColor(i, retained)
-        del flash_expiry[pid]
-    strip.show()
-
-def flash_cancel(pid):        flash_expiry.pop(pid, None); flash_retainedColors.pop(pid, None)
-def flash_cancelAll():        flash_expiry.clear(); flash_retainedColors.clear()
-
 # ------------------------------
-# Input / buttons
+# Input lock
 # ------------------------------
-buttons = {}
-event_q = Queue()
-DEBOUNCE_S = 0.03
-
-def on_press(pad_id):   event_q.put(("press", pad_id, time.monotonic()))
-def on_release(pad_id): event_q.put(("release",pad_id, time.monotonic()))
-
-for pid,gpio in pad_gpio.items():
-    b = Button(gpio, pull_up=True, bounce_time=DEBOUNCE_S)
-    b.when_pressed = (lambda p=pid: on_press(p))
-    buttons[pid] = b
-
-inputs_locked = False
-lock_release_time = 0.0
-
 def drain_events():
     try:
         while True: event_q.get_nowait()
@@ -171,7 +148,7 @@ def lock_inputs():
 def unlock_inputs():
     global inputs_locked, lock_release_time
     inputs_locked = False
-    lock_release_time = time.monotonic()
+    lock_release_time = clock()
 
 def accepts_event(ts): return (not inputs_locked) and (ts > lock_release_time)
 
@@ -179,129 +156,97 @@ def accepts_event(ts): return (not inputs_locked) and (ts > lock_release_time)
 # Misc
 # ------------------------------
 def noRepeatRandom(current=1, lowest=1, highest=8):
-    r = random.randint(lowest, highest)
-    while r == current: r = random.randint(lowest, highest)
+    r = rng.randint(lowest, highest)
+    while r == current: r = rng.randint(lowest, highest)
     return r
 
-shutdown_done = False
-def clean_shutdown():
-    global shutdown_done
-    if shutdown_done: return
-    shutdown_done = True
-    try: lock_inputs(); drain_events()
-    except: pass
-    try:
-        for b in list(buttons.values()):
-            try: b.when_pressed=None; b.when_released=None
-            except: pass
-        for b in list(buttons.values()):
-            try: b.close()
-            except: pass
-    except: pass
-    try: flash_cancelAll(); off_allStrips()
-    except: pass
-    try:
-        if 'strip' in globals() and hasattr(strip, "_cleanup"): strip._cleanup()
-    except: pass
-    try: time.sleep(0.05)
-    except: pass
-
-atexit.register(clean_shutdown)
-def _sig_handler(signum, frame): sys.exit(0)
-signal.signal(signal.SIGINT, _sig_handler)
-signal.signal(signal.SIGTERM, _sig_handler)
-
 # ======================================================
 # GameMode 1 (two behaviors depending on user parameter)
 # ======================================================
 
 def run_user1():
-    """Buffered renderer; one show() per tick (fixes flicker race)."""
-    # local-only flash state & helpers (buffer-only; no strip.show())
-    G1_flash_expiry = {}
-    G1_flash_retained = {}
-    def g1_on_oneStrip(pid, color):
-        s = led_address[pid]; e = min(s+LEDS_PER_PAD, NUM_LEDS)
-        for i in range(s,e): strip.setPixelColor(i, color)
-    def g1_start_flash(pid, color=Color(255,0,0), duration=1.0, retainedColor=None):
-        g1_on_oneStrip(pid, color)
-        G1_flash_expiry[pid] = time.monotonic() + duration
-        if retainedColor is None: G1_flash_retained.pop(pid, None)
-        else: G1_flash_retained[pid] = retainedColor
-    def g1_tick_flash_cleanup():
-        now = time.monotonic()
-        expired = [pid for pid,t in G1_flash_expiry.items() if now >= t]
-        for pid in expired:
-            restore = G1_flash_retained.pop(pid, Color(0,0,0))
-            g1_on_oneStrip(pid, restore)
-            del G1_flash_expiry[pid]
-
-    G1_currentPad = random.randint(1,8)
+    """Buffered renderer; at most one show() per frame slot (fixes flicker race)."""
+    G1_currentPad = rng.randint(1,8)
     print(G1_currentPad)
     G1_reactionTimeList = []
-    g1_on_oneStrip(G1_currentPad, Color(0,0,255))
-    strip.show()
-    G1_referenceTime = time.monotonic()
+    fb.fill_pad(G1_currentPad, Color(0,0,255))
+    frames.flush()
+    G1_referenceTime = clock()
     G1_score = 0
-    G1_timer = time.monotonic()
+    G1_timer = clock()
     G1_maxTime = setG1_timer
     G1_highestCombo = 0
     G1_comboCount = 0
     G1_lives = setG1_lives
 
-    while (time.monotonic() - G1_timer) <= G1_maxTime and (G1_lives > 0):
-        try:
-            ev,pad_id,ts = event_q.get(timeout=0.05)
-            if not accepts_event(ts):
-                g1_tick_flash_cleanup(); strip.show(); time.sleep(0.003); continue
-        except Empty:
-            g1_tick_flash_cleanup(); strip.show(); time.sleep(0.003); continue
+    runtime.schedule(G1_timer + G1_maxTime)
+
+    while (clock() - G1_timer) <= G1_maxTime and (G1_lives > 0):
+        item = runtime.wait()           # next press, flash expiry or end of session
+        if item is None:
+            flashes.tick(); frames.present(); continue
+        ev,pad_id,ts = item
+        if not accepts_event(ts):
+            flashes.tick(); frames.present(); continue
 
         if ev != "press":
-            g1_tick_flash_cleanup(); strip.show(); continue
+            flashes.tick(); frames.present(); continue
+        t_dq = latency.dequeued(ts)
 
         if pad_id == G1_currentPad:
             print("Right pad", end=''); print(punch_types[pad_id])
             G1_score += 1; G1_comboCount += 1
-            rt = time.monotonic() - G1_referenceTime
+            rt = clock() - G1_referenceTime
             G1_reactionTimeList.append(rt)
+            tele.emit("hit", pad=pad_id, d=1, score=G1_score, combo=G1_comboCount, rt=round(rt, 4))
 
             prev = G1_currentPad
-            g1_start_flash(prev, Color(0,255,0), duration=1.0, retainedColor=Color(0,0,0))
+            flashes.start(prev, Color(0,255,0), 1.0)
             G1_currentPad = noRepeatRandom(prev, 1, 8)
             print(G1_currentPad)
-            g1_on_oneStrip(G1_currentPad, Color(251,255,0))
-            G1_referenceTime = time.monotonic()
+            flashes.cancel(G1_currentPad)     # a pending red flash must not blank the new target
+            fb.fill_pad(G1_currentPad, Color(251,255,0))
+            G1_referenceTime = clock()
         else:
             print("Wrong pad", end='')
-            g1_start_flash(pad_id, Color(255,0,0), duration=1.0, retainedColor=None)
+            flashes.start(pad_id, Color(255,0,0), 1.0)
             G1_lives -= 1
             print(punch_types[pad_id], G1_lives)
             if G1_comboCount > G1_highestCombo: G1_highestCombo = G1_comboCount
             G1_comboCount = 0
+            tele.emit("miss", pad=pad_id, reason="wrong_pad", score=G1_score, combo=0, lives=G1_lives)
 
-        g1_tick_flash_cleanup(); strip.show()
+        latency.judged(ts, t_dq)
+        flashes.tick(); frames.present()
 
     if G1_comboCount > G1_highestCombo: G1_highestCombo = G1_comboCount
     print(f"G1 Score = {G1_score}")
+    G1_avgReaction = None
     if G1_reactionTimeList:
-        print(f"G1 Reaction Time = {sum(G1_reactionTimeList)/len(G1_reactionTimeList)}")
+        G1_avgReaction = sum(G1_reactionTimeList)/len(G1_reactionTimeList)
+        print(f"G1 Reaction Time = {G1_avgReaction}")
     else:
         print("No valid reactions recorded.")
-    elapsed = max(0.001, time.monotonic() - G1_timer)
+    elapsed = max(0.001, clock() - G1_timer)
     print(f"G1 Punch Speed = {(G1_score/elapsed)}")
     print(f"G1 Highest Combo Streak = {G1_highestCombo}")
     print(f"G1 Longest Combo = 1")
+    print(f"G1 Latency = {latency.summary()}")
+    print(f"[frames] {frames.summary()}")
+    print(f"[runtime] {runtime.summary()}")
+    print(latency.result_line())
+    return dict(score=G1_score, lives=G1_lives, reactionTime=G1_avgReaction, punchSpeed=G1_score/elapsed,
+                highestCombo=G1_highestCombo, longestCombo=1, durationGame=elapsed)
 
 def run_user_ge2():
     """Your â€˜combo preview then repeatâ€™ logic for user>=2 (unchanged)."""
-    G1_randomCombo = (random.choice(punchCombos)).copy()
+    G1_randomCombo = (rng.choice(punchCombos)).copy()
     print(G1_randomCombo)
     G1_interval = setG1_interval
     G1_showTime = setG1_showTime
     G1_phase = "show"
-    G1_refTime = time.monotonic()
-    G1_timer = time.monotonic()
+    G1_refTime = clock()
+    G1_timer = clock()
     count = 0
     G1_score = 0
     lock_inputs()
@@ -312,17 +257,18 @@ def run_user_ge2():
     G1_maxTime = setG1_timer
     G1_highestCombo = 0
     G1_comboCount = 0
+    runtime.schedule(G1_timer + G1_maxTime)
 
-    while ((time.monotonic() - G1_timer) <= G1_maxTime) and (G1_lives > 0):
+    while ((clock() - G1_timer) <= G1_maxTime) and (G1_lives > 0):
         if G1_phase == "show":
-            if (time.monotonic() - G1_refTime) >= G1_interval:
+            if (clock() - G1_refTime) >= G1_interval:
                 if count < len(G1_randomCombo):
-                    flash_cancel(G1_randomCombo[count])
+                    flashes.cancel(G1_randomCombo[count])
                     on_oneStrip(G1_randomCombo[count], Color(0,0,255))
-                    time.sleep(G1_showTime)
+                    sleep(G1_showTime)
                     off_oneStrip(G1_randomCombo[count])
                     count += 1
-                    G1_refTime = time.monotonic()
+                    G1_refTime = clock()
                 elif G1_comboDisplayDone:
                     off_allStrips()
                     G1_phase = "hit"
@@ -330,70 +276,79 @@ def run_user_ge2():
                     G1_firstHitTime = 0
                     unlock_inputs()
                     count = 0
-                    G1_refTime = time.monotonic()
+                    G1_refTime = clock()
                     G1_comboDisplayDone = False
                     if user <= 2:
-                        flash_cancel(G1_randomCombo[count])
+                        flashes.cancel(G1_randomCombo[count])
                         on_oneStrip(G1_randomCombo[count], Color(251,255,0))
                 elif count == len(G1_randomCombo):
                     on_allStrips(Color(251,255,0))
-                    time.sleep(G1_interval)
+                    sleep(G1_interval)
                     G1_comboDisplayDone = True
-                    G1_refTime = time.monotonic()
+                    G1_refTime = clock()
 
         elif G1_phase == "hit":
-            try:
-                ev,pad_id,ts = event_q.get(timeout=0.05)
-                if not accepts_event(ts):
-                    tick_flash_cleanup(); continue
-            except Empty:
-                tick_flash_cleanup(); time.sleep(0.005); continue
+            item = runtime.wait()
+            if item is None:
+                flashes.tick(); frames.present(); continue
+            ev,pad_id,ts = item
+            if not accepts_event(ts):
+                flashes.tick(); frames.present(); continue
 
             if ev != "press":
-                tick_flash_cleanup(); continue
+                flashes.tick(); frames.present(); continue
+            t_dq = latency.dequeued(ts)
 
             if (count < len(G1_randomCombo)) and (pad_id == G1_randomCombo[count]):
                 temp_currentPad = G1_randomCombo[count]
                 next_same = ((count+1 < len(G1_randomCombo)) and
                              (G1_randomCombo[count+1] == temp_currentPad) and
                              (user <= 2))
-                start_flash(temp_currentPad, Color(0,255,0), duration=0.5,
-                            retainedColor=(Color(251,255,0) if next_same else None))
+                flashes.start(temp_currentPad, Color(0,255,0), 0.5, retained=(Color(251,255,0) if next_same else None))
                 count += 1; G1_score += 1
                 G1_comboCount += 1
                 if not G1_firstHit:
-                    G1_firstHitTime = time.monotonic() - G1_refTime
+                    G1_firstHitTime = clock() - G1_refTime
                     G1_firstHit = True
+                tele.emit("hit", pad=pad_id, d=1, score=G1_score, combo=G1_comboCount, step=count)
                 if (count < len(G1_randomCombo)) and (user <= 2) and (not next_same):
                     next_pid = G1_randomCombo[count]
-                    flash_cancel(next_pid)
-                    on_oneStrip(next_pid, Color(251,255,0))
-                tick_flash_cleanup()
+                    flashes.cancel(next_pid)
+                    fb.fill_pad(next_pid, Color(251,255,0))
+                latency.judged(ts, t_dq)
+                flashes.tick(); frames.present()
                 if count == len(G1_randomCombo):
-                    G1_totalTime = time.monotonic() - G1_refTime
+                    G1_totalTime = clock() - G1_refTime
                     G1_punchSpeeds.append({
                         "firstHit": G1_firstHitTime,
                         "time": G1_totalTime,
                         "punchNumber": count,
                         "combo": G1_randomCombo[:],
                     })
-                    on_allStrips(Color(0,255,0)); time.sleep(G1_interval); off_allStrips()
+                    tele.emit("combo", n=count, time=round(G1_totalTime, 4), firstHit=round(G1_firstHitTime, 4))
+                    on_allStrips(Color(0,255,0)); sleep(G1_interval); off_allStrips()
                     G1_phase = "show"; lock_inputs(); count = 0
-                    G1_randomCombo = (random.choice(punchCombos)).copy()
+                    G1_randomCombo = (rng.choice(punchCombos)).copy()
                     print(G1_randomCombo)
-                    G1_refTime = time.monotonic()
+                    G1_refTime = clock()
                 continue
 
             elif (count < len(G1_randomCombo)) and (pad_id != G1_randomCombo[count]):
                 print("Wrong")
-                start_flash(pad_id, Color(255,0,0), duration=1.0)
+                flashes.start(pad_id, Color(255,0,0), 1.0)
                 G1_lives -= 1
                 if user == 4: count = 0
                 if G1_comboCount > G1_highestCombo: G1_highestCombo = G1_comboCount
                 G1_comboCount = 0
-                tick_flash_cleanup(); continue
+                tele.emit("miss", pad=pad_id, reason="wrong_pad", score=G1_score, combo=0, lives=G1_lives)
+                latency.judged(ts, t_dq)
+                flashes.tick(); frames.present(); continue
 
-        tick_flash_cleanup(); time.sleep(0.005)
+        flashes.tick(); frames.present()
+        if G1_phase == "show":
+            # inputs are locked while the combo is shown; just sleep to the next step
+            runtime.schedule(G1_refTime + G1_interval)
+            runtime.wait()
 
     # results
     G1_speedHold = []
@@ -407,6 +362,7 @@ def run_user_ge2():
             G1_longestCombo = len(i["combo"])
 
     print(f"G1 Score = {G1_score}")
+    avg_first = avg_speed = None
     if G1_punchSpeeds:
         avg_first = sum(d["firstHit"] for d in G1_punchSpeeds)/len(G1_punchSpeeds)
         valid = [d for d in G1_punchSpeeds if d.get("time",0)>0]
@@ -418,13 +374,41 @@ def run_user_ge2():
         print("No valid punches recorded.")
     print(f"G1 Highest Combo Streak = {G1_highestCombo}")
     print(f"G1 Longest Combo = {G1_longestCombo}")
+    print(f"G1 Latency = {latency.summary()}")
+    print(f"[frames] {frames.summary()}")
+    print(f"[runtime] {runtime.summary()}")
+    print(latency.result_line())
+    return dict(score=G1_score, lives=G1_lives, reactionTime=avg_first, punchSpeed=avg_speed,
+                highestCombo=G1_highestCombo, longestCombo=G1_longestCombo, combos=len(G1_punchSpeeds),
+                durationGame=clock() - G1_timer)
+
+def run(params, rig_):
+    """Host entry point: one Combo session on rig_ (see game_host.py)."""
+    configure(params)
+    begin_session(rig_)
+    print("Starting Combo Mode (GameMode 1) ... user =", user)
+    tele.emit("start", game="gameMode1", params=params, seed=seed)
+    try:
+        off_allStrips()
+        rig.armed(game="gameMode1", user=user, seed=seed)
+        if user == 1: stats = run_user1()
+        else:         stats = run_user_ge2()
+        stats["seed"] = seed
+        tele.emit("final", **stats)
+    finally:
+        end_session()
+    return {"stats": stats, "latency": latency.stats()}
+
+def _sig_handler(signum, frame): sys.exit(0)
 
 if __name__ == "__main__":
-    print("Starting Combo Mode (GameMode 1) ... user =", user)
+    params = parse_args(sys.argv[1:])
+    signal.signal(signal.SIGINT, _sig_handler)
+    signal.signal(signal.SIGTERM, _sig_handler)
+    rig_ = Rig.from_env()
     try:
-        if user == 1: run_user1()
-        else:         run_user_ge2()
+        run(params, rig_)
     except KeyboardInterrupt:
         print("\nStopping Combo Mode.")
     finally:
-        clean_shutdown()
+        rig_.close()
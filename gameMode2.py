@@ -7,6 +7,10 @@ USAGE
 
   <user_level>     1..4  (1=beginner, 2=intermediate, 3=advanced, 4=expert)
   [timer_seconds]  optional, default: 60
+  --backend virtual  run without GPIO/LEDs (see hw_backend.py)
+
+The launcher hosts it in-process via parse_args(argv) + run(params, rig)
+(see game_host.py); run as a script it builds its own Rig.
 
 Examples:
   python3 game2.py 2          # level=2 (intermediate), 60s
@@ -15,98 +19,83 @@ Examples:
 
 import time, random, sys
 from queue import Queue, Empty
-from gpiozero import Button
-from rpi_ws281x import PixelStrip, Color, ws
-import atexit, signal
+from hw_backend import Color
+import signal
+from game_rig import Rig
+from frame_scheduler import FrameScheduler
+from lane_renderer import LaneRenderer
+from latency_stats import PressLatency
+from game_runtime import GameRuntime
+from flash_manager import FlashManager
 
 
 # ------------------------------
 # CLI: <user_level:int> [timer_seconds:int]
 # ------------------------------
-try:
-    user_level = int(sys.argv[1]) if len(sys.argv) > 1 else 2
-except ValueError:
-    user_level = 2
-user_level = max(1, min(4, user_level))   # clamp 1..4
-
-try:
-    TIMER_SECONDS = int(sys.argv[2]) if len(sys.argv) > 2 else 60
-except ValueError:
-    TIMER_SECONDS = 60
-TIMER_SECONDS = max(1, TIMER_SECONDS)
+def parse_args(argv):
+    """<user_level> [timer_seconds] -> params dict (argv without the script name)."""
+    try:
+        level = int(argv[0]) if len(argv) > 0 else 2
+    except ValueError:
+        level = 2
+    try:
+        timer = int(argv[1]) if len(argv) > 1 else 60
+    except ValueError:
+        timer = 60
+    return {"user_level": max(1, min(4, level)), "timer": max(1, timer)}   # clamp 1..4
 
 # Map levels to difficulty keys
 LEVEL_TO_DIFF = {1: "beginner", 2: "intermediate", 3: "advanced", 4: "expert"}
-DIFF = LEVEL_TO_DIFF[user_level]
+rng = random.Random()       # spawns, roles, timings; seeded per session (configure)
+
+def configure(params):
+    global user_level, TIMER_SECONDS, DIFF, C, seed
+    user_level = params["user_level"]
+    seed = params.get("seed")
+    if seed is None: seed = params["seed"] = random.SystemRandom().randrange(2**32)     # in "start": replayable
+    rng.seed(seed)
+    TIMER_SECONDS = params["timer"]
+    DIFF = LEVEL_TO_DIFF[user_level]
+    C = { **PRESETS[DIFF], "duration": TIMER_SECONDS }
 
 # ------------------------------
-# Common init (same as original)
+# Session state (strip/buttons belong to the Rig and outlive the session)
 # ------------------------------
-pad_gpio = { 1:6, 2:17, 3:27, 4:22, 5:24, 6:25, 7:26, 8:16 }
-
-testMode = False
-LED_PIN   = 21
-NUM_LEDS  = 632
-LEDS_PER_PAD = NUM_LEDS // 8
-BRIGHTNESS   = 40
-FREQ_HZ      = 800000
-DMA          = 10
-INVERT       = False
-CHANNEL      = 0
-STRIP_TYPE   = ws.WS2811_STRIP_GRB
-
-led_address = {i:(i-1)*LEDS_PER_PAD for i in range(1,9)}
-if testMode:
-    NUM_LEDS = 24; LEDS_PER_PAD = NUM_LEDS // 8
-    led_address = {1:0,2:3,3:6,4:9,5:12,6:15,7:18,8:21}
-
-strip = PixelStrip(NUM_LEDS, LED_PIN, FREQ_HZ, DMA, INVERT, BRIGHTNESS, CHANNEL, STRIP_TYPE)
-strip.begin()
+rig = fb = frames = lanes = latency = flashes = runtime = tele = None
+event_q = Queue()
+clock = time.monotonic      # the rig's (virtual under replay)
+inputs_locked = False
+lock_release_time = 0.0
+
+def begin_session(rig_):
+    global rig, fb, frames, lanes, latency, flashes, event_q, runtime, tele, inputs_locked, lock_release_time, clock
+    rig = rig_; fb = rig.fb; tele = rig.telemetry
+    clock = rig.clock
+    frames = FrameScheduler(fb, clock=clock)
+    lanes = LaneRenderer(fb)
+    latency = PressLatency(frames, clock=clock)
+    flashes = FlashManager(fb, clock=clock)
+    event_q = rig.event_queue()
+    runtime = GameRuntime(event_q, frames, clock=clock, stop=rig.stop_requested)
+    runtime.add_source(flashes.next_expiry)
+    inputs_locked = False; lock_release_time = 0.0
+    rig.attach(event_q)
+
+def end_session():
+    try: lock_inputs(); rig.detach(); drain_events()
+    except: pass
+    try: flashes.cancel_all(); off_allStrips()
+    except: pass
 
 def off_allStrips():
-    for i in range(NUM_LEDS): strip.setPixelColor(i, Color(0,0,0))
-    strip.show()
+    fb.fill_all(Color(0,0,0)); frames.flush()
 
+# buffer-only: the main loop's frames.present() shows these
 def on_oneStrip(pid, color):
-    s = led_address[pid]; e = min(s+LEDS_PER_PAD, NUM_LEDS)
-    for i in range(s,e): strip.setPixelColor(i, color)
-    strip.show()
+    fb.fill_pad(pid, color)
 
 def off_oneStrip(pid): on_oneStrip(pid, Color(0,0,0))
 
-flash_expiry = {}
-flash_retainedColors = {}
-def start_flash(pid, color=Color(255,0,0), duration=1.0, retainedColor=None):
-    s = led_address[pid]; e = min(s+LEDS_PER_PAD, NUM_LEDS)
-    for i in range(s,e): strip.setPixelColor(i, color)
-    strip.show()
-    flash_expiry[pid] = time.monotonic() + duration
-    if retainedColor is not None: flash_retainedColors[pid] = retainedColor
-    else: flash_retainedColors.pop(pid, None)
-
-def tick_flash_cleanup():
-    now = time.monotonic()
-    expired = [pid for pid,t in flash_expiry.items() if now >= t]
-    if not expired: return
-    for pid in expired:
-        s = led_address[pid]; e = min(s+LEDS_PER_PAD, NUM_LEDS)
-        retained = flash_retainedColors.pop(pid, 0)
-        for i in range(s,e): strip.setPixelColor(i, retained)
-        del flash_expiry[pid]
-    strip.show()
-
-# buttons / event queue
-buttons = {}; event_q = Queue()
-DEBOUNCE_S = 0.03
-def on_press(pad_id):   event_q.put(("press", pad_id, time.monotonic()))
-def on_release(pad_id): event_q.put(("release",pad_id, time.monotonic()))
-for pid,gpio in pad_gpio.items():
-    b = Button(gpio, pull_up=True, bounce_time=DEBOUNCE_S)
-    b.when_pressed = (lambda p=pid: on_press(p))
-    buttons[pid] = b
-
-inputs_locked = False
-lock_release_time = 0.0
 def drain_events():
     try:
         while True: event_q.get_nowait()
@@ -116,37 +105,14 @@ def lock_inputs():
     inputs_locked = True; drain_events()
 def unlock_inputs():
     global inputs_locked, lock_release_time
-    inputs_locked = False; lock_release_time = time.monotonic()
+    inputs_locked = False; lock_release_time = clock()
 def accepts_event(ts): return (not inputs_locked) and (ts > lock_release_time)
 
-shutdown_done = False
-def clean_shutdown():
-    global shutdown_done
-    if shutdown_done: return
-    shutdown_done = True
-    try: lock_inputs(); drain_events()
-    except: pass
-    try:
-        for b in list(buttons.values()):
-            try: b.when_pressed=None; b.when_released=None
-            except: pass
-        for b in list(buttons.values()):
-            try: b.close()
-            except: pass
-    except: pass
-    try: off_allStrips()
-    except: pass
-
-atexit.register(clean_shutdown)
-def _sig_handler(signum, frame): sys.exit(0)
-signal.signal(signal.SIGINT, _sig_handler)
-signal.signal(signal.SIGTERM, _sig_handler)
-
 # ------------------------------
 # Difficulty presets (unchanged)
 # ------------------------------
 BASE = dict(
-    duration=TIMER_SECONDS,  # <-- replaced with CLI timer
+    duration=60,             # <-- replaced with the session timer in configure()
     spawn_interval=0.95,
     ttl=5,
     max_active=2,
@@ -171,7 +137,6 @@ PRESETS = {
                       "friend_prob":0.30, "bonusPad_prob":0.25, "fake_flip_prob":0.40,
                       "flip_at_range":(0.45,0.55), "spawn_simultaneous_count":3 },
 }
-C = PRESETS[DIFF]
 
 COLOR_FOE      = Color(255,0,0)
 COLOR_FRIEND   = Color(0,255,0)
@@ -182,40 +147,58 @@ BONUSPAD_MAX_BONUS = 3
 
 def jitter(val, frac):
     j = val * frac
-    return max(0.05, random.uniform(val-j, val+j))
+    return max(0.05, rng.uniform(val-j, val+j))
 
 def render_flow(pid, color, t_ratio):
-    s = led_address[pid]; e = min(s+LEDS_PER_PAD, NUM_LEDS)
-    total = e - s
+    total = fb.segment_len(pid)
     lit = int(total * max(0.0, min(1.0, t_ratio)))
-    for idx in range(total):
-        i = s + idx
-        strip.setPixelColor(i, color if idx < lit else Color(0,0,0))
+    lanes.draw_bar(pid, lit, color)     # writes only the pixels that changed
+    return lit, total
+
+def render_frame(active, now):
+    """Flash cleanup + progress bars, drawn only when a frame slot is open."""
+    flashes.tick()
+    next_px = None
+    if frames.due():
+        for pid,t in active.items():
+            if pid not in flashes.overlaid:
+                t_ratio = max(0.0, min(1.0, (t["expires"]-now)/t["ttl"]))
+                lit, total = render_flow(pid, t["color"], t_ratio)
+                # the bar loses its next pixel once t_ratio drops below lit/total
+                if lit > 0:
+                    t_px = t["expires"] - t["ttl"] * lit / total
+                    if next_px is None or t_px < next_px: next_px = t_px
+    elif active:
+        runtime.request_frame()
+    frames.present()
+    # no point waking before the frame slot that could show the change
+    if next_px is not None: runtime.schedule(max(next_px, frames.next_at))
 
 def pick_role():
-    r = random.random()
+    r = rng.random()
     if r < C["bonusPad_prob"]: return ("bonusPad", COLOR_BONUSPAD)
     r -= C["bonusPad_prob"]
     if r < C["friend_prob"]:
-        if C["fake_flip_prob"] > 0.0 and random.random() < C["fake_flip_prob"]:
+        if C["fake_flip_prob"] > 0.0 and rng.random() < C["fake_flip_prob"]:
             return ("flip_friend", COLOR_FRIEND)
         return ("friend", COLOR_FRIEND)
     return ("foe", COLOR_FOE)
 
 def spawn_one(active, now):
-    available = [p for p in pad_gpio.keys() if p not in active]
+    available = [p for p in rig.pad_gpio.keys() if p not in active]
     if not available: return False
-    pid = random.choice(available)
+    pid = rng.choice(available)
     role,color = pick_role()
     ttl = jitter(C["ttl"], C["jitter_frac"])
-    if testMode: ttl += 5
+    if rig.test_mode: ttl += 5
     spawned_at = now; expires = now + ttl
     flip_at = None; flipped = False; rt_start = spawned_at
     if role == "flip_friend":
-        lo,hi = C["flip_at_range"]; flip_at = now + ttl * random.uniform(lo,hi)
+        lo,hi = C["flip_at_range"]; flip_at = now + ttl * rng.uniform(lo,hi)
         rt_start = flip_at
     active[pid] = dict(role=role, color=color, spawned_at=spawned_at, expires=expires,
                        ttl=ttl, rt_start=rt_start, kind=role, flip_at=flip_at, flipped=flipped)
+    runtime.schedule(expires); runtime.schedule(flip_at)
     return True
 
 def main():
@@ -226,11 +209,14 @@ def main():
     foe_rts = []
     active = {}
 
-    start_time = time.monotonic()
+    start_time = clock()
     next_spawn = start_time
+    runtime.schedule(next_spawn); runtime.schedule(start_time + C["duration"])
 
-    while (time.monotonic() - start_time) <= C["duration"] and (lives > 0):
-        now = time.monotonic()
+    while (clock() - start_time) <= C["duration"] and (lives > 0):
+        # sleep until the next pad event or deadline (spawn, expiry, flip, flash, bar pixel)
+        item = runtime.wait()
+        now = clock()
 
         for pid,t in list(active.items()):
             if t["role"] == "flip_friend" and not t["flipped"] and now >= t["flip_at"]:
@@ -241,90 +227,81 @@ def main():
                 role = t["role"]
                 if role == "foe":
                     foe_missed += 1; lives -= 1
+                    tele.emit("miss", pad=pid, reason="foe_missed", score=score, lives=lives)
                 elif role == "friend":
                     score += 1; friend_spared += 1
+                    tele.emit("score", pad=pid, d=1, reason="friend_spared", score=score)
                 elif role == "flip_friend":
                     score += 1; friend_spared += 1
+                    tele.emit("score", pad=pid, d=1, reason="friend_spared", score=score)
                 elif role == "bonusPad":
                     pass
                 off_oneStrip(pid); del active[pid]
 
-        interval_now = jitter(C["spawn_interval"], C["jitter_frac"])
         if now >= next_spawn and len(active) < C["max_active"]:
             spawns = min(C["spawn_simultaneous_count"], C["max_active"]-len(active))
             for _ in range(spawns):
                 if not spawn_one(active, now): break
-            next_spawn = now + interval_now
-
-        try:
-            ev,pad_id,ts = event_q.get(timeout=0.01)
-            if not accepts_event(ts):
-                tick_flash_cleanup()
-                for pid,t in active.items():
-                    if pid not in flash_expiry:
-                        t_ratio = max(0.0, min(1.0, (t["expires"]-now)/t["ttl"]))
-                        render_flow(pid, t["color"], t_ratio)
-                strip.show()
-                continue
-        except Empty:
-            tick_flash_cleanup()
-            for pid,t in active.items():
-                if pid not in flash_expiry:
-                    t_ratio = max(0.0, min(1.0, (t["expires"]-now)/t["ttl"]))
-                    render_flow(pid, t["color"], t_ratio)
-            strip.show(); time.sleep(0.004); continue
+            # drawn per spawn, not per wake-up: the RNG stream must not depend on how often the loop wakes
+            next_spawn = now + jitter(C["spawn_interval"], C["jitter_frac"])
+            runtime.schedule(next_spawn)
+
+        if item is None:
+            render_frame(active, now); continue
+        ev,pad_id,ts = item
+        if not accepts_event(ts):
+            render_frame(active, now)
+            continue
 
         if ev != "press":
-            tick_flash_cleanup()
-            for pid,t in active.items():
-                if pid not in flash_expiry:
-                    t_ratio = max(0.0, min(1.0, (t["expires"]-now)/t["ttl"]))
-                    render_flow(pid, t["color"], t_ratio)
-            strip.show()
+            render_frame(active, now)
             continue
+        t_dq = latency.dequeued(ts)
 
         if pad_id in active:
             t = active[pad_id]; role = t["role"]
             if role == "foe":
                 rt = max(0.0, now - t["rt_start"]); foe_rts.append(rt)
                 score += 1; hits += 1
-                start_flash(pad_id, Color(255,255,0), duration=0.20, retainedColor=0)
+                flashes.start(pad_id, Color(255,255,0), 0.20)
+                tele.emit("hit", pad=pad_id, d=1, role=role, score=score, rt=round(rt, 4))
                 del active[pad_id]
             elif role == "friend":
                 lives -= 1; friend_hit += 1
-                start_flash(pad_id, COLOR_BAD, duration=0.35, retainedColor=0)
+                flashes.start(pad_id, COLOR_BAD, 0.35)
+                tele.emit("miss", pad=pad_id, reason="friend_hit", score=score, lives=lives)
                 del active[pad_id]
             elif role == "flip_friend":
                 if not t["flipped"]:
                     lives -= 1; friend_hit += 1
-                    start_flash(pad_id, COLOR_BAD, duration=0.35, retainedColor=0)
+                    flashes.start(pad_id, COLOR_BAD, 0.35)
+                    tele.emit("miss", pad=pad_id, reason="friend_hit", score=score, lives=lives)
                 else:
                     rt = max(0.0, now - t["rt_start"]); foe_rts.append(rt)
                     score += 1; hits += 1
-                    start_flash(pad_id, Color(255,255,0), duration=0.20, retainedColor=0)
+                    flashes.start(pad_id, Color(255,255,0), 0.20)
+                    tele.emit("hit", pad=pad_id, d=1, role="foe", score=score, rt=round(rt, 4))
                 del active[pad_id]
             elif role == "bonusPad":
                 t_ratio = max(0.0, min(1.0, (t["expires"]-now)/t["ttl"]))
                 late = 1.0 - t_ratio
                 points = 1 + int(BONUSPAD_MAX_BONUS * late)
                 score += points; bonusPad_hits += 1; hits += 1
-                start_flash(pad_id, Color(255,255,0), duration=0.20, retainedColor=0)
+                flashes.start(pad_id, Color(255,255,0), 0.20)
+                tele.emit("hit", pad=pad_id, d=points, role=role, score=score)
                 del active[pad_id]
         else:
-            start_flash(pad_id, Color(255,0,0), duration=0.20, retainedColor=None)
+            flashes.start(pad_id, Color(255,0,0), 0.20)
+            tele.emit("miss", pad=pad_id, reason="empty_pad", score=score, lives=lives)
 
-        tick_flash_cleanup()
-        for pid,t in active.items():
-            if pid not in flash_expiry:
-                t_ratio = max(0.0, min(1.0, (t["expires"]-now)/t["ttl"]))
-                render_flow(pid, t["color"], t_ratio)
-        strip.show(); time.sleep(0.002)
+        latency.judged(ts, t_dq)
+        render_frame(active, now)
 
     for pid in list(active.keys()):
         off_oneStrip(pid)
     active.clear(); off_allStrips()
 
-    elapsed = max(0.0001, time.monotonic() - start_time)
+    elapsed = max(0.0001, clock() - start_time)
     print("G2 Score = ", score)
     print("G2 Lives Left = ", lives)
     print("G2 Hits = ", hits)
@@ -338,6 +315,17 @@ def main():
         
     print("G2 RT Avg = ", temp_rt)
     print("G2 Punch Speed = ", hits/elapsed)
+    print("G2 Latency = ", latency.summary())
+    print("[frames]", frames.summary())
+    print("[runtime]", runtime.summary())
+    print(latency.result_line())
+    stats = dict(score=score, lives=lives, hits=hits, friendSpared=friend_spared, friendHit=friend_hit,
+                 foeMissed=foe_missed, bonusPadHits=bonusPad_hits,
+                 reactionTime=(temp_rt if foe_rts else None), punchSpeed=hits/elapsed, durationGame=elapsed,
+                 seed=seed)
+    tele.emit("final", **stats)      # before the Firestore round trip
+    if not rig.upload:               # replays, simulations and benchmarks save nothing
+        return stats
 
     from firestore_fitfighter import add_friendfoe_session
     
@@ -360,13 +348,31 @@ def main():
 		sessionDate="Nov 3, 2025"
 		)
     print("Saved session:", session_id)
+    return stats
+
+def run(params, rig_):
+    """Host entry point: one Friend-or-Foe session on rig_ (see game_host.py)."""
+    configure(params)
+    begin_session(rig_)
+    tele.emit("start", game="gameMode2", params=params, seed=seed)
+    try:
+        off_allStrips()
+        rig.armed(game="gameMode2", level=user_level, seed=seed)
+        stats = main()
+    finally:
+        end_session()
+    return {"stats": stats, "latency": latency.stats()}
+
+def _sig_handler(signum, frame): sys.exit(0)
 
 if __name__ == "__main__":
+	params = parse_args(sys.argv[1:])
+	signal.signal(signal.SIGINT, _sig_handler)
+	signal.signal(signal.SIGTERM, _sig_handler)
+	rig_ = Rig.from_env()
 	try:
-		main()
+		run(params, rig_)
 	except KeyboardInterrupt:
 		print("\nStopping Friend-or-Foe.")
 	finally:
-		clean_shutdown()
-        
-		
+		rig_.close()
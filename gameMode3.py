@@ -3,119 +3,88 @@
 Rhythm (GameMode 3)
 
 USAGE
-  python3 game3.py <user> <audio_path> <csv_path> [alsa_dev]
+  python3 game3.py <user> <audio_path> <csv_path> [alsa_dev|-] [chart_offset_s]
+  --backend virtual  run without GPIO/LEDs (see hw_backend.py)
+
+The launcher hosts it in-process via parse_args(argv) + run(params, rig)
+(see game_host.py); run as a script it builds its own Rig.
 
 Notes:
 - Logic, windows, and rendering match your integrated version.
-- CSV header must be: beat_index,time_s,pad
+- CSV header must be: beat_index,time_s,pad; it is compiled on first use
+  and mapped from the cache afterwards (beatmap.py)
+- a prepared start (the launcher's `prepare`) loads the chart, opens the
+  audio output and parks the song paused at 0 before reporting armed; `go`
+  just resumes it (start_gate.py)
+- chart_offset_s overrides the chart's own offset (beatmap.chart_offset);
+  the rig's audio / visual latency comes from calibrate.py
+  (rig_calibration.py)
 """
 
-import time, csv, os, sys
-from queue import Queue, Empty
-from gpiozero import Button
-from rpi_ws281x import PixelStrip, Color, ws
-import atexit, signal, vlc
+import time, os, sys
+from queue import Queue
+from hw_backend import Color, vlc
+import signal
+from game_rig import Rig
+from frame_scheduler import FrameScheduler
+from lane_renderer import LaneRenderer
+from latency_stats import PressLatency
+from game_runtime import GameRuntime
+from flash_manager import FlashManager
+import beatmap
+from song_clock import SongClock
+from note_lanes import NoteLanes
 
 # ------------------------------
 # CLI
 # ------------------------------
-user      = int(sys.argv[1]) if len(sys.argv) > 1 else 1
-audio_path = sys.argv[2] if len(sys.argv) > 2 else "song.wav"
-csv_path   = sys.argv[3] if len(sys.argv) > 3 else None
-alsa_dev   = sys.argv[4] if len(sys.argv) > 4 else None
+def parse_args(argv):
+    """<user> <audio_path> <csv_path> [alsa_dev|-] [chart_offset_s] -> params dict (argv without the script name)."""
+    return {
+        "user":       int(argv[0]) if len(argv) > 0 else 1,
+        "audio_path": argv[1] if len(argv) > 1 else "song.wav",
+        "csv_path":   argv[2] if len(argv) > 2 else None,
+        "alsa_dev":   argv[3] if len(argv) > 3 and argv[3] != "-" else None,
+        "chart_offset": float(argv[4]) if len(argv) > 4 else None,
+    }
+
+def configure(params):
+    global user, audio_path, csv_path, alsa_dev, chart_offset
+    user       = params["user"]
+    audio_path = params["audio_path"]
+    csv_path   = params["csv_path"]
+    alsa_dev   = params["alsa_dev"]
+    chart_offset = params.get("chart_offset")
 
 # ------------------------------
-# Common init (same as original)
+# Session state (strip/buttons belong to the Rig and outlive the session)
 # ------------------------------
-pad_gpio = { 1:6, 2:17, 3:27, 4:22, 5:24, 6:25, 7:26, 8:16 }
-
-testMode = False
-LED_PIN   = 21
-NUM_LEDS  = 632
-LEDS_PER_PAD = NUM_LEDS // 8
-BRIGHTNESS   = 40
-FREQ_HZ      = 800000
-DMA          = 10
-INVERT       = False
-CHANNEL      = 0
-STRIP_TYPE   = ws.WS2811_STRIP_GRB
-
-led_address = {i:(i-1)*LEDS_PER_PAD for i in range(1,9)}
-if testMode:
-    NUM_LEDS = 24; LEDS_PER_PAD = NUM_LEDS // 8
-    led_address = {1:0,2:3,3:6,4:9,5:12,6:15,7:18,8:21}
-
-strip = PixelStrip(NUM_LEDS, LED_PIN, FREQ_HZ, DMA, INVERT, BRIGHTNESS, CHANNEL, STRIP_TYPE)
-strip.begin()
-
-def off_allStrips():
-    for i in range(NUM_LEDS): strip.setPixelColor(i, Color(0,0,0))
-    strip.show()
-
-flash_expiry = {}; flash_retainedColors = {}
-def start_flash(pid, color=Color(255,0,0), duration=0.10, retainedColor=0):
-    s = led_address[pid]; e = min(s+LEDS_PER_PAD, NUM_LEDS)
-    for i in range(s,e): strip.setPixelColor(i, color)
-    strip.show()
-    flash_expiry[pid] = time.monotonic() + duration
-    if retainedColor is not None: flash_retainedColors[pid] = retainedColor
-    else: flash_retainedColors.pop(pid, None)
-def tick_flash_cleanup():
-    now = time.monotonic()
-    expired = [pid for pid,t in flash_expiry.items() if now >= t]
-    if not expired: return
-    for pid in expired:
-        s = led_address[pid]; e = min(s+LEDS_PER_PAD, NUM_LEDS)
-        retained = flash_retainedColors.pop(pid, 0)
-        for i in range(s,e): strip.setPixelColor(i, retained)
-        del flash_expiry[pid]
-    strip.show()
-
-buttons = {}; event_q = Queue()
-DEBOUNCE_S = 0.03
-def on_press(pad_id):   event_q.put(("press", pad_id, time.monotonic()))
-def on_release(pad_id): event_q.put(("release",pad_id, time.monotonic()))
-for pid,gpio in pad_gpio.items():
-    b = Button(gpio, pull_up=True, bounce_time=DEBOUNCE_S)
-    b.when_pressed = (lambda p=pid: on_press(p))
-    buttons[pid] = b
-
-inputs_locked = False
-lock_release_time = 0.0
-def drain_events():
-    try:
-        while True: event_q.get_nowait()
-    except Empty: pass
-def lock_inputs():
-    global inputs_locked
-    inputs_locked = True; drain_events()
-def unlock_inputs():
-    global inputs_locked, lock_release_time
-    inputs_locked = False; lock_release_time = time.monotonic()
-def accepts_event(ts): return (not inputs_locked) and (ts > lock_release_time)
-
-shutdown_done = False
-def clean_shutdown():
-    global shutdown_done
-    if shutdown_done: return
-    shutdown_done = True
-    try: lock_inputs(); drain_events()
+rig = fb = frames = lanes = latency = flashes = runtime = tele = notes = None
+event_q = Queue()
+clock, sleep = time.monotonic, time.sleep      # the rig's (virtual under replay)
+
+def begin_session(rig_):
+    global rig, fb, frames, lanes, latency, flashes, event_q, runtime, tele, clock, sleep
+    rig = rig_; fb = rig.fb; tele = rig.telemetry
+    clock, sleep = rig.clock, rig.sleep
+    frames = FrameScheduler(fb, clock=clock)
+    lanes = LaneRenderer(fb)
+    latency = PressLatency(frames, clock=clock)
+    flashes = FlashManager(fb, clock=clock)
+    event_q = rig.event_queue()
+    # sleep until the next pad event or song-time deadline; VLC state is polled at max_sleep
+    runtime = GameRuntime(event_q, frames, clock=clock, max_sleep=0.1, stop=rig.stop_requested)
+    runtime.add_source(flashes.next_expiry)
+    rig.attach(event_q)
+
+def end_session():
+    try: rig.detach()
     except: pass
-    try:
-        for b in list(buttons.values()):
-            try: b.when_pressed=None; b.when_released=None
-            except: pass
-        for b in list(buttons.values()):
-            try: b.close()
-            except: pass
-    except: pass
-    try: off_allStrips()
+    try: flashes.cancel_all(); off_allStrips()
     except: pass
 
-atexit.register(clean_shutdown)
-def _sig_handler(signum, frame): sys.exit(0)
-signal.signal(signal.SIGINT, _sig_handler)
-signal.signal(signal.SIGTERM, _sig_handler)
+def off_allStrips():
+    fb.fill_all(Color(0,0,0)); frames.flush()
 
 # ------------------------------
 # Rhythm constants (same)
@@ -134,7 +103,7 @@ BEAT_OFFSET   = 1.00
 LED_EARLY     = -0.012
 FLASH_DUR     = 0.10
 STARTUP_SETTLE_S = 0.20
-FRAME_DT      = 0.003
+PREROLL_TIMEOUT_S = 5.0
 
 J_WIN_PERFECT = 0.040
 J_WIN_GREAT   = 0.090
@@ -142,32 +111,56 @@ J_WIN_GOOD    = 0.150
 J_LATE_CUTOFF = 0.220
 COMBO_SWAP_AT = 50
 
-song_CSV_offset = {
-    "Daikirai_Beatmap.csv": 1.73,
-    "Shape_of_You_Beatmap.csv": 1.12,
-    "PPPP.csv": 1.19,
-}
-_csv_key = os.path.basename(csv_path) if csv_path else None
-CSV_TIME_OFFSET = song_CSV_offset.get(_csv_key, 0.0)
-
 # ------------------------------
 # Helpers
 # ------------------------------
-def render_pad(pid, now_s, active, combo):
-    s = led_address[pid]; e = min(s+LEDS_PER_PAD, NUM_LEDS)
-    seg_len = e - s
-    if seg_len <= 0: return
-    for idx in range(s,e): strip.setPixelColor(idx, Color(0,0,0))
-    base_colors = (COLOR_ORANGE_B, COLOR_BLUE_B, COLOR_ORANGE_B) if combo >= COMBO_SWAP_AT else (COLOR_PINK, COLOR_CYAN, COLOR_PINK)
-    for note in reversed(active[pid]):
-        if note.get("judged"): continue
-        t0 = note["t_appear"]; th = note["t_hit"]
+PALETTE       = (COLOR_PINK, COLOR_CYAN, COLOR_PINK)
+PALETTE_COMBO = (COLOR_ORANGE_B, COLOR_BLUE_B, COLOR_ORANGE_B)
+
+# what render_pad last drew per pad: live window and palette (with notes.lit per note)
+drawn_head = [-1] * 9; drawn_tail = [-1] * 9; drawn_combo = [False] * 9
+
+def render_pad(pid, now_s, combo):
+    seg_len = fb.segment_len(pid)
+    if seg_len <= 0: return None
+    swap = combo >= COMBO_SWAP_AT
+    h, t, idx = notes.head[pid], notes.tail[pid], notes.idx[pid]
+    t_hit, t_appear, lit_drawn = notes.t_hit, notes.t_appear, notes.lit
+    # unchanged bars are not handed to the renderer (no allocation on those frames)
+    changed = h != drawn_head[pid] or t != drawn_tail[pid] or swap != drawn_combo[pid] or not lanes.intact(pid)
+    next_px = None    # song time at which one of these bars gains its next pixel
+    for k in range(h, t):
+        i = idx[k]
+        t0 = t_appear[i]; th = t_hit[i]
         if th <= t0 or now_s <= t0: r = 0.0
         else: r = (now_s - t0) / (th - t0)
         r = 0.0 if r < 0 else (1.0 if r > 1.0 else r)
-        lit = int(seg_len * r); color = base_colors[note["layer"]]
-        for k in range(lit):
-            strip.setPixelColor(s + k, color)
+        lit = int(seg_len * r)
+        if lit != lit_drawn[i]:
+            lit_drawn[i] = lit; changed = True
+        if lit < seg_len and th > t0:
+            t_px = t0 + (th - t0) * (lit + 1) / seg_len
+            if next_px is None or t_px < next_px: next_px = t_px
+    if changed:
+        base_colors = PALETTE_COMBO if swap else PALETTE
+        # draw order: newest note first, oldest ends on top
+        lanes.draw(pid, [(lit_drawn[idx[k]], base_colors[notes.layer[idx[k]]]) for k in range(t - 1, h - 1, -1)])
+        drawn_head[pid], drawn_tail[pid], drawn_combo[pid] = h, t, swap
+    return next_px
+
+def preroll(player):
+    """Open the audio output and park the song, muted, at its start; False if VLC will not play it."""
+    player.audio_set_volume(0)
+    player.play()
+    t_end = clock() + PREROLL_TIMEOUT_S
+    for want in (vlc.State.Playing, vlc.State.Paused):
+        while player.get_state() != want or player.get_time() < 0:
+            if player.get_state() in (vlc.State.Error, vlc.State.Ended, vlc.State.Stopped) or clock() > t_end:
+                return False
+            sleep(0.005)
+        if want == vlc.State.Playing: player.set_pause(1)
+    player.set_time(0)
+    return True
 
 def judge_for_delta(dt):
     adt = abs(dt)
@@ -182,25 +175,22 @@ def judge_for_delta(dt):
 # ------------------------------
 def main():
     print("Starting Rhythm (GameMode 3) ...")
-    # Load CSV
+    # Load beatmap (columns sorted by t_appear)
     if not csv_path or not os.path.exists(csv_path):
         print(f"[Mode 3] CSV not found: {csv_path}")
-        events = []
+        bm = beatmap.Beatmap.empty()
     else:
-        events = []
-        with open(csv_path, "r", newline="") as f:
-            r = csv.reader(f)
-            header = next(r, None)
-            if not header or [h.strip().lower() for h in header] != ["beat_index","time_s","pad"]:
-                raise ValueError("[Mode 3] CSV must have header: beat_index,time_s,pad")
-            for row in r:
-                if len(row) < 3: continue
-                beat_idx = int(row[0]); t_hit = float(row[1]) + CSV_TIME_OFFSET; pad_id = int(row[2])
-                if t_hit < 0: t_hit = 0.0
-                t_appear = max(0.0, t_hit - BEAT_OFFSET)
-                events.append(dict(beat=beat_idx, pad=pad_id, t_hit=t_hit, t_appear=t_appear))
-        events.sort(key=lambda e: e["t_appear"])
-        print(f"[Mode 3] Loaded {len(events)} beats from {os.path.basename(csv_path)}")
+        bm = beatmap.load(csv_path, chart_offset, BEAT_OFFSET)
+        print(f"[Mode 3] Loaded {len(bm)} beats from {os.path.basename(csv_path)}, offset {bm.offset_s:+g}s ({bm.source})")
+    try:
+        return play(bm)
+    finally:
+        bm.close()
+
+def play(bm):
+    global notes
+    n_beats = len(bm)
+    bm_t_hit, bm_beat = bm.t_hit, bm.beat
 
     # Setup audio (VLC)
     if not os.path.exists(audio_path):
@@ -209,83 +199,93 @@ def main():
 
     if os.geteuid() == 0:
         dev = alsa_dev or "plughw:0,0"
-        inst = vlc.Instance("--aout=alsa", f"--alsa-audio-device={dev}",
-                            "--no-audio-time-stretch", "--file-caching=150")
+        inst = rig.vlc_instance("--aout=alsa", f"--alsa-audio-device={dev}",
+                                "--no-audio-time-stretch", "--file-caching=150")
         dev_used = dev
     else:
-        inst = vlc.Instance("--no-audio-time-stretch", "--file-caching=150")
+        inst = rig.vlc_instance("--no-audio-time-stretch", "--file-caching=150")
         dev_used = "system-default"
 
-    player = inst.media_player_new()
+    player = rig.media_player(inst)
     player.set_media(inst.media_new(audio_path))
-    player.audio_set_volume(80)
-    player.play()
-
-    # Lock timebase
-    t_sync = None
-    t_lock_start = time.perf_counter()
-    while True:
-        state = player.get_state()
-        if state in (vlc.State.Error, vlc.State.Ended, vlc.State.Stopped):
-            break
-        t_ms = player.get_time()
-        if t_ms is not None and t_ms >= 0:
-            if (time.perf_counter() - t_lock_start) >= STARTUP_SETTLE_S:
-                t_sync = time.perf_counter() - (t_ms / 1000.0)
-                break
-        time.sleep(0.005)
-
-    if t_sync is None:
-        print("[Mode 3] Could not lock VLC timebase; aborting.")
-        off_allStrips()
-        return
 
-    # Input / runtime state
-    buttons = {}; event_q = Queue()
-    for pid,gpio in pad_gpio.items():
-        b = Button(gpio, pull_up=True, bounce_time=DEBOUNCE_S)
-        b.when_pressed = (lambda p=pid: event_q.put(("press", p, time.monotonic())))
-        buttons[pid] = b
-
-    active = {pid: [] for pid in pad_gpio.keys()}
-    ev_i = 0
+    # Input / runtime state: per-pad lanes of live notes
+    pads = tuple(rig.pad_gpio.keys())
+    notes = NoteLanes(bm, pads)
+    for pid in pads: drawn_head[pid] = drawn_tail[pid] = -1
     score = combo = max_combo = cnt_perfect = cnt_great = cnt_good = cnt_late = cnt_miss = 0
     rts = []
     song_len_s = None
 
-    def layer_for_pad(pid): return len(active[pid]) % 3
+    # judged against what the player hears (audio latency), drawn ahead by the LED latency
+    cal = rig.calibration()
+    audio_s, visual_s = cal["audio_ms"] / 1000.0, cal["visual_ms"] / 1000.0
+    print(f"[Mode 3] Rig {rig.device_id}: audio {cal['audio_ms']:+g} ms, visual {cal['visual_ms']:+g} ms")
+
+    # a prepared start parks the song at 0 with the audio output open, then waits for go
+    prepared = rig.gate is not None
+    if prepared and not preroll(player):
+        print("[Mode 3] Could not pre-roll the song; aborting.")
+        player.stop(); off_allStrips()
+        return
+    off_allStrips()
+    rig.armed(game="gameMode3", beats=n_beats, song=os.path.basename(audio_path))
+
+    # Lock timebase; song_clock keeps following the player from there
+    song_clock = SongClock(player.get_time, clock=clock)
+    player.audio_set_volume(80)
+    if prepared:
+        t_ms = player.get_time()        # paused: exact
+        player.set_pause(0)
+        song_clock.lock(max(0, t_ms))
+    else:
+        player.play()
+        t_lock_start = clock()
+        while True:
+            state = player.get_state()
+            if state in (vlc.State.Error, vlc.State.Ended, vlc.State.Stopped):
+                break
+            t_ms = player.get_time()
+            if t_ms is not None and t_ms >= 0:
+                if (clock() - t_lock_start) >= STARTUP_SETTLE_S:
+                    song_clock.lock(t_ms)
+                    break
+            sleep(0.005)
+
+    if song_clock.t is None:
+        print("[Mode 3] Could not lock VLC timebase; aborting.")
+        player.stop(); off_allStrips()
+        return
+    # keep sampling the player clock even when no note or press is due
+    runtime.add_source(lambda: max(clock(), song_clock.next_sample))
+
+    def schedule_song(t_song):
+        if t_song is not None:
+            runtime.schedule(clock() + song_clock.until(t_song + audio_s))
+    item = None
 
     print(f"[Mode 3] Playing: {audio_path} via {dev_used}")
-    start_perf = time.perf_counter()
+    start_perf = clock()
     try:
         while player.get_state() not in (vlc.State.Ended, vlc.State.Error, vlc.State.Stopped):
-            song_now = time.perf_counter() - t_sync
+            song_now = song_clock.update() - audio_s
+            view_now = song_now + visual_s
             if song_len_s is None:
                 L = player.get_length()
                 if L and L > 0: song_len_s = L / 1000.0
 
-            while ev_i < len(events) and (events[ev_i]["t_appear"] + LED_EARLY) <= song_now:
-                ev = events[ev_i]; pid = ev["pad"]
-                if 1 <= pid <= 8:
-                    active[pid].append({
-                        "beat": ev["beat"], "t_hit": ev["t_hit"],
-                        "t_appear": ev["t_appear"], "layer": layer_for_pad(pid),
-                        "hit": None, "judged": False
-                    })
-                ev_i += 1
-
-            try:
-                ev,pad_id,ts = event_q.get(timeout=0.0)
-                if ev == "press" and 1 <= pad_id <= 8 and active[pad_id]:
-                    note = None
-                    for n in active[pad_id]:
-                        if not n["judged"]: note = n; break
-                    if note is not None:
-                        dt = song_now - note["t_hit"]
+            notes.appear(view_now - LED_EARLY)
+
+            if item is not None:
+                ev,pad_id,ts = item
+                if ev == "press": t_dq = latency.dequeued(ts)     # stop and other wake-ups are not input
+                if ev == "press" and 1 <= pad_id <= 8 and notes.live(pad_id):
+                    i = notes.first(pad_id)
+                    if i >= 0:
+                        dt = song_now - bm_t_hit[i]
                         name, pts, jcolor = judge_for_delta(dt)
                         if name is not None:
-                            note["hit"] = song_now; note["judged"] = True
-                            active[pad_id] = [n for n in active[pad_id] if not n["judged"]]
+                            notes.pop(pad_id)
                             if   name == "Perfect": cnt_perfect += 1
                             elif name == "Great":   cnt_great += 1
                             elif name == "Good":    cnt_good += 1
@@ -295,37 +295,51 @@ def main():
                                 combo += 1; max_combo = max(max_combo, combo); rts.append(abs(dt))
                             else:
                                 combo = 0
-                            start_flash(pad_id, jcolor, duration=FLASH_DUR, retainedColor=0)
+                            flashes.start(pad_id, jcolor, FLASH_DUR)
+                            tele.emit("hit", pad=pad_id, d=pts, judge=name, dt=round(dt, 4), score=score, combo=combo)
                         else:
                             combo = 0
-                            start_flash(pad_id, COLOR_RED, duration=0.08, retainedColor=None)
+                            flashes.start(pad_id, COLOR_RED, 0.08)
+                            tele.emit("miss", pad=pad_id, reason="early", dt=round(dt, 4), score=score, combo=0)
                 elif ev == "press":
-                    start_flash(pad_id, COLOR_RED, duration=0.08, retainedColor=None)
-            except Empty:
-                pass
-
-            # expire unjudged -> Miss
-            for pid in list(active.keys()):
-                for n in active[pid]:
-                    if n["judged"]: continue
-                    if (song_now - n["t_hit"]) > BEAT_EXPIRE_S:
-                        n["judged"] = True; cnt_miss += 1; combo = 0
-                        start_flash(pid, COLOR_RED, duration=FLASH_DUR, retainedColor=0)
-            for pid in list(active.keys()):
-                active[pid] = [n for n in active[pid] if not n["judged"]]
-
-            for pid in pad_gpio.keys():
-                if pid not in flash_expiry:
-                    render_pad(pid, song_now, active, combo)
-
-            strip.show()
-            tick_flash_cleanup()
-            time.sleep(FRAME_DT)
-
-        song_now = time.perf_counter() - t_sync
-        for pid in active:
-            for n in active[pid]:
-                if not n["judged"]: cnt_miss += 1
+                    flashes.start(pad_id, COLOR_RED, 0.08)
+                    tele.emit("miss", pad=pad_id, reason="empty_pad", score=score, combo=combo)
+                if ev == "press": latency.judged(ts, t_dq)
+
+            # expire unjudged -> Miss (lanes are due in order: only the head can expire)
+            for pid in pads:
+                i = notes.first(pid)
+                while i >= 0 and (song_now - bm_t_hit[i]) > BEAT_EXPIRE_S:
+                    notes.pop(pid); cnt_miss += 1; combo = 0
+                    flashes.start(pid, COLOR_RED, FLASH_DUR)
+                    tele.emit("miss", pad=pid, reason="missed", beat=bm_beat[i], score=score, combo=0)
+                    i = notes.first(pid)
+
+            # the strip only gets a frame per slot
+            flashes.tick()
+            next_px = None
+            if frames.due():
+                for pid in pads:
+                    if pid not in flashes.overlaid:
+                        t_px = render_pad(pid, view_now, combo)
+                        if t_px is not None and (next_px is None or t_px < next_px): next_px = t_px
+            elif notes.live_total:
+                runtime.request_frame()
+            frames.present()
+
+            # next deadlines: bar pixel (not before the next slot), note appearance, note expiry
+            if next_px is not None:
+                runtime.schedule(max(frames.next_at, clock() + (next_px - view_now)))
+            t_next = notes.next_appear()
+            if t_next is not None:
+                schedule_song(t_next + LED_EARLY - visual_s)
+            for pid in pads:
+                i = notes.first(pid)
+                if i >= 0: schedule_song(bm_t_hit[i] + BEAT_EXPIRE_S)
+            item = runtime.wait()
+
+        song_now = song_clock.now() - audio_s
+        cnt_miss += notes.live_total
 
     except KeyboardInterrupt:
         print("\n[Mode 3] Interrupted.")
@@ -333,11 +347,11 @@ def main():
         player.stop()
         off_allStrips()
 
-        elapsed = (song_len_s if song_len_s else (time.perf_counter() - start_perf))
+        elapsed = (song_len_s if song_len_s else (clock() - start_perf))
         hits = cnt_perfect + cnt_great + cnt_good + cnt_late
         punch_speed = (hits/elapsed) if elapsed > 0 else 0.0
         avg_rt = (sum(rts)/len(rts)) if rts else 0.0
-        max_score = (len(events)*3) if events else 1
+        max_score = (n_beats*3) if n_beats else 1
         accuracy_pct = (score/max_score)*100.0
 
         print("---- Rhythm Results ----")
@@ -348,13 +362,39 @@ def main():
         print(f"Avg RT (s)    : {avg_rt:.3f}")
         print(f"Punch Speed   : {punch_speed:.2f} hits/s")
         print(f"Accuracy      : {accuracy_pct:.2f}%")
+        print(f"Latency       : {latency.summary()}")
+        print(f"Frames        : {frames.summary()}")
+        print(f"Runtime       : {runtime.summary()}")
+        print(f"Clock         : {song_clock.summary()}")
+        print(latency.result_line())
         print("[Mode 3] Done.")
+        stats = dict(score=score, perfect=cnt_perfect, great=cnt_great, good=cnt_good, late=cnt_late,
+                     miss=cnt_miss, maxCombo=max_combo, reactionTime=avg_rt, punchSpeed=punch_speed,
+                     accuracy=accuracy_pct, durationGame=elapsed)
+        tele.emit("final", **stats)
+    return stats
+
+def run(params, rig_):
+    """Host entry point: one Rhythm session on rig_ (see game_host.py)."""
+    configure(params)
+    begin_session(rig_)
+    tele.emit("start", game="gameMode3", params=params)
+    try:
+        stats = main()
+    finally:
+        end_session()
+    return {"stats": stats or {}, "latency": latency.stats()}
+
+def _sig_handler(signum, frame): sys.exit(0)
 
 if __name__ == "__main__":
+    params = parse_args(sys.argv[1:])
+    signal.signal(signal.SIGINT, _sig_handler)
+    signal.signal(signal.SIGTERM, _sig_handler)
+    rig_ = Rig.from_env()
     try:
-        main()
+        run(params, rig_)
     except KeyboardInterrupt:
         print("\nStopping Rhythm Mode.")
     finally:
-        atexit.unregister(clean_shutdown)
-        clean_shutdown()
+        rig_.close()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+game_host.py
+
+In-process game host for the launcher.
+
+Each session used to be a fresh `python3 gameModeN.py ...` subprocess that
+re-imported gpiozero / rpi_ws281x / VLC, ran strip.begin() and re-claimed
+the eight pad GPIO lines before the first LED could light. GameHost keeps
+one Rig (strip, buttons, VLC instance; see game_rig.py) for the launcher's
+lifetime and runs each session on a worker thread through the game module's
+entry points:
+
+  parse_args(argv) -> params   same positional args as the command line
+  run(params, rig) -> dict     blocks for one session, returns its results
+                               ({"stats": {...}, "latency": {...}})
+
+Live events (telemetry.py) reach the launcher through the on_event
+callback given to start().
+
+Game modes are plugins: GAME_PLUGINS maps the MQTT game name to a module
+that is imported once, on first use or in preload(). More can be added with
+FITFIGHTER_GAME_PLUGINS="name=module,name2=module2".
+
+Game modules keep their session state in module globals, so a launcher
+driving several rigs gives each GameHost a `namespace`: the host then loads
+its own copy of every game module (registered as "<module>@<namespace>").
+
+A session started with arm=True (the launcher's `prepare`) gets a
+StartGate on the rig (start_gate.py): the game loads its assets, reports
+"armed" and waits in rig.armed() until go().
+
+One session runs at a time (there is one rig). stop() sets the rig's stop
+flag; the game's GameRuntime.wait() raises GameStopped and the session ends
+with RC_STOPPED, the code a SIGTERM'd subprocess used to report.
+"""
+
+import importlib
+import importlib.util
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+
+from game_rig import Rig
+from game_runtime import GameStopped
+from start_gate import StartGate
+from telemetry import Telemetry
+
+GAME_PLUGINS = {
+    "gameMode1": "gameMode1",
+    "gameMode2": "gameMode2",
+    "gameMode3": "gameMode3",
+    "calibrate": "calibrate",
+}
+RC_STOPPED = -signal.SIGTERM
+
+
+def _env_plugins():
+    out = {}
+    for item in os.getenv("FITFIGHTER_GAME_PLUGINS", "").split(","):
+        if "=" in item:
+            name, module = item.split("=", 1)
+            out[name.strip()] = module.strip()
+    return out
+
+
+class GameHost:
+    def __init__(self, rig=None, plugins=None, namespace=None):
+        self.rig = rig if rig is not None else Rig()
+        self.namespace = namespace
+        self.plugins = dict(GAME_PLUGINS)
+        self.plugins.update(_env_plugins() if plugins is None else plugins)
+        self._modules = {}
+        self._lock = threading.Lock()
+        self.session_id = None
+        self._thread = None
+
+    # ------------------------------
+    # Plugins
+    # ------------------------------
+    def load(self, game):
+        """Game module for `game`, imported on first use."""
+        mod = self._modules.get(game)
+        if mod is None:
+            name = self.plugins.get(game)
+            if name is None:
+                raise KeyError(f"unknown game '{game}'")
+            mod = self._import(name)
+            for attr in ("parse_args", "run"):
+                if not callable(getattr(mod, attr, None)):
+                    raise TypeError(f"game module '{name}' has no {attr}()")
+            self._modules[game] = mod
+        return mod
+
+    def _import(self, name):
+        if self.namespace is None:
+            return importlib.import_module(name)
+        private = f"{name}@{self.namespace}"
+        mod = sys.modules.get(private)
+        if mod is None:
+            spec = importlib.util.find_spec(name)
+            if spec is None or spec.origin is None:
+                raise ImportError(f"no game module '{name}'")
+            spec = importlib.util.spec_from_file_location(private, spec.origin)
+            mod = importlib.util.module_from_spec(spec)
+            sys.modules[private] = mod
+            try:
+                spec.loader.exec_module(mod)
+            except BaseException:
+                del sys.modules[private]
+                raise
+        return mod
+
+    def preload(self):
+        for game in self.plugins:
+            try:
+                self.load(game)
+            except Exception as e:
+                print(f"[host] preload {game} failed", e)
+
+    # ------------------------------
+    # Sessions
+    # ------------------------------
+    @property
+    def busy(self):
+        return self.session_id is not None
+
+    def start(self, session_id, game, argv, on_done, on_event=None, arm=False):
+        """Start a session on a worker thread; on_done(rc, result, runtime_s) when it ends.
+
+        on_event(ev) receives the session's telemetry events (on the game thread).
+        With arm=True the game stops at its start line (an "armed" event) until go().
+
+        Returns False if a session is already running. Unknown games and bad
+        arguments raise before anything is started.
+        """
+        mod = self.load(game)
+        params = mod.parse_args(list(argv))
+        with self._lock:
+            if self.session_id is not None:
+                return False
+            self.session_id = session_id
+            self.rig.telemetry = Telemetry(on_event)
+            self.rig.gate = StartGate() if arm else None
+            self._thread = threading.Thread(target=self._run, args=(session_id, mod, params, on_done),
+                                            name=f"game-{session_id}", daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self, session_id, mod, params, on_done):
+        t0 = time.monotonic()
+        rc, result = 0, {}
+        try:
+            result = mod.run(params, self.rig) or {}
+        except GameStopped:
+            rc = RC_STOPPED
+            print(f"[host] session {session_id} stopped")
+        except Exception:
+            rc = 1
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                self.session_id = None
+                self.rig.stop_requested.clear()
+                self.rig.telemetry = Telemetry()
+                self.rig.gate = None
+        on_done(rc, result, time.monotonic() - t0)
+
+    def go(self, session_id, t_cmd=None):
+        """Release an armed session; False if it is not the running one or was not prepared."""
+        with self._lock:
+            gate = self.rig.gate
+            if session_id != self.session_id or gate is None:
+                return False
+            gate.go(t_cmd)
+        return True
+
+    def stop(self, session_id=None):
+        """Abort the running session (any session if session_id is None)."""
+        with self._lock:
+            if self.session_id is None or (session_id is not None and session_id != self.session_id):
+                return False
+            self.rig.request_stop()
+        return True
+
+    def close(self, timeout=2.0):
+        self.stop()
+        t = self._thread
+        if t is not None: t.join(timeout)
+        self.rig.close()
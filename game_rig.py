@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+game_rig.py
+
+The hardware a FitFighter rig keeps for its whole lifetime: the WS281x strip
+(behind a FrameBuffer), the eight pad Buttons and, for Rhythm, the VLC
+instance.
+
+The game scripts used to build all of this at import and tear it down at
+exit, so every session paid for strip.begin() and re-claiming the GPIO
+lines. A Rig is built once (by the launcher's GameHost, or by a game's
+__main__ when run standalone) and lent to one session at a time:
+
+  rig.event_queue()     a fresh pad event queue for a session
+  rig.attach(event_q)   pad presses go to the session's queue as
+                        ("press", pad, monotonic_ts); the session is
+                        logged from here (session_log.py)
+  rig.detach()          presses are ignored again; the log is written
+  rig.request_stop()    sets rig.stop_requested and wakes the session; its
+                        GameRuntime.wait() raises GameStopped
+  rig.telemetry         where the session's live events go (telemetry.py);
+                        the in-process host swaps in its own per session
+  rig.armed(**info)     the session has loaded everything it needs; for a
+                        prepared start (rig.gate, start_gate.py) it reports
+                        "armed" and waits there for go
+  rig.clock, rig.sleep  the session's time source (time.monotonic /
+                        time.sleep; virtual under replay, session_replay.py)
+  rig.replaying         set by session_replay.py
+  rig.upload            False under replay, simulation or with
+                        FITFIGHTER_NO_UPLOAD=1 (bench_games.py): games skip
+                        the Firestore upload
+
+Pad input comes from, in order of preference: the launcher's
+PadInputService passed in as `pads` (in-process host), a PadSubscriber on
+FITFIGHTER_PAD_SOCKET (game processes started by the launcher), or the
+rig's own Buttons (standalone runs). See pad_input.py.
+
+Strip and pads default to the single-cabinet wiring below. A launcher that
+drives several cabinets (rig_config.py) passes each game process its rig
+definition in FITFIGHTER_RIG; Rig.from_env() picks it up.
+"""
+
+import json
+import os
+import threading
+import time
+from queue import Empty
+
+from hw_backend import PixelStrip, Color, ws, Button, DEFAULT_PAD_GPIO
+from led_framebuffer import FrameBuffer
+from pad_input import PadSubscriber, ENV_SOCKET
+from telemetry import Telemetry
+from start_gate import StartGate
+from session_log import SessionRecorder, RecordedQueue, RecordedPlayer, WAKE_IDLE, WAKE_SHOW
+import rig_calibration
+
+# ------------------------------
+# WS281x config (same as the game scripts had)
+# ------------------------------
+LED_PIN      = 21            # GPIO21 = PWM0/Ch0
+NUM_LEDS     = 632
+BRIGHTNESS   = 40
+FREQ_HZ      = 800000
+DMA          = 10
+INVERT       = False
+CHANNEL      = 0
+STRIP_TYPE   = ws.WS2811_STRIP_GRB
+
+DEBOUNCE_S = 0.03
+
+ENV_RIG = "FITFIGHTER_RIG"
+ENV_NO_UPLOAD = "FITFIGHTER_NO_UPLOAD"
+# rig definition key (rig_config.py, JSON) -> Rig() argument
+RIG_KEYS = {"deviceId": "device_id", "padGpio": "pad_gpio", "ledPin": "led_pin", "ledChannel": "channel",
+            "dma": "dma", "numLeds": "num_leds", "brightness": "brightness"}
+
+
+def rig_kwargs(spec):
+    """Rig() keyword arguments from a rig definition."""
+    kw = {arg: spec[key] for key, arg in RIG_KEYS.items() if spec.get(key) is not None}
+    if "pad_gpio" in kw:
+        kw["pad_gpio"] = {int(p): int(g) for p, g in kw["pad_gpio"].items()}
+    return kw
+
+
+class Rig:
+    def __init__(self, pad_gpio=DEFAULT_PAD_GPIO, test_mode=False, pads=None,
+                 led_pin=LED_PIN, channel=CHANNEL, dma=DMA, num_leds=NUM_LEDS, brightness=BRIGHTNESS,
+                 device_id=None):
+        # which cabinet this is (per-rig calibration, rig_calibration.py)
+        self.device_id = device_id or os.getenv("DEVICE_ID", "pi01")
+        self.pad_gpio = dict(pad_gpio)
+        self.test_mode = test_mode
+        leds_per_pad = num_leds // 8
+        # 79-per-pad layout
+        led_address = {i:(i-1)*leds_per_pad for i in range(1,9)}
+        if test_mode:
+            num_leds = 24; leds_per_pad = num_leds // 8
+            led_address = {1:0,2:3,3:6,4:9,5:12,6:15,7:18,8:21}
+
+        self.strip = PixelStrip(num_leds, led_pin, FREQ_HZ, dma, INVERT, brightness, channel, STRIP_TYPE)
+        self.strip.begin()
+        self.fb = FrameBuffer(self.strip, led_address, leds_per_pad, num_leds)
+        self.fb.after_show = self._shown
+
+        self.stop_requested = threading.Event()
+        self.telemetry = Telemetry.from_env()
+        self.gate = StartGate.from_env()
+        self.clock = time.monotonic
+        self.recorder = None
+        self.replaying = False      # True under session_replay.py
+        self.upload = not os.getenv(ENV_NO_UPLOAD)      # sessions go to Firestore
+        self._event_q = None
+        self._vlc = {}
+        self.buttons = {}
+        self.pads = pads
+        self.subscriber = None
+        socket_path = os.getenv(ENV_SOCKET)
+        if pads is not None:
+            pads.listeners.append(self._on_pad_event)
+        elif socket_path:
+            try:
+                self.subscriber = PadSubscriber(socket_path, self._on_pad_event)
+            except OSError as e:
+                print(f"[rig] pad service {socket_path} unavailable ({e}); opening GPIO")
+        if pads is None and self.subscriber is None:
+            for pid,gpio in self.pad_gpio.items():
+                b = Button(gpio, pull_up=True, bounce_time=DEBOUNCE_S)
+                b.when_pressed = (lambda p=pid: self._on_pad_event(0, p, time.monotonic()))
+                self.buttons[pid] = b
+        self.closed = False
+
+    @classmethod
+    def from_env(cls, **kw):
+        """Rig for a game process; FITFIGHTER_RIG (if set) says which cabinet it drives."""
+        spec = os.getenv(ENV_RIG)
+        if spec:
+            kw = dict(rig_kwargs(json.loads(spec)), **kw)
+        return cls(**kw)
+
+    def _on_pad_event(self, seq, pid, ts):
+        q = self._event_q
+        if q is not None:
+            rec = self.recorder
+            if rec is not None: rec.press(pid, ts)
+            q.put(("press", pid, ts))
+
+    # ------------------------------
+    # Session hand-off
+    # ------------------------------
+    def event_queue(self):
+        return RecordedQueue()
+
+    def attach(self, event_q, record=True):
+        """Route presses to event_q; with record, log the session until detach()."""
+        if record and self.recorder is None:
+            self.recorder = SessionRecorder.from_env(self.device_id, self.pad_gpio, self.clock)
+            if self.recorder is not None:
+                self.telemetry.tap = self.recorder.event
+                if isinstance(event_q, RecordedQueue): event_q.recorder = self.recorder
+        self._event_q = event_q
+
+    def detach(self):
+        q, self._event_q = self._event_q, None
+        rec, self.recorder = self.recorder, None
+        if rec is not None:
+            if isinstance(q, RecordedQueue): q.recorder = None
+            if self.telemetry.tap == rec.event: self.telemetry.tap = None
+            path = rec.close()
+            if path: print(f"[rig] session log {path}")
+
+    def request_stop(self):
+        self.stop_requested.set()
+        rec = self.recorder
+        if rec is not None: rec.stop()
+        q = self._event_q
+        if q is not None: q.put(("stop", 0, time.monotonic()))    # wake a blocked wait()
+
+    def armed(self, **info):
+        """Ready to play: for a prepared start report "armed" and hold until go (else return at once).
+
+        Returns the launcher-go -> game latency in ms for a prepared start, else None.
+        """
+        gate = self.gate
+        if gate is None: return None
+        self.telemetry.emit("armed", **info)
+        go_ms = gate.wait(self.stop_requested)
+        q = self._event_q
+        try:
+            while q is not None: q.get_nowait()     # presses while armed are not part of the game
+        except Empty:
+            pass
+        rec = self.recorder
+        if rec is not None: rec.go(go_ms)
+        self.telemetry.emit("go", go_ms=go_ms)
+        print("[rig] go" + (f" after {go_ms:.2f} ms" if go_ms is not None else ""))
+        return go_ms
+
+    def blank(self):
+        self.fb.fill_all(Color(0,0,0))
+        self.fb.show(force=True)
+
+    def sleep(self, dt):
+        """time.sleep for game code (a wake-up in the session log)."""
+        time.sleep(dt)
+        rec = self.recorder
+        if rec is not None: rec.wake(WAKE_IDLE)
+
+    def _shown(self):
+        rec = self.recorder
+        if rec is not None: rec.wake(WAKE_SHOW)        # a strip transfer takes real time
+
+    def calibration(self):
+        """This rig's Rhythm latency offsets (rig_calibration.py), as the session saw them."""
+        cal = rig_calibration.load(self.device_id)
+        rec = self.recorder
+        if rec is not None: rec.info("calibration", cal)
+        return cal
+
+    def media_player(self, inst):
+        """inst.media_player_new(); its readings go into the session log."""
+        player = inst.media_player_new()
+        rec = self.recorder
+        return RecordedPlayer(player, rec) if rec is not None else player
+
+    def vlc_instance(self, *args):
+        """VLC instance for these options, created on first use and kept."""
+        inst = self._vlc.get(args)
+        if inst is None:
+            from hw_backend import vlc
+            inst = self._vlc[args] = vlc.Instance(*args)
+        return inst
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        self.detach()
+        if self.pads is not None and self._on_pad_event in self.pads.listeners:
+            self.pads.listeners.remove(self._on_pad_event)
+        if self.subscriber is not None:
+            self.subscriber.close()
+        for b in self.buttons.values():
+            try: b.when_pressed = None; b.close()
+            except: pass
+        try: self.blank()
+        except: pass
+        try:
+            if hasattr(self.strip, "_cleanup"): self.strip._cleanup()
+        except: pass
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+game_runtime.py
+
+Deadline-driven wait for the game loops (replaces poll-and-sleep).
+
+The loops used to spin on event_q.get(timeout=0.01..0.05) plus a short
+time.sleep(), waking hundreds of times a second even with nothing to do.
+GameRuntime keeps a min-heap of upcoming deadlines (target expiries, flip
+times, spawns, note appearances, preview steps, the next pixel change of an
+animated bar) and wait() blocks on the pad event queue exactly until the
+earliest of:
+
+  - the next pad event
+  - the earliest scheduled deadline
+  - the earliest deadline reported by a source (e.g. flash expiries)
+  - the next frame slot, when the framebuffer has unshown writes or a frame
+    was requested
+  - max_sleep (safety net for things nobody scheduled, e.g. VLC state)
+
+Stale deadlines are harmless: a wake-up just re-runs the loop body, which
+re-checks its own state.
+
+With a `stop` Event (the rig's stop_requested), wait() raises GameStopped
+once it is set, so a hosted session can be aborted between loop iterations.
+"""
+
+import heapq
+import time
+from queue import Empty
+
+# Condition.wait() may return a hair before the deadline; waking a little late
+# avoids a second wake-up just to find the deadline not quite reached
+WAKE_SLACK_S = 0.0005
+
+
+class GameStopped(Exception):
+    """The session was stopped from outside (launcher stop command)."""
+
+
+class GameRuntime:
+    def __init__(self, event_q, frames=None, clock=time.monotonic, max_sleep=0.25, stop=None):
+        self.event_q = event_q
+        self.stop = stop
+        self.frames = frames
+        self.clock = clock
+        self.max_sleep = max_sleep
+        self._heap = []
+        self._seq = 0
+        self._sources = []
+        self._frame_requested = False
+        self.wakeups = 0
+        self.event_wakeups = 0
+        self._t0 = clock()
+
+    # ------------------------------
+    # Deadlines
+    # ------------------------------
+    def schedule(self, t):
+        """Wake no later than monotonic time `t`."""
+        if t is None: return
+        self._seq += 1
+        heapq.heappush(self._heap, (t, self._seq))
+
+    def schedule_in(self, dt):
+        self.schedule(self.clock() + dt)
+
+    def add_source(self, fn):
+        """fn() -> next deadline or None; polled on every wait()."""
+        self._sources.append(fn)
+
+    def request_frame(self):
+        """Wake at the next frame slot even if nothing is buffered yet (animations)."""
+        self._frame_requested = True
+
+    def next_deadline(self, now):
+        heap = self._heap
+        if heap and heap[0][0] <= now:        # something is already due: consume and run
+            while heap and heap[0][0] <= now: heapq.heappop(heap)
+            return now
+        t = heap[0][0] if heap else now + self.max_sleep
+        for fn in self._sources:
+            d = fn()
+            if d is not None and d < t: t = d
+        frames = self.frames
+        if frames is not None and (self._frame_requested or frames.fb.pending):
+            if frames.next_at < t: t = frames.next_at
+        return min(t, now + self.max_sleep)
+
+    # ------------------------------
+    # Wait
+    # ------------------------------
+    def wait(self):
+        """Block until the next event or deadline; returns the event tuple or None."""
+        stop = self.stop
+        if stop is not None and stop.is_set(): raise GameStopped()
+        now = self.clock()
+        timeout = self.next_deadline(now) - now
+        if timeout > 0: timeout += WAKE_SLACK_S
+        self._frame_requested = False
+        self.wakeups += 1
+        try:
+            if timeout <= 0:
+                item = self.event_q.get_nowait()
+            else:
+                item = self.event_q.get(timeout=timeout)
+        except Empty:
+            # this wake-up services every deadline that is now due
+            heap, now = self._heap, self.clock()
+            while heap and heap[0][0] <= now: heapq.heappop(heap)
+            return None
+        if stop is not None and stop.is_set(): raise GameStopped()
+        self.event_wakeups += 1
+        return item
+
+    def stats(self):
+        elapsed = max(1e-6, self.clock() - self._t0)
+        return {"wakeups": self.wakeups, "wakeups_per_s": round(self.wakeups / elapsed, 1),
+                "event_wakeups": self.event_wakeups}
+
+    def summary(self):
+        st = self.stats()
+        return f"{st['wakeups']} wakeups ({st['wakeups_per_s']}/s), {st['event_wakeups']} on pad events"
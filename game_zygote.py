@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+game_zygote.py
+
+Pre-warmed zygote for running each session in its own process
+(GAME_HOST_MODE=zygote in mqtt_pi_game.py).
+
+The launcher keeps one zygote running ahead of the next start command. It
+has already imported gpiozero / rpi_ws281x / vlc (through hw_backend) and
+every game module, and blocks on stdin for a single command line:
+
+  {"session": "<id>", "game": "gameMode2", "argv": ["3", "60"], "t_cmd": <monotonic>,
+   "arm": false}
+
+It forks at once; the child builds the Rig, runs the game's
+run(parse_args(argv), rig) and exits. Control messages go to stdout as
+`[zygote] {json}` lines, interleaved with the game's own output:
+
+  {"event": "ready", "import_ms": x}           imports done, waiting
+  {"event": "forked", "pid": n, "fork_ms": x}  t_cmd -> child running
+  {"event": "done", "rc": n, "first_frame_ms": y}
+                                               t_cmd -> first frame latched
+  {"event": "exit", "pid": n, "status": n}     child reaped
+
+The launcher hands each zygote the write end of a pipe in
+FITFIGHTER_TELEMETRY_FD, which the child inherits for its live events
+(telemetry.py); ZygoteLauncher keeps the read end as proc.telemetry.
+Likewise every zygote gets the read end of a go pipe in FITFIGHTER_GO_FD;
+a child started with "arm": true (the launcher's `prepare`) waits on it at
+its start line (start_gate.py) and ZygoteLauncher keeps the write end as
+proc.go. Other children close it.
+ZygoteLauncher runs on the launcher's asyncio loop: zygotes are asyncio
+subprocesses and warm() / start() / close() are coroutines.
+
+A zygote serves one session and exits with it; ZygoteLauncher spawns the
+replacement once the session is over, so a start never waits on imports
+unless it arrives while the replacement is still warming up.
+CLOCK_MONOTONIC is system-wide, so the launcher's t_cmd is comparable with
+the child's timestamps.
+
+USAGE
+  python3 game_zygote.py [--backend virtual]    (normally started by the launcher)
+"""
+
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+
+from telemetry import ENV_FD as TELEMETRY_FD_ENV
+from start_gate import StartGate, ENV_FD as GO_FD_ENV
+
+TAG = "[zygote] "
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def report(event, **fields):
+    # one write per line: the child writes to the same pipe
+    sys.stdout.write(TAG + json.dumps(dict(event=event, **fields), separators=(",", ":")) + "\n")
+    sys.stdout.flush()
+
+
+def parse_line(line):
+    """Launcher side: control message dict from a `[zygote] {...}` line, else None."""
+    if not line.startswith(TAG): return None
+    try:
+        return json.loads(line[len(TAG):])
+    except ValueError:
+        return None
+
+
+def _ms(t0, t1):
+    return round((t1 - t0) * 1000.0, 1) if t0 is not None and t1 is not None else None
+
+
+# ------------------------------
+# Zygote / child
+# ------------------------------
+def _child(games, cmd):
+    from game_rig import Rig
+    from game_runtime import GameStopped
+    from game_host import RC_STOPPED
+
+    def _stop(signum, frame): raise GameStopped()
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    # only a prepared start waits for go
+    go_fd = os.environ.pop(GO_FD_ENV, None)
+    if go_fd and not cmd.get("arm"):
+        os.close(int(go_fd)); go_fd = None
+
+    rc, first = 0, None
+    try:
+        mod = games[cmd["game"]]
+        params = mod.parse_args(list(cmd.get("argv") or []))
+        rig = Rig.from_env()
+        rig.gate = StartGate(int(go_fd)) if go_fd else None
+        try:
+            mod.run(params, rig)
+        finally:
+            first = rig.fb.first_show_at
+            rig.close()
+    except GameStopped:
+        rc = RC_STOPPED
+    except Exception:
+        rc = 1
+        traceback.print_exc(file=sys.stdout)
+    report("done", rc=rc, first_frame_ms=_ms(cmd.get("t_cmd"), first))
+    os._exit(0 if rc == 0 else 1)
+
+
+def main():
+    t0 = time.monotonic()
+    sys.stdout.reconfigure(line_buffering=True)     # game output reaches the launcher live
+    import importlib
+    import hw_backend
+    from game_host import GAME_PLUGINS, _env_plugins
+    hw_backend.vlc                       # python-vlc on the real backend
+    plugins = dict(GAME_PLUGINS); plugins.update(_env_plugins())
+    games = {}
+    for game, module in plugins.items():
+        try:
+            games[game] = importlib.import_module(module)
+        except Exception as e:
+            print(f"[zygote] import {module} failed", e, flush=True)
+    report("ready", import_ms=_ms(t0, time.monotonic()), pid=os.getpid())
+
+    line = sys.stdin.readline()
+    if not line: return                  # launcher went away / replaced us
+    cmd = json.loads(line)
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid == 0:
+        _child(games, cmd)
+    report("forked", pid=pid, fork_ms=_ms(cmd.get("t_cmd"), time.monotonic()))
+    while True:
+        try:
+            _, status = os.waitpid(pid, 0)
+            break
+        except InterruptedError:
+            continue
+    report("exit", pid=pid, status=os.waitstatus_to_exitcode(status))
+
+
+# ------------------------------
+# Launcher side
+# ------------------------------
+class ZygoteLauncher:
+    """Keeps one warm zygote and hands the next start command to it."""
+
+    def __init__(self, python=None, cwd=HERE, limit=1 << 20, env=None):
+        self.python = python or os.getenv("PYTHON_BIN", sys.executable)
+        self.cwd = cwd
+        self.env = env or {}             # on top of os.environ (rig definition, pad socket)
+        self.limit = limit               # longest stdout line the launcher will read
+        self._proc = None
+        self._lock = asyncio.Lock()
+
+    async def warm(self):
+        """Make sure a zygote is running (spawned in its own process group)."""
+        async with self._lock:           # a pre-warm and a start must not both spawn
+            if self._proc is None or self._proc.returncode is not None:
+                r, w = os.pipe()
+                go_r, go_w = os.pipe()
+                env = dict(os.environ, **self.env); env[TELEMETRY_FD_ENV] = str(w); env[GO_FD_ENV] = str(go_r)
+                try:
+                    proc = await asyncio.create_subprocess_exec(
+                        self.python, os.path.join(HERE, "game_zygote.py"),
+                        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.STDOUT, cwd=self.cwd, env=env,
+                        pass_fds=(w, go_r), start_new_session=True, limit=self.limit)
+                except Exception:
+                    os.close(r); os.close(go_w); raise
+                finally:
+                    os.close(w); os.close(go_r)
+                proc.telemetry = os.fdopen(r, "rb", 0)
+                proc.go = go_w
+                self._proc = proc
+            return self._proc
+
+    async def start(self, session_id, game, argv, arm=False):
+        """Send the start command; returns (proc, t_cmd). Call warm() again once the session ends.
+
+        With arm=True the child waits at its start line; StartGate.send(proc.go) releases it.
+        The caller closes proc.go once the session is over.
+        """
+        proc = await self.warm()
+        self._proc = None
+        t_cmd = time.monotonic()
+        cmd = {"session": session_id, "game": game, "argv": list(argv), "t_cmd": t_cmd, "arm": bool(arm)}
+        proc.stdin.write((json.dumps(cmd) + "\n").encode())
+        await proc.stdin.drain()
+        proc.stdin.close()
+        return proc, t_cmd
+
+    async def close(self, timeout=2.0):
+        proc, self._proc = self._proc, None
+        if proc is None: return
+        if proc.returncode is None:
+            proc.stdin.close()           # idle zygote exits on EOF
+            try:
+                await asyncio.wait_for(proc.wait(), timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        proc.telemetry.close()
+        os.close(proc.go)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+hw_backend.py
+
+Pluggable hardware layer for the game modes and the launcher.
+
+  FITFIGHTER_BACKEND=rpi       (default) rpi_ws281x.PixelStrip + gpiozero.Button
+  FITFIGHTER_BACKEND=virtual   VirtualStrip + VirtualButton, no GPIO needed
+
+The same choice can be made per run with a `--backend virtual` (or
+`--backend=virtual`) flag anywhere on the command line; the flag is removed
+from sys.argv on import so the scripts' positional parsing is unchanged.
+Import this module before reading sys.argv.
+
+Virtual backend
+  VirtualStrip   records every show() as (monotonic_ts, array('I') frame)
+                 in `strip.frames` (bounded by FITFIGHTER_VIRTUAL_FRAMES);
+                 FITFIGHTER_VIRTUAL_SHOW_MS gives each frame a transfer
+                 time (~19 ms for 632 LEDs) that, like rpi_ws281x's DMA,
+                 runs after show() returns: a show() only waits for the
+                 previous frame's transfer to finish
+  VirtualButton  gpiozero-compatible Button registered in `bank`; presses
+                 come from `bank.press_pad(pad)` in-process, from a press
+                 script (FITFIGHTER_PRESS_SCRIPT: "<t_seconds> <pad>" lines,
+                 t relative to the first Button being created) or from a
+                 datagram socket (FITFIGHTER_BUTTON_SOCKET: a Unix socket
+                 path or udp:host:port; payloads "3" / "press 3" for a tap,
+                 "down 3" and "release 3" for holds)
+  vlc            (gameMode3) a clock-only media player: get_time() runs from
+                 play(), get_length() is the WAV length or
+                 FITFIGHTER_VIRTUAL_SONG_S; nothing is decoded or played.
+                 FITFIGHTER_VIRTUAL_AUDIO_PPM makes its clock drift and
+                 FITFIGHTER_VIRTUAL_AUDIO_STEP_MS makes get_time() advance
+                 in steps, like a real audio output
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import wave
+from array import array
+from collections import deque
+
+# default pad -> BCM pin map, same wiring as the game scripts
+DEFAULT_PAD_GPIO = {1: 6, 2: 17, 3: 27, 4: 22, 5: 24, 6: 25, 7: 26, 8: 16}
+
+
+def select_backend(argv=None):
+    """Resolve the backend name, consuming a --backend flag from argv (in place)."""
+    argv = sys.argv if argv is None else argv
+    name = os.getenv("FITFIGHTER_BACKEND", "rpi")
+    i = 1
+    while i < len(argv):
+        a = argv[i]
+        if a == "--backend" and i + 1 < len(argv):
+            name = argv[i + 1]; del argv[i:i + 2]; continue
+        if a.startswith("--backend="):
+            name = a.split("=", 1)[1]; del argv[i]; continue
+        i += 1
+    name = name.strip().lower()
+    if name not in ("rpi", "virtual"):
+        raise ValueError(f"[hw] unknown backend '{name}' (expected rpi|virtual)")
+    os.environ["FITFIGHTER_BACKEND"] = name    # children inherit the choice
+    return name
+
+
+# ------------------------------
+# Virtual strip
+# ------------------------------
+def VirtualColor(red, green, blue, white=0):
+    return (white << 24) | (red << 16) | (green << 8) | blue
+
+
+class _VirtualWS:
+    WS2811_STRIP_RGB = 0x00100800
+    WS2811_STRIP_RBG = 0x00100008
+    WS2811_STRIP_GRB = 0x00081000
+    WS2811_STRIP_GBR = 0x00080010
+    WS2811_STRIP_BRG = 0x00001008
+    WS2811_STRIP_BGR = 0x00000810
+
+
+class VirtualStrip:
+    """PixelStrip stand-in that keeps a timestamped log of shown frames."""
+
+    def __init__(self, num, pin=None, freq_hz=800000, dma=10, invert=False,
+                 brightness=255, channel=0, strip_type=None, gamma=None):
+        self.num = num
+        self.pixels = array("I", bytes(4 * num))
+        self.brightness = brightness
+        self.frames = deque(maxlen=int(os.getenv("FITFIGHTER_VIRTUAL_FRAMES", "10000")))
+        self.show_count = 0
+        self.show_s = 0.0
+        self.busy_until = 0.0               # end of the transfer in flight
+        self.show_delay_s = float(os.getenv("FITFIGHTER_VIRTUAL_SHOW_MS", "0")) / 1000.0
+
+    def begin(self): pass
+    def numPixels(self): return self.num
+    def setBrightness(self, brightness): self.brightness = brightness
+    def getBrightness(self): return self.brightness
+    def setPixelColor(self, n, color): self.pixels[n] = color
+    def setPixelColorRGB(self, n, red, green, blue, white=0):
+        self.pixels[n] = VirtualColor(red, green, blue, white)
+    def getPixelColor(self, n): return self.pixels[n]
+    def getPixels(self): return self.pixels
+
+    def set_buffer(self, buf):
+        """Bulk load (FrameBuffer push path): one copy of the whole frame."""
+        self.pixels[:] = buf
+
+    def show(self):
+        t0 = time.monotonic()
+        if self.busy_until > t0: time.sleep(self.busy_until - t0)
+        t1 = time.monotonic()
+        self.frames.append((t1, array("I", self.pixels)))
+        self.busy_until = t1 + self.show_delay_s
+        self.show_count += 1
+        self.show_s += t1 - t0
+
+    def _cleanup(self): pass
+
+
+# ------------------------------
+# Virtual buttons
+# ------------------------------
+class VirtualButton:
+    """gpiozero.Button stand-in; state changes come from `bank`."""
+
+    def __init__(self, pin, pull_up=True, bounce_time=None, **kwargs):
+        self.pin = pin
+        self.when_pressed = None
+        self.when_released = None
+        self.is_pressed = False
+        self.closed = False
+        bank.register(self)
+
+    def _set(self, pressed):
+        if self.closed or pressed == self.is_pressed: return
+        self.is_pressed = pressed
+        cb = self.when_pressed if pressed else self.when_released
+        if cb is not None: cb()
+
+    def close(self):
+        self.closed = True
+        bank.unregister(self)
+
+
+class VirtualButtonBank:
+    def __init__(self, pad_gpio=DEFAULT_PAD_GPIO):
+        self.pad_gpio = dict(pad_gpio)
+        self._buttons = {}
+        self._lock = threading.Lock()
+        self._drivers_started = False
+
+    def register(self, button):
+        with self._lock:
+            self._buttons.setdefault(button.pin, []).append(button)
+        self._start_drivers()
+
+    def unregister(self, button):
+        with self._lock:
+            lst = self._buttons.get(button.pin, [])
+            if button in lst: lst.remove(button)
+
+    def _set_pin(self, pin, pressed):
+        with self._lock:
+            targets = list(self._buttons.get(pin, ()))
+        for b in targets: b._set(pressed)
+
+    def press_pin(self, pin, hold_s=0.0):
+        self._set_pin(pin, True)
+        if hold_s > 0: time.sleep(hold_s)
+        self._set_pin(pin, False)
+
+    def press_pad(self, pad, hold_s=0.0):
+        self.press_pin(self.pad_gpio[int(pad)], hold_s)
+
+    def release_pad(self, pad):
+        self._set_pin(self.pad_gpio[int(pad)], False)
+
+    # ----- drivers -----
+    def _start_drivers(self):
+        if self._drivers_started: return
+        self._drivers_started = True
+        script = os.getenv("FITFIGHTER_PRESS_SCRIPT")
+        if script:
+            threading.Thread(target=self._run_script, args=(script,), daemon=True).start()
+        sock = os.getenv("FITFIGHTER_BUTTON_SOCKET")
+        if sock:
+            threading.Thread(target=self._run_socket, args=(sock,), daemon=True).start()
+
+    def _run_script(self, path):
+        steps = []
+        try:
+            with open(path) as f:
+                for line in f:
+                    line = line.split("#", 1)[0].split()
+                    if len(line) >= 2: steps.append((float(line[0]), int(line[1])))
+        except Exception as e:
+            print("[hw] press script failed", e)
+            return
+        steps.sort()
+        t0 = time.monotonic()
+        for t, pad in steps:
+            delay = t0 + t - time.monotonic()
+            if delay > 0: time.sleep(delay)
+            self.press_pad(pad)
+
+    def _run_socket(self, spec):
+        try:
+            if spec.startswith("udp:"):
+                _, host, port = spec.split(":")
+                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                s.bind((host, int(port)))
+            else:
+                try: os.unlink(spec)
+                except FileNotFoundError: pass
+                s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                s.bind(spec)
+        except Exception as e:
+            print("[hw] button socket failed", e)
+            return
+        while True:
+            try:
+                words = s.recv(256).decode(errors="ignore").split()
+                if not words: continue
+                if words[0] == "release": self.release_pad(words[-1])
+                elif words[0] == "down": self._set_pin(self.pad_gpio[int(words[-1])], True)
+                else: self.press_pad(words[-1])
+            except Exception as e:
+                print("[hw] bad button message", e)
+
+
+bank = VirtualButtonBank()
+
+
+# ------------------------------
+# Virtual audio (python-vlc subset used by gameMode3)
+# ------------------------------
+class _VirtualState:
+    NothingSpecial, Opening, Buffering, Playing, Paused, Stopped, Ended, Error = range(8)
+
+
+class _VirtualMedia:
+    def __init__(self, path):
+        self.path = path
+        try:
+            with wave.open(path) as w: self.length_s = w.getnframes() / float(w.getframerate())
+        except Exception:
+            self.length_s = float(os.getenv("FITFIGHTER_VIRTUAL_SONG_S", "30"))
+
+
+class _VirtualPlayer:
+    def __init__(self):
+        self.media = None
+        self.t_play = None
+        self.t_pause = None
+        self.stopped = False
+        self.rate = 1.0 + float(os.getenv("FITFIGHTER_VIRTUAL_AUDIO_PPM", "0")) * 1e-6
+        self.step_ms = max(1, int(os.getenv("FITFIGHTER_VIRTUAL_AUDIO_STEP_MS", "1")))
+
+    def set_media(self, media): self.media = media
+    def audio_set_volume(self, vol): return 0
+    def play(self):
+        if self.t_pause is not None: self.set_pause(0)
+        else: self.t_play = time.monotonic()
+        self.stopped = False
+        return 0
+    def stop(self): self.stopped = True
+    def set_pause(self, do_pause):
+        if self.t_play is None: return
+        if do_pause and self.t_pause is None: self.t_pause = time.monotonic()
+        elif not do_pause and self.t_pause is not None:
+            self.t_play += time.monotonic() - self.t_pause; self.t_pause = None
+    def set_time(self, t_ms):
+        if self.t_play is None: return
+        self.t_play = (self.t_pause or time.monotonic()) - t_ms / 1000.0 / self.rate
+
+    def get_time(self):
+        if self.t_play is None: return -1
+        t_ms = int(((self.t_pause or time.monotonic()) - self.t_play) * 1000.0 * self.rate)
+        return t_ms - t_ms % self.step_ms
+
+    def get_length(self):
+        return int(self.media.length_s * 1000.0) if self.media else 0
+
+    def get_state(self):
+        if self.stopped: return _VirtualState.Stopped
+        if self.t_play is None: return _VirtualState.NothingSpecial
+        if self.get_time() >= self.get_length(): return _VirtualState.Ended
+        if self.t_pause is not None: return _VirtualState.Paused
+        return _VirtualState.Playing
+
+
+class _VirtualInstance:
+    def __init__(self, *args): pass
+    def media_player_new(self): return _VirtualPlayer()
+    def media_new(self, path): return _VirtualMedia(path)
+
+
+class _VirtualVLC:
+    Instance = _VirtualInstance
+    State = _VirtualState
+
+
+# ------------------------------
+# Backend selection
+# ------------------------------
+BACKEND = select_backend()
+
+if BACKEND == "rpi":
+    from rpi_ws281x import PixelStrip, Color, ws
+    from gpiozero import Button
+else:
+    PixelStrip = VirtualStrip
+    Color = VirtualColor
+    ws = _VirtualWS
+    Button = VirtualButton
+
+
+def __getattr__(name):
+    # `from hw_backend import vlc` only pulls python-vlc in on the real backend
+    if name == "vlc":
+        if BACKEND == "rpi":
+            import vlc as _vlc
+            return _vlc
+        return _VirtualVLC
+    raise AttributeError(name)
+
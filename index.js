@@ -77,6 +77,74 @@ function safeJsonParse(buf) {
   }
 }
 
+/**
+ * Compact pad batches (device/{id}/btn/batch), see pad_codec.py on the Pi:
+ *   header  <BBHHHIQQ  version, n, dropped, late, epoch, seq0, t0_us, wall_ms
+ *   entries n x <IHB   dt_us, dseq, pad
+ */
+const PAD_BATCH_VERSION = 1;
+const PAD_BATCH_HEADER = 28;
+const PAD_BATCH_ENTRY = 7;
+const padSeqState = new Map(); // deviceId -> { epoch, last, gaps, late, duplicates }
+
+function decodePadBatch(buf) {
+  if (!Buffer.isBuffer(buf) || buf.length < PAD_BATCH_HEADER)
+    throw new Error("short pad batch");
+  const version = buf.readUInt8(0);
+  if (version !== PAD_BATCH_VERSION)
+    throw new Error(`pad batch version ${version} not supported`);
+  const n = buf.readUInt8(1);
+  if (buf.length !== PAD_BATCH_HEADER + n * PAD_BATCH_ENTRY)
+    throw new Error("pad batch length does not match its count");
+  const dropped = buf.readUInt16LE(2);
+  const late = buf.readUInt16LE(4);
+  const epoch = buf.readUInt16LE(6);
+  const seq0 = buf.readUInt32LE(8);
+  const t0Us = Number(buf.readBigUInt64LE(12));
+  const wallMs = Number(buf.readBigUInt64LE(20));
+  const presses = [];
+  for (let i = 0; i < n; i++) {
+    const off = PAD_BATCH_HEADER + i * PAD_BATCH_ENTRY;
+    const dtUs = buf.readUInt32LE(off);
+    presses.push({
+      pad: buf.readUInt8(off + 6),
+      action: "press",
+      seq: (seq0 + buf.readUInt16LE(off + 4)) >>> 0,
+      tUs: t0Us + dtUs,
+      timestamp: new Date(wallMs + Math.floor(dtUs / 1000)).toISOString(),
+    });
+  }
+  return { dropped, late, epoch, presses };
+}
+
+// sequence gaps (lost on the way), presses arriving after a later one and
+// repeats; only counted, every press is still passed on. A new epoch means
+// the launcher restarted and its seq started over.
+function trackPadSeq(deviceId, epoch, presses) {
+  let st = padSeqState.get(deviceId);
+  if (!st || st.epoch !== epoch) {
+    st = { epoch, last: null, gaps: 0, late: 0, duplicates: 0 };
+    padSeqState.set(deviceId, st);
+  }
+  for (const p of presses) {
+    if (st.last !== null) {
+      const ahead = (p.seq - st.last) >>> 0;
+      if (ahead === 0) {
+        st.duplicates += 1;
+        continue;
+      }
+      if (ahead > 0x7fffffff) {
+        st.late += 1;
+        st.gaps = Math.max(0, st.gaps - 1);
+        continue;
+      }
+      st.gaps += ahead - 1;
+    }
+    st.last = p.seq;
+  }
+  return { gaps: st.gaps, lateArrivals: st.late, duplicates: st.duplicates };
+}
+
 /**
  * Subscribe to topics we care about
  */
@@ -88,6 +156,8 @@ function subscribeTopics() {
     { topic: "rig/+/command/response", qos: 1 },
     { topic: "device/+/control/#", qos: 1 },
     { topic: "device/+/btn", qos: 0 }, // frequent events, low qos
+    { topic: "device/+/btn/batch", qos: 0 }, // compact pad batches (binary)
+    { topic: "device/+/sessions", qos: 0 }, // launcher scheduler state / queue depth (retained)
     { topic: "session/+/result", qos: 1 },
   ];
   topics.forEach(({ topic, qos }) => {
@@ -102,6 +172,27 @@ function subscribeTopics() {
  * Handle incoming MQTT messages
  */
 function handleIncomingMessage(topic, messageBuf) {
+  let b;
+  if ((b = topic.match(/^device\/([^/]+)\/btn\/batch$/))) {
+    // binary, one socket event per batch instead of one per press
+    const deviceId = b[1];
+    try {
+      const batch = decodePadBatch(messageBuf);
+      const seq = trackPadSeq(deviceId, batch.epoch, batch.presses);
+      io.emit("pad:batch", {
+        deviceId,
+        presses: batch.presses,
+        dropped: batch.dropped,
+        late: batch.late,
+        gaps: seq.gaps,
+        lateArrivals: seq.lateArrivals,
+        duplicates: seq.duplicates,
+      });
+    } catch (e) {
+      log("[mqtt rx] bad pad batch", topic, e && e.message);
+    }
+    return;
+  }
   const msg = safeJsonParse(messageBuf);
   log("[mqtt rx]", topic, typeof msg === "string" ? msg : JSON.stringify(msg));
   try {
@@ -138,6 +229,12 @@ function handleIncomingMessage(topic, messageBuf) {
       io.emit("pad", { deviceId, ...msg });
       return;
     }
+    if ((m = topic.match(/^device\/([^/]+)\/sessions$/))) {
+      const deviceId = m[1];
+      // { state, sessionId, pending, depth, oldestWaitMs, waitP50Ms, waitMaxMs, rejected, ... }
+      io.emit("device:sessions", { deviceId, ...msg });
+      return;
+    }
     if ((m = topic.match(/^session\/([^/]+)\/result$/))) {
       const sessionId = m[1];
       io.emit("session:result", { sessionId, result: msg });
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+lane_renderer.py
+
+Incremental progress-bar ("lane") renderer on top of the FrameBuffer.
+
+Each pad lane is described as a stack of layers, (lit_count, color) in draw
+order: a layer paints pixels [0, lit) and later layers paint over earlier
+ones, like the old blank-then-relight loops did. The renderer flattens the
+stack into colour runs, diffs them against the runs it drew last time and
+only writes the pixels that changed, so a frame where one bar grew by a pixel
+costs one one-pixel fill instead of a 79-pixel rewrite.
+
+If something else writes the pad (flashes, off_oneStrip, fill_all) the
+FrameBuffer write counter moves and the next draw repaints the whole lane.
+"""
+
+BLACK = 0
+
+
+def flatten(layers):
+    """[(lit, color), ...] in draw order -> [(end, color), ...] runs from pixel 0."""
+    runs = []
+    covered = 0
+    # topmost layer first: it owns [0, lit); lower layers only show past it
+    for lit, color in reversed(layers):
+        if lit <= covered: continue
+        if runs and runs[-1][1] == color: runs[-1] = (lit, color)
+        else: runs.append((lit, color))
+        covered = lit
+    return runs
+
+
+class LaneRenderer:
+    def __init__(self, fb):
+        self.fb = fb
+        self._drawn = {}           # pid -> runs currently in the buffer
+        self._seen = {}            # pid -> fb.writes[pid] right after our last draw
+        self.pixels_written = 0
+
+    def invalidate(self, pid=None):
+        if pid is None: self._drawn.clear()
+        else: self._drawn.pop(pid, None)
+
+    def intact(self, pid):
+        """True if the lane still shows exactly what the last draw() put there."""
+        return pid in self._drawn and self._seen.get(pid) == self.fb.writes[pid]
+
+    def draw_bar(self, pid, lit, color):
+        self.draw(pid, ((lit, color),))
+
+    def draw(self, pid, layers):
+        fb = self.fb
+        seg_len = fb.segment_len(pid)
+        new = flatten([(min(max(0, lit), seg_len), color) for lit, color in layers])
+        old = self._drawn.get(pid)
+        if old is not None and self._seen.get(pid) != fb.writes[pid]:
+            old = None                                   # overdrawn since our last frame
+        if old == new: return
+        if old is None:
+            start = 0
+            for end, color in new:
+                fb.fill_range(pid, start, end, color); start = end
+            fb.fill_range(pid, start, seg_len, BLACK)
+            self.pixels_written += seg_len
+        else:
+            self._write_delta(pid, old, new, seg_len)
+        self._drawn[pid] = new
+        self._seen[pid] = fb.writes[pid]
+
+    def _write_delta(self, pid, old, new, seg_len):
+        """Walk both run lists together and fill only the spans whose colour differs."""
+        fb = self.fb
+        i = j = 0
+        pos = 0
+        while pos < seg_len:
+            oe, oc = old[i] if i < len(old) else (seg_len, BLACK)
+            ne, nc = new[j] if j < len(new) else (seg_len, BLACK)
+            end = min(oe, ne, seg_len)
+            if oc != nc and end > pos:
+                fb.fill_range(pid, pos, end, nc)
+                self.pixels_written += end - pos
+            pos = end
+            if oe == end: i += 1
+            if ne == end: j += 1
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+latency_stats.py
+
+Input-to-photon latency tracking for the game modes.
+
+Every pad press keeps the monotonic timestamp taken in on_press. The game
+loop reports when it dequeued the press and when it finished judging it
+(including its flash); the FrameScheduler reports when the next frame was
+latched onto the strip. Per session this yields four histograms:
+
+  capture_dequeue   on_press -> loop picked the event up
+  dequeue_judge     dequeue  -> scoring + flash scheduled
+  judge_show        judged   -> show() returned (LEDs updated)
+  capture_show      on_press -> show() returned (what the player feels)
+
+Results are printed as one `[latency] {json}` line, which the launcher picks
+up and forwards in the session/{id}/result payload.
+"""
+
+import bisect
+import json
+import time
+
+RESULT_TAG = "[latency] "
+
+# bucket upper bounds in ms: 0.1 ms .. ~3 s, four buckets per doubling
+BUCKETS_MS = [round(0.1 * 2 ** (k / 4.0), 4) for k in range(60)]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.n = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, seconds):
+        ms = max(0.0, seconds * 1000.0)
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.n += 1
+        self.total_ms += ms
+        if ms > self.max_ms: self.max_ms = ms
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-quantile (capped at the max seen)."""
+        if not self.n: return 0.0
+        want = q * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= want:
+                bound = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+                return round(min(bound, self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def stats(self):
+        return {
+            "n": self.n,
+            "mean_ms": round(self.total_ms / self.n, 3) if self.n else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p90_ms": self.percentile(0.90),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": [[BUCKETS_MS[i] if i < len(BUCKETS_MS) else None, c]
+                        for i, c in enumerate(self.counts) if c],
+        }
+
+
+class PressLatency:
+    STAGES = ("capture_dequeue", "dequeue_judge", "judge_show", "capture_show")
+
+    def __init__(self, frames=None, clock=time.monotonic):
+        self.clock = clock
+        self.hist = {k: LatencyHistogram() for k in self.STAGES}
+        self._awaiting_show = []        # (t_capture, t_judged)
+        if frames is not None:
+            frames.listeners.append(self.on_show)
+
+    def dequeued(self, t_capture):
+        """Call right after event_q.get(); returns the dequeue timestamp."""
+        t = self.clock()
+        self.hist["capture_dequeue"].add(t - t_capture)
+        return t
+
+    def judged(self, t_capture, t_dequeue):
+        """Call once the press has been scored and its flash scheduled."""
+        t = self.clock()
+        self.hist["dequeue_judge"].add(t - t_dequeue)
+        self._awaiting_show.append((t_capture, t))
+
+    def on_show(self, t_done):
+        """FrameScheduler listener: the frame carrying those judgements is out."""
+        if not self._awaiting_show: return
+        for t_capture, t_judged in self._awaiting_show:
+            self.hist["judge_show"].add(t_done - t_judged)
+            self.hist["capture_show"].add(t_done - t_capture)
+        self._awaiting_show.clear()
+
+    def stats(self):
+        return {k: h.stats() for k, h in self.hist.items()}
+
+    def summary(self):
+        h = self.hist["capture_show"]
+        return (f"press->LED p50={h.percentile(0.5)}ms p99={h.percentile(0.99)}ms "
+                f"max={round(h.max_ms, 2)}ms (n={h.n})")
+
+    def result_line(self):
+        return RESULT_TAG + json.dumps(self.stats(), separators=(",", ":"))
+
+
+def parse_result_line(line):
+    """Launcher side: latency dict from a `[latency] {...}` stdout line, else None."""
+    if not line.startswith(RESULT_TAG): return None
+    try:
+        return json.loads(line[len(RESULT_TAG):])
+    except ValueError:
+        return None
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+led_framebuffer.py
+
+Shared LED framebuffer used by gameMode1.py, gameMode2.py and gameMode3.py.
+
+All pixel writes land in one array('I') buffer (one 0x00RRGGBB word per LED)
+instead of going through strip.setPixelColor one pixel at a time. Writes are
+bulk slice fills on a per-pad segment, and each write marks its pad dirty.
+show() compares the dirty segments against what was last pushed, copies the
+whole buffer into the ws281x channel in one memmove and calls strip.show()
+only when something actually changed.
+"""
+
+import ctypes
+import time
+from array import array
+
+BLACK = 0
+
+
+def _channel_leds_address(strip):
+    """Address of the ws2811 channel LED array (valid after strip.begin()), or None."""
+    try:
+        from rpi_ws281x import ws
+        return int(ws.ws2811_channel_t_leds_get(strip._channel)) or None
+    except Exception:
+        return None
+
+
+class FrameBuffer:
+    def __init__(self, strip, led_address, leds_per_pad, num_leds):
+        self.strip = strip
+        self.num_leds = num_leds
+        self.buf = array("I", bytes(4 * num_leds))
+        self._shown = array("I", bytes(4 * num_leds))
+        self.segments = {pid: (s, min(s + leds_per_pad, num_leds)) for pid, s in led_address.items()}
+        self._runs = {}                    # (color, length) -> array run, reused by fills
+        self.writes = dict.fromkeys(self.segments, 0)   # per-pad write counter (lets renderers spot overdraw)
+        # first show() always pushes, whatever the strip held before we started
+        self.dirty = set(self.segments)
+        self._force = True
+        self._leds_addr = None
+        self._addr_checked = False
+        self.show_count = 0
+        self.first_show_at = None          # monotonic time of the first latched frame
+        self.after_show = None             # called once a frame is latched (the rig's session log)
+
+    # ------------------------------
+    # Writes (buffer only)
+    # ------------------------------
+    def _run(self, color, n):
+        key = (color, n)
+        run = self._runs.get(key)
+        if run is None:
+            run = array("I", [color]) * n
+            if len(self._runs) > 256: self._runs.clear()
+            self._runs[key] = run
+        return run
+
+    def segment(self, pid):
+        """Writable view over the pad's pixels."""
+        s, e = self.segments[pid]
+        return memoryview(self.buf)[s:e]
+
+    def segment_len(self, pid):
+        s, e = self.segments[pid]
+        return e - s
+
+    def fill_range(self, pid, lo, hi, color):
+        """Fill pad-relative pixels [lo, hi) of pad `pid` with `color`."""
+        s, e = self.segments[pid]
+        lo = max(0, lo); hi = min(hi, e - s)
+        if hi <= lo: return
+        self.buf[s + lo:s + hi] = self._run(color, hi - lo)
+        self.dirty.add(pid); self.writes[pid] += 1
+
+    def fill_pad(self, pid, color):
+        s, e = self.segments[pid]
+        self.buf[s:e] = self._run(color, e - s)
+        self.dirty.add(pid); self.writes[pid] += 1
+
+    def fill_all(self, color=BLACK):
+        self.buf[:] = self._run(color, self.num_leds)
+        self.dirty.update(self.segments)
+        for pid in self.writes: self.writes[pid] += 1
+        self._force = True
+
+    def clear(self):
+        self.fill_all(BLACK)
+
+    # ------------------------------
+    # Flush
+    # ------------------------------
+    @property
+    def pending(self):
+        """True when writes are waiting for show()."""
+        return bool(self.dirty) or self._force
+
+    def _changed(self):
+        if self._force: return True
+        buf, shown = self.buf, self._shown
+        for pid in self.dirty:
+            s, e = self.segments[pid]
+            if buf[s:e] != shown[s:e]: return True
+        return False
+
+    def _push(self):
+        if not self._addr_checked:
+            self._leds_addr = _channel_leds_address(self.strip)
+            self._addr_checked = True
+        if self._leds_addr:
+            ctypes.memmove(self._leds_addr, self.buf.buffer_info()[0], 4 * self.num_leds)
+            return
+        if hasattr(self.strip, "set_buffer"):          # hw_backend.VirtualStrip
+            self.strip.set_buffer(self.buf)
+            return
+        # no raw channel access (older bindings / non-ws281x strip): dirty segments only
+        buf, strip = self.buf, self.strip
+        pids = self.segments if self._force else self.dirty
+        for pid in pids:
+            s, e = self.segments[pid]
+            for i in range(s, e): strip.setPixelColor(i, buf[i])
+
+    def show(self, force=False):
+        """Push the buffer and latch it; returns False when nothing changed."""
+        if force: self._force = True
+        if not self.dirty and not self._force: return False
+        if not self._changed():
+            self.dirty.clear()
+            return False
+        self._push()
+        self.strip.show()
+        self._shown[:] = self.buf
+        self.dirty.clear(); self._force = False
+        self.show_count += 1
+        if self.first_show_at is None: self.first_show_at = time.monotonic()
+        if self.after_show is not None: self.after_show()
+        return True
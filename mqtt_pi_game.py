@@ -2,26 +2,78 @@
 """
 mqtt_pi_game.py
 
-MQTT client for Raspberry Pi that receives start/stop commands and launches
-gameMode1.py, gameMode2.py, gameMode3.py as subprocesses.
+MQTT client for Raspberry Pi that receives start/stop commands and runs
+gameMode1.py, gameMode2.py, gameMode3.py (and calibrate.py, the Rhythm
+latency calibration).
+
+GAME_HOST_MODE=inprocess (default) runs sessions on the launcher's GameHost
+(game_host.py): strip, buttons and game modules stay loaded across sessions.
+GAME_HOST_MODE=zygote forks each session from a pre-warmed zygote process
+(game_zygote.py) and publishes the spawn-to-first-frame time with the result.
+GAME_HOST_MODE=subprocess keeps the old one-process-per-session behaviour.
+
+Games report typed live events (telemetry.py); they are batched onto
+session/{id}/live and the final stats go into session/{id}/result.
+
+The launcher runs on a single asyncio loop: paho is driven from the loop's
+socket callbacks (AsyncMqtt) instead of its network thread, control messages
+only schedule tasks, game and zygote processes are asyncio subprocesses whose
+stdout and telemetry pipes are streamed, a stop escalates from SIGTERM to
+SIGKILL after STOP_TIMEOUT_S, and pad presses arrive through an asyncio
+queue. QoS 1 publishes (results, acks, replies) go through an on-disk outbox
+(publish_spool.py) and are replayed in order after a reconnect or restart.
+With PAD_PUBLISH=compact presses are micro-batched into pad_codec
+messages on device/{id}/btn/batch instead of one JSON message each.
+Besides the loop there is the GPIO callback thread and, in-process,
+the thread of the running game.
+
+One launcher can drive several cabinets over one broker connection:
+RIGS_FILE lists the rigs (rig_config.py) and each becomes a Device with its
+own pads, game host or zygote, sessions and device/{id}/... topics. Without
+RIGS_FILE it drives the single rig DEVICE_ID as before.
+
+Each rig runs one session at a time. Starts go through its SessionScheduler
+(session_scheduler.py): a start that arrives while a game owns the pads is
+rejected, queued (up to SESSION_QUEUE_MAX) or preempts it, per
+SESSION_POLICY; duplicate sessionIds are rejected. The scheduler's state,
+queue depth and wait times are published retained on device/{id}/sessions.
+
+`prepare` is a two-phase start: it is admitted like a start, but the game
+loads its assets and waits at its start line (start_gate.py). Once it is
+there the replyTopic gets {"armed": true, ...} and the rig's state is
+armed; `go` (same sessionId) releases it within a fraction of a frame.
+An armed session without a go for ARM_TIMEOUT_S is stopped.
+
+A "generate" control action charts an audio file for Rhythm with
+beatmap_gen.py (params: audio, difficulty, out): a niced child process, one
+at a time per launcher, whose summary goes to the replyTopic.
 
 Drop-in replacement for the previous mqtt_pi_game.py. Adjust paths below if you
 placed your game scripts elsewhere.
 """
+import asyncio
 import json
+import sys
 import time
-import threading
 import uuid
 import os
-import shlex
 import signal
-import subprocess
 from datetime import datetime
 from pathlib import Path
 
 import paho.mqtt.client as mqtt
 from dotenv import load_dotenv
-from gpiozero import Button
+from pad_input import PadInputService, ENV_SOCKET as PAD_SOCKET_ENV
+from game_rig import Rig, rig_kwargs, ENV_RIG
+from rig_config import load_rigs
+from game_host import GameHost
+from game_zygote import ZygoteLauncher, parse_line as parse_zygote_line
+from latency_stats import parse_result_line as parse_latency_line
+import pad_codec
+from publish_spool import PublishSpool
+from session_scheduler import SessionScheduler
+from telemetry import LivePublisher, parse_event as parse_telemetry, ENV_FD as TELEMETRY_FD_ENV
+from start_gate import StartGate, ENV_FD as GO_FD_ENV
 
 # load env (.env)
 load_dotenv()
@@ -34,35 +86,98 @@ USERNAME = os.getenv("MQTT_USER", "")
 PASSWORD = os.getenv("MQTT_PASS", "")
 USE_TLS = os.getenv("USE_TLS", "False").lower() in ("true", "1", "yes")
 
-# Paths to game scripts (update if needed)
+# rigs driven by this launcher (rig_config.py); unset = just DEVICE_ID
+RIGS_FILE = os.getenv("RIGS_FILE", "")
+# MQTT client id and launcher-wide topics
+LAUNCHER_ID = os.getenv("LAUNCHER_ID", DEVICE_ID)
+
+# Path to game scripts (update if needed); a rig's baseDir overrides it
 BASE_DIR = os.getenv("GAME_BASE", "/home/fitfighter")
-GAME_SCRIPT_MAP = {
-    "gameMode1": os.path.join(BASE_DIR, "gameMode1.py"),
-    "gameMode2": os.path.join(BASE_DIR, "gameMode2.py"),
-    "gameMode3": os.path.join(BASE_DIR, "gameMode3.py"),
-}
+GAME_SCRIPTS = ("gameMode1", "gameMode2", "gameMode3", "calibrate")
+
+GAME_HOST_MODE = os.getenv("GAME_HOST_MODE", "inprocess").strip().lower()
+
+# pad input service sockets (one per rig); game processes subscribe there instead of opening GPIO
+PAD_SOCKET_DIR = os.getenv("PAD_SOCKET_DIR", "/tmp")
+
+# start while a session runs: "reject", "queue" (FIFO of SESSION_QUEUE_MAX) or "preempt";
+# a rig's sessionPolicy / sessionQueueMax override these
+SESSION_POLICY = os.getenv("SESSION_POLICY", "queue").strip().lower()
+SESSION_QUEUE_MAX = int(os.getenv("SESSION_QUEUE_MAX", "4"))
+
+# beatmap_gen.py runs (the "generate" action) at this nice level, so a game on another rig keeps its frames
+GEN_NICE = int(os.getenv("GEN_NICE", "10"))
 
-# GPIO pads (same mapping as your game scripts)
-PAD_PINS = (6, 17, 27, 22, 24, 25, 26, 16)
+# a prepared session (the `prepare` action) waits this long for its `go`
+ARM_TIMEOUT_S = float(os.getenv("ARM_TIMEOUT_S", "60"))
 
-TOPIC_CONTROL = f"device/{DEVICE_ID}/control/#"
-TOPIC_BTN = f"device/{DEVICE_ID}/btn"
-TOPIC_STATUS = f"device/{DEVICE_ID}/status"
-LWT_TOPIC = f"device/{DEVICE_ID}/lwt"
+# SIGTERM -> SIGKILL grace period for a stopped game process
+STOP_TIMEOUT_S = float(os.getenv("STOP_TIMEOUT_S", "3"))
+# longest stdout / telemetry line read from a game process
+LINE_LIMIT = 1 << 20
 
-# store running sessions { session_id: {proc, started_at, game, cmd} }
-running_sessions = {}
-running_sessions_lock = threading.Lock()
+# outbox for QoS 1 publishes (results, acks, replies); SPOOL_PATH= (empty) turns it off
+SPOOL_PATH = os.getenv("SPOOL_PATH", f"/var/tmp/fitfighter-{LAUNCHER_ID}-outbox.jsonl")
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", str(4 << 20)))
+SPOOL_METRICS_S = float(os.getenv("SPOOL_METRICS_S", "10"))
+
+# pad presses: "json" (one message per press on device/{id}/btn) or "compact"
+# (pad_codec batches on device/{id}/btn/batch, collected for up to PAD_BATCH_MS)
+PAD_PUBLISH = os.getenv("PAD_PUBLISH", "json").strip().lower()
+PAD_BATCH_MS = float(os.getenv("PAD_BATCH_MS", "20"))
+PAD_LATE_MS = float(os.getenv("PAD_LATE_MS", "100"))    # older than this when sent counts as late
+
+# per-rig topics are device/{id}/... (see Device); these belong to the launcher
+TOPIC_SPOOL = f"launcher/{LAUNCHER_ID}/spool"
+LAUNCHER_LWT_TOPIC = f"launcher/{LAUNCHER_ID}/lwt"
+
+loop = None     # the launcher's asyncio loop, set in amain()
+devices = {}    # device id -> Device, created in amain()
+spool = None    # PublishSpool, created in amain()
+gen_lock = None # one beatmap_gen.py at a time, created in amain()
 
 # ---------- helpers ----------
 def now_iso():
     return datetime.now().astimezone().isoformat()
 
-def publish_json(topic, payload, qos=1, retain=False):
+def _publish(topic, body, qos, retain):
+    if qos >= 1 and spool is not None:
+        # spooled first; sent now if connected, otherwise replayed by on_connect
+        rid = spool.put(topic, body, qos, retain)
+        if client.is_connected(): send_spooled(rid)
+        return
+    try:
+        client.publish(topic, body, qos=qos, retain=retain)
+    except Exception as e:
+        print("[mqtt] publish failed", e)
+
+def send_spooled(rid):
+    rec = spool.get(rid)
+    if rec is None: return
+    topic, body, qos, retain = rec
     try:
-        client.publish(topic, json.dumps(payload), qos=qos, retain=retain)
+        info = client.publish(topic, body, qos=qos, retain=retain)
     except Exception as e:
         print("[mqtt] publish failed", e)
+        return
+    spool.sent(rid, info.mid)
+
+def on_loop():
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+def publish_json(topic, payload, qos=1, retain=False):
+    """Publish from any thread; paho's socket is only touched on the loop."""
+    body = json.dumps(payload)
+    if loop is None or on_loop():
+        _publish(topic, body, qos, retain)
+        return
+    try:
+        loop.call_soon_threadsafe(_publish, topic, body, qos, retain)
+    except RuntimeError:
+        print("[mqtt] publish after shutdown dropped", topic)
 
 def level_to_user(level_str):
     # maps Beginner..Expert to 1..4 (used by gameMode1 and gameMode2)
@@ -70,25 +185,18 @@ def level_to_user(level_str):
     s = str(level_str).strip().lower()
     return {"beginner":1,"intermediate":2,"advanced":3,"expert":4}.get(s, 2)
 
-def build_cmd_for_payload(payload):
+def build_args_for_payload(payload, rig=None):
     """
-    Return (cmd_list, human_reason) or (None, error_message)
+    Return (argv, human_reason) or (None, error_message); argv excludes the script.
+    `rig` is the target rig's definition (for its default ALSA device).
     Expected payload keys:
-      - game: "gameMode1" | "gameMode2" | "gameMode3"
+      - game: "gameMode1" | "gameMode2" | "gameMode3" | "calibrate"
       - duration: seconds (optional)
       - params: dict with additional options (level, endless, startBpm, song, csv, audio, user etc.)
     """
     game = payload.get("game")
     params = payload.get("params") or {}
     duration = payload.get("duration")  # seconds (some StartScreen sends this)
-    started_at = payload.get("sessionId") or payload.get("startedAt") or f"{int(time.time())}"
-    # resolve script path
-    script = GAME_SCRIPT_MAP.get(game)
-    if not script or not os.path.exists(script):
-        return None, f"script for game '{game}' not found ({script})"
-
-    # default base python command
-    python = os.getenv("PYTHON_BIN", "python3")
 
     # build per-game args
     if game == "gameMode1":
@@ -98,20 +206,21 @@ def build_cmd_for_payload(payload):
         timer = int(duration) if duration else (int(params.get("minutes", 1)) * 60 if params.get("minutes") else 60)
         endless = params.get("endless", params.get("isEndless", False))
         endless_flag = "true" if str(endless).lower() in ("1","true","t","y","yes") else "false"
-        cmd = [python, script, str(int(user_num)), str(int(timer)), endless_flag]
-        return cmd, f"Combo user={user_num} timer={timer}s endless={endless_flag}"
+        argv = [str(int(user_num)), str(int(timer)), endless_flag]
+        return argv, f"Combo user={user_num} timer={timer}s endless={endless_flag}"
 
     if game == "gameMode2":
         # gameMode2.py: usage: <user_level> [timer_seconds]
         level = params.get("level") or params.get("levelName")
         user_level = params.get("user_level") or level_to_user(level)
         timer = int(duration) if duration else (int(params.get("minutes", 1)) * 60 if params.get("minutes") else 60)
-        cmd = [python, script, str(int(user_level)), str(int(timer))]
-        return cmd, f"FoF level={user_level} timer={timer}s"
+        argv = [str(int(user_level)), str(int(timer))]
+        return argv, f"FoF level={user_level} timer={timer}s"
 
     if game == "gameMode3":
-        # gameMode3.py: usage: <user> <audio_path> <csv_path> [alsa_dev]
-        # Expect params: audio (full path), csv (full path), user (optional int)
+        # gameMode3.py: usage: <user> <audio_path> <csv_path> [alsa_dev|-] [chart_offset_s]
+        # Expect params: audio (full path), csv (full path), user (optional int),
+        # csvOffset (optional; the chart's offset from the beatmap metadata)
         audio = params.get("audio") or params.get("audio_path") or params.get("song_path") or params.get("song")
         csvp = params.get("csv") or params.get("csv_path") or params.get("beatmap")
         user_num = params.get("user") or level_to_user(params.get("level"))
@@ -123,81 +232,157 @@ def build_cmd_for_payload(payload):
         if not os.path.exists(csvp):
             return None, f"csv file not found: {csvp}"
         # optional ALSA device
-        alsa_dev = params.get("alsa_dev")
-        cmd = [python, script, str(int(user_num) if user_num else "1"), audio, csvp]
-        if alsa_dev:
-            cmd.append(alsa_dev)
-        return cmd, f"Rhythm user={user_num} audio={audio} csv={csvp}"
+        alsa_dev = params.get("alsa_dev") or (rig or {}).get("alsaDev")
+        argv = [str(int(user_num) if user_num else "1"), audio, csvp]
+        offset = params.get("csvOffset")
+        if alsa_dev or offset is not None:
+            argv.append(alsa_dev or "-")
+        if offset is not None:
+            argv.append(str(float(offset)))
+        return argv, f"Rhythm user={user_num} audio={audio} csv={csvp}"
+
+    if game == "calibrate":
+        # calibrate.py: usage: [beats] [bpm] [alsa_dev]
+        beats = int(params.get("beats", 16))
+        bpm = float(params.get("bpm", 100))
+        alsa_dev = params.get("alsa_dev") or (rig or {}).get("alsaDev")
+        argv = [str(beats), str(bpm)] + ([alsa_dev] if alsa_dev else [])
+        return argv, f"Calibration beats={beats} bpm={bpm:g}"
 
     return None, f"unknown game '{game}'"
 
-# ----- PAD management (create / destroy so children can claim GPIO) -----
-pads = []
-pads_lock = threading.Lock()
-
-def create_pads():
-    """Create Button objects and attach handlers. Safe to call after cleaning up."""
-    global pads
-    from gpiozero import Button as GpioButton
-    with pads_lock:
-        # ensure we don't leak old Button objects
-        if pads:
-            return
-        pads = [GpioButton(pin, pull_up=True, bounce_time=0.02) for pin in PAD_PINS]
-        for i, pad in enumerate(pads):
-            pad.when_pressed = (lambda i=i: on_pad_press(i))
-    print("[pads] created")
-
-def destroy_pads():
-    """Close Button objects to release GPIO so a child process can claim pins."""
-    global pads
-    with pads_lock:
-        if not pads:
-            return
-        for p in pads:
-            try:
-                p.close()
-            except Exception as e:
-                print("[pads] close error", e)
-        pads = []
-    # also try to close the pin factory (best-effort)
-    try:
-        from gpiozero import Device
-        pf = Device.pin_factory
-        if pf and hasattr(pf, "close"):
-            try:
-                pf.close()
-                print("[pads] pin_factory closed")
-            except Exception as e:
-                print("[pads] pin_factory close failed", e)
-    except Exception:
-        pass
-    print("[pads] destroyed")
-
-def on_pad_press(index):
-    payload = {
-        "pad": index + 1,
-        "action": "press",
-        "timestamp": now_iso(),
-    }
-    publish_json(TOPIC_BTN, payload, qos=0)
-    print("[pad] published", payload)
-
-# create pads initially
-create_pads()
+def build_cmd_for_payload(payload, base_dir=BASE_DIR, rig=None):
+    """Return (cmd_list, human_reason) or (None, error_message) for subprocess mode."""
+    game = payload.get("game")
+    # resolve script path
+    script = os.path.join(base_dir, f"{game}.py") if game in GAME_SCRIPTS else None
+    if not script or not os.path.exists(script):
+        return None, f"script for game '{game}' not found ({script})"
+    argv, reason = build_args_for_payload(payload, rig)
+    if argv is None:
+        return None, reason
+    # default base python command
+    python = os.getenv("PYTHON_BIN", "python3")
+    return [python, script] + argv, reason
+
+def build_gen_cmd(params, base_dir=BASE_DIR):
+    """Return (cmd_list, human_reason) or (None, error_message) for a "generate" action."""
+    script = os.path.join(base_dir, "beatmap_gen.py")
+    if not os.path.exists(script):
+        return None, f"beatmap_gen.py not found ({script})"
+    audio = params.get("audio")
+    if not audio or not os.path.exists(audio):
+        return None, f"audio file not found: {audio}"
+    difficulty = str(params.get("difficulty") or "intermediate")
+    out = params.get("out")
+    if out and not str(out).endswith(".csv"):
+        return None, f"out must be a .csv path: {out}"
+    python = os.getenv("PYTHON_BIN", "python3")
+    cmd = [python, script, audio, "--difficulty", difficulty, "--json"]
+    if out:
+        cmd += ["--out", str(out)]
+    if params.get("force"):
+        cmd.append("--force")
+    return cmd, f"generate {difficulty} chart for {audio}"
+
+# ---------- MQTT on the asyncio loop ----------
+class AsyncMqtt:
+    """Drives a paho client from the asyncio loop instead of paho's network thread.
+
+    paho reports its socket through the on_socket_* callbacks; reads and
+    writes run as loop reader/writer callbacks and loop_misc() (keepalive,
+    retries) once a second. run() connects and reconnects with backoff, which
+    is what loop_forever() used to do.
+    """
 
+    def __init__(self, client_, loop_):
+        self.client = client_
+        self.loop = loop_
+        self._misc = None
+        self._lost = asyncio.Event()
+        client_.on_socket_open = self._on_socket_open
+        client_.on_socket_close = self._on_socket_close
+        client_.on_socket_register_write = self._on_register_write
+        client_.on_socket_unregister_write = self._on_unregister_write
+        client_.on_disconnect = self._on_disconnect
+
+    def _soon(self, fn, *args):
+        # connect() runs in the executor, so these can arrive off the loop; they are
+        # queued in order and keyed by fd, since the socket may be closed by then
+        if on_loop(): fn(*args)
+        elif not self.loop.is_closed(): self.loop.call_soon_threadsafe(fn, *args)
+
+    def _on_socket_open(self, client_, userdata, sock):
+        self._soon(self._opened, sock.fileno())
+
+    def _opened(self, fd):
+        self.loop.add_reader(fd, self.client.loop_read)
+        if self._misc is None:
+            self._misc = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client_, userdata, sock):
+        self._soon(self.loop.remove_reader, sock.fileno())
+
+    def _on_register_write(self, client_, userdata, sock):
+        self._soon(self.loop.add_writer, sock.fileno(), self.client.loop_write)
+
+    def _on_unregister_write(self, client_, userdata, sock):
+        self._soon(self.loop.remove_writer, sock.fileno())
+
+    def _on_disconnect(self, client_, userdata, rc):
+        print(f"[mqtt] disconnected rc={rc}")
+        self._soon(self._lost.set)
+
+    async def _misc_loop(self):
+        try:
+            while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+                await asyncio.sleep(1)
+        finally:
+            self._misc = None
 
-# ---------- MQTT callbacks ----------
-client = mqtt.Client(client_id=DEVICE_ID, clean_session=False)
+    async def run(self, broker, port, keepalive=30):
+        delay = 1
+        while True:
+            self._lost.clear()
+            try:
+                # blocking TCP connect, kept off the loop
+                await self.loop.run_in_executor(None, self.client.connect, broker, port, keepalive)
+            except OSError as e:
+                print(f"[mqtt] connect failed ({e}); retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+            delay = 1
+            await self._lost.wait()
+            await asyncio.sleep(1)
+
+client = mqtt.Client(client_id=LAUNCHER_ID, clean_session=False)
 
 def on_connect(client_local, userdata, flags, rc):
     print(f"[mqtt] connected rc={rc}")
-    client_local.subscribe(TOPIC_CONTROL, qos=1)
+    for dev in devices.values():
+        client_local.subscribe(dev.topic_control, qos=1)
     client_local.subscribe(f"session/+/heartrate", qos=1)
+    if spool is not None:
+        replay = spool.unsent()
+        if replay: print(f"[spool] replaying {len(replay)} messages")
+        for rid in replay: send_spooled(rid)
     # publish status retained
-    publish_json(TOPIC_STATUS, {"state":"online","deviceId":DEVICE_ID,"ts":now_iso()}, qos=1, retain=True)
+    for dev in devices.values():
+        publish_json(dev.topic_status, {"state":"online","deviceId":dev.id,"ts":now_iso()}, qos=1, retain=True)
+
+def on_publish(client_local, userdata, mid):
+    if spool is not None: spool.acked(mid)
+
+async def publish_spool_metrics():
+    while True:
+        await asyncio.sleep(SPOOL_METRICS_S)
+        m = spool.metrics()
+        publish_json(TOPIC_SPOOL, m, qos=0)
+        if m["depth"]: print("[spool]", m)
 
 def on_message(client_local, userdata, msg):
+    # runs on the loop: anything slow goes into a task so control traffic is never held up
     try:
         payload = json.loads(msg.payload.decode())
     except Exception as e:
@@ -205,179 +390,554 @@ def on_message(client_local, userdata, msg):
         return
     print(f"[recv] {msg.topic} -> {payload}")
 
-    action = payload.get("action")
-    if action == "start":
-        session_id = payload.get("sessionId") or f"{uuid.uuid4().hex[:8]}"
-        reply = payload.get("replyTopic")
-        if reply:
-            ack = {"accepted": True, "sessionId": session_id, "timestamp": now_iso()}
-            publish_json(reply, ack, qos=1)
-            print(f"[ack] Sent ack to {reply}")
-
-        # start a thread to launch the requested game
-        t = threading.Thread(target=launch_game_thread, args=(session_id, payload), daemon=True)
-        t.start()
-
-    elif action == "stop":
-        session_id = payload.get("sessionId")
-        if not session_id:
-            print("[stop] missing sessionId")
+    parts = msg.topic.split("/")
+    if len(parts) >= 3 and parts[0] == "device" and parts[2] == "control":
+        dev = devices.get(parts[1])
+        if dev is None:
+            print(f"[recv] no rig {parts[1]} on this launcher")
             return
-        stopped = stop_session(session_id)
-        # reply if requested
-        if payload.get("replyTopic"):
-            publish_json(payload["replyTopic"], {"stopped": stopped, "sessionId": session_id, "ts": now_iso()}, qos=1)
+        dev.on_control(payload)
 
     elif payload.get("heartrate") is not None:
         # forward or print; leftover behavior
         print(f"[hr] session {payload.get('sessionId')} -> {payload.get('heartrate')} bpm")
 
-def stop_session(session_id):
-    """Attempt to terminate a running session process group."""
-    with running_sessions_lock:
-        info = running_sessions.get(session_id)
-        if not info:
-            print(f"[stop] session {session_id} not running")
-            return False
-        proc = info.get("proc")
-        try:
-            # kill process group
-            pgid = os.getpgid(proc.pid)
-            os.killpg(pgid, signal.SIGTERM)
-            print(f"[stop] signalled SIGTERM to pgid {pgid} for session {session_id}")
-        except Exception as e:
-            print("[stop] kill failed", e)
-        return True
-
-def launch_game_thread(session_id, payload):
-    cmd, reason = build_cmd_for_payload(payload)
-    if cmd is None:
-        ...
-    print(f"[game] starting {payload.get('game')} session {session_id} -> {reason}")
-
-    # Release GPIO so child can open the pins
-    destroy_pads()
-
-    try:
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, cwd=BASE_DIR, preexec_fn=os.setsid)
-    except Exception as e:
-        print("[game] failed to spawn", e)
-        # recreate pads so parent continues working
-        create_pads()
-        ...
-        return
-
-    # register session
-    with running_sessions_lock:
-        running_sessions[session_id] = {"proc": proc, "started_at": time.time(), "game": payload.get("game"), "cmd": cmd}
-
-    # stream stdout loop (unchanged)...
+# ---------- sessions ----------
+def signal_session(info, sig):
+    """Send sig to a session's game; returns what was signalled, or None if it is gone."""
     try:
-        while True:
-            line = proc.stdout.readline()
-            if line:
-                line = line.rstrip()
-                print(f"[{session_id}] {line}")
-            elif proc.poll() is not None:
-                break
-            else:
-                time.sleep(0.05)
+        if info.get("pid"):
+            # zygote child: signal just the game, the zygote reports its exit
+            os.kill(info["pid"], sig)
+            return f"pid {info['pid']}"
+        # whole process group
+        pgid = os.getpgid(info["proc"].pid)
+        os.killpg(pgid, sig)
+        return f"pgid {pgid}"
+    except ProcessLookupError:
+        return None
     except Exception as e:
-        print("[game] stdout read loop error", e)
-
-    # process finished
-    rc = proc.poll()
-    runtime = time.time() - running_sessions.get(session_id, {}).get("started_at", time.time())
-    print(f"[game] finished session {session_id} rc={rc} runtime_s={runtime:.1f}")
-
-    # cleanup session tracking
-    with running_sessions_lock:
-        running_sessions.pop(session_id, None)
-
-    # recreate pads so the mqtt launcher can detect pad presses again
-    # small delay to allow kernel to free resources if needed
-    time.sleep(0.1)
+        print("[stop] kill failed", e)
+        return None
+
+def reject_session(session_id, payload, reason):
+    print(f"[game] not starting session {session_id}: {reason}")
+    if payload.get("replyTopic"):
+        publish_json(payload["replyTopic"], {"accepted": False, "reason": reason, "sessionId": session_id, "ts": now_iso()}, qos=1)
+
+def live_publisher(session_id):
+    """session/{id}/live batches for one session (QoS 0: a lost update is superseded by the next)."""
+    def schedule(delay, fn):
+        loop.call_soon_threadsafe(loop.call_later, delay, fn)
+    return LivePublisher(session_id, lambda topic, body: publish_json(topic, body, qos=0), schedule=schedule)
+
+async def pump_telemetry(f, live, on_event=None):
+    """Feed a game's telemetry pipe (binary file object) into `live` until EOF (and on_event, on the loop)."""
+    reader = asyncio.StreamReader(limit=LINE_LIMIT)
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), f)
     try:
-        create_pads()
-    except Exception as e:
-        print("[pads] recreate failed", e)
-
-    # publish result (existing behavior)...
-
-    except Exception as e:
-        print("[game] failed to spawn", e)
-        if payload.get("replyTopic"):
-            publish_json(payload["replyTopic"], {"accepted": False, "reason": str(e), "sessionId": session_id, "ts": now_iso()}, qos=1)
-        return
-
-    # register
-    with running_sessions_lock:
-        running_sessions[session_id] = {"proc": proc, "started_at": time.time(), "game": payload.get("game"), "cmd": cmd}
+        async for line in reader:
+            ev = parse_telemetry(line)
+            if ev is None: continue
+            live.add(ev)
+            if on_event is not None: on_event(ev)
+    except ValueError as e:
+        print("[game] telemetry line dropped", e)
+    finally:
+        transport.close()
 
-    # stream stdout (non-blocking loop)
+async def end_telemetry(task, timeout=1.0):
+    # the pipe hits EOF when the game exits; don't wait on a leaked write end
     try:
-        while True:
-            line = proc.stdout.readline()
-            if line:
-                line = line.rstrip()
-                print(f"[{session_id}] {line}")
-            elif proc.poll() is not None:
-                # process ended
-                break
-            else:
-                time.sleep(0.05)
-    except Exception as e:
-        print("[game] stdout read loop error", e)
+        await asyncio.wait_for(task, timeout)
+    except Exception:
+        pass
 
-    # process finished
-    rc = proc.poll()
-    runtime = time.time() - running_sessions.get(session_id, {}).get("started_at", time.time())
+async def read_lines(stream):
+    """Decoded lines of a subprocess stream until EOF."""
+    while True:
+        try:
+            raw = await stream.readline()
+        except ValueError:              # longer than LINE_LIMIT; drop it
+            print("[game] overlong output line dropped")
+            continue
+        if not raw: return
+        yield raw.decode(errors="replace").rstrip()
+
+def publish_result(session_id, payload, rc, runtime, latency=None, spawn=None, stats=None, device_id=None):
     print(f"[game] finished session {session_id} rc={rc} runtime_s={runtime:.1f}")
-
-    # remove from running sessions
-    with running_sessions_lock:
-        running_sessions.pop(session_id, None)
-
-    # publish result to session/{sessionId}/result
     result = {
         "event": "game_over",
         "sessionId": session_id,
+        "deviceId": device_id,
         "game": payload.get("game"),
         "returnCode": rc,
         "durationGame": int(runtime),
         "timestamp": now_iso()
     }
+    if stats:
+        result["score"] = stats.get("score")
+        result["stats"] = stats
+    if latency is not None:
+        result["latency"] = latency
+    if spawn:
+        result["spawn"] = spawn
     publish_json(f"session/{session_id}/result", result, qos=1)
     print(f"[game] result published for {session_id}")
 
+class Device:
+    """One cabinet driven by this launcher: its pads, game host or zygote, and sessions."""
+
+    def __init__(self, rig):
+        self.rig = rig
+        self.id = rig["deviceId"]
+        self.base_dir = rig["baseDir"]
+        self.mode = (rig.get("hostMode") or GAME_HOST_MODE).strip().lower()
+        self.topic_control = f"device/{self.id}/control/#"
+        self.topic_btn = f"device/{self.id}/btn"
+        self.topic_btn_batch = f"device/{self.id}/btn/batch"
+        self.topic_status = f"device/{self.id}/status"
+        self.topic_lwt = f"device/{self.id}/lwt"
+        self.topic_sessions = f"device/{self.id}/sessions"
+        self.pad_socket = os.path.join(PAD_SOCKET_DIR, f"fitfighter-{self.id}-pads.sock")
+        # what a game process needs to find this rig's hardware
+        self.env = {PAD_SOCKET_ENV: self.pad_socket, ENV_RIG: json.dumps(rig)}
+        self.pad_service = None
+        self.host = None        # GameHost (inprocess mode)
+        self.zygote = None      # ZygoteLauncher (zygote mode)
+        # running sessions { session_id: {proc, started_at, game, cmd, pid} } (subprocess/zygote mode);
+        # only touched from the loop, so no lock
+        self.sessions = {}
+        # one session at a time; pending starts wait here
+        self.scheduler = SessionScheduler(
+            self.run_session, self.stop_session, self.kill_session, go=self.go_session,
+            policy=(rig.get("sessionPolicy") or SESSION_POLICY).strip().lower(),
+            max_pending=int(rig.get("sessionQueueMax", SESSION_QUEUE_MAX)),
+            stop_timeout_s=STOP_TIMEOUT_S, arm_timeout_s=ARM_TIMEOUT_S, on_change=self.publish_sessions)
+        # prepared sessions: session_id -> (payload, launched_at) until they end
+        self.prepared = {}
+        self.tasks = []
+
+    def log(self, *args):
+        if len(devices) > 1: print(f"[{self.id}]", *args)
+        else: print(*args)
+
+    async def open(self, namespace=None):
+        # the launcher owns the pads for good; every press goes out on topic_btn and to the running game
+        self.pad_service = PadInputService(self.rig["padGpio"])
+        events = self.pad_service.queue(loop)
+        if self.mode in ("subprocess", "zygote"):
+            self.pad_service.serve(self.pad_socket)
+            if self.mode == "zygote":
+                self.zygote = ZygoteLauncher(cwd=self.base_dir, limit=LINE_LIMIT, env=self.env)
+                await self.zygote.warm()
+        else:
+            self.host = GameHost(Rig(pads=self.pad_service, **rig_kwargs(self.rig)), namespace=namespace)
+            self.host.preload()
+            self.log(f"[host] ready, games: {', '.join(sorted(self.host.plugins))}")
+        self.tasks.append(loop.create_task(self.publish_pads(events)))
+
+    # ----- pad input -----
+    async def publish_pads(self, events):
+        """Pad presses from the service's asyncio queue -> topic_btn, or batched to topic_btn_batch."""
+        if PAD_PUBLISH == "compact":
+            await self.publish_pad_batches(events)
+            return
+        while True:
+            seq, pad, ts = await events.get()
+            payload = {
+                "pad": pad,
+                "action": "press",
+                "seq": seq,
+                "timestamp": now_iso(),
+            }
+            publish_json(self.topic_btn, payload, qos=0)
+            self.log("[pad] published", payload)
+
+    async def publish_pad_batches(self, events):
+        dropped_seen = 0
+        while True:
+            batch = [await events.get()]
+            await asyncio.sleep(PAD_BATCH_MS / 1000.0)       # micro-batching window
+            while len(batch) < pad_codec.MAX_BATCH and not events.empty():
+                batch.append(events.get_nowait())
+            now = time.monotonic()
+            late = sum(1 for _, _, ts in batch if (now - ts) * 1000.0 > PAD_LATE_MS)
+            dropped, dropped_seen = events.dropped - dropped_seen, events.dropped
+            _publish(self.topic_btn_batch, pad_codec.encode(batch, dropped, late, self.pad_service.epoch), 0, False)
+            self.log(f"[pad] published batch n={len(batch)} seq={batch[0][0]}..{batch[-1][0]}"
+                     + (f" dropped={dropped}" if dropped else "") + (f" late={late}" if late else ""))
+
+    # ----- control -----
+    def on_control(self, payload):
+        action = payload.get("action")
+        if action in ("start", "prepare"):
+            session_id = payload.get("sessionId") or f"{uuid.uuid4().hex[:8]}"
+            accepted, detail = self.scheduler.submit(session_id, payload, prepare=action == "prepare")
+            if not accepted:
+                reject_session(session_id, payload, detail)
+                return
+            reply = payload.get("replyTopic")
+            if reply:
+                ack = {"accepted": True, "sessionId": session_id, "state": detail,
+                       "queueDepth": len(self.scheduler.pending), "timestamp": now_iso()}
+                publish_json(reply, ack, qos=1)
+                self.log(f"[ack] Sent ack to {reply}")
+
+        elif action == "stop":
+            session_id = payload.get("sessionId")
+            if not session_id:
+                self.log("[stop] missing sessionId")
+                return
+            stopped = self.scheduler.stop(session_id)
+            self.log(f"[stop] session {session_id} " + (self.scheduler.state if stopped else "not running"))
+            # reply if requested
+            if payload.get("replyTopic"):
+                publish_json(payload["replyTopic"], {"stopped": stopped, "sessionId": session_id, "ts": now_iso()}, qos=1)
+
+        elif action == "go":
+            session_id = payload.get("sessionId")
+            ok, detail = self.scheduler.go(session_id)
+            self.log(f"[go] session {session_id}: {detail}")
+            if payload.get("replyTopic"):
+                publish_json(payload["replyTopic"], {"go": ok, "sessionId": session_id, "state" if ok else "reason": detail,
+                                                     "ts": now_iso()}, qos=1)
+
+        elif action == "generate":
+            task = loop.create_task(self.generate_beatmap(payload))
+            self.tasks.append(task)
+            task.add_done_callback(lambda t: t in self.tasks and self.tasks.remove(t))
+
+    def publish_sessions(self, snapshot):
+        publish_json(self.topic_sessions, dict(snapshot, deviceId=self.id, ts=now_iso()), qos=0, retain=True)
+
+    # ----- stopping (called by the scheduler) -----
+    def stop_session(self, session_id):
+        """Ask a session to end: the hosted game's stop flag, or SIGTERM to the game process."""
+        if self.host is not None:
+            self.host.stop(session_id)
+            return
+        info = self.sessions.get(session_id)
+        if not info:
+            return              # still spawning; the scheduler stops it once it is up
+        target = signal_session(info, signal.SIGTERM)
+        if target: self.log(f"[stop] signalled SIGTERM to {target} for session {session_id}")
+
+    def kill_session(self, session_id):
+        """The session ignored its stop for STOP_TIMEOUT_S."""
+        if self.host is not None:
+            # a game thread cannot be killed; the rig stays in `stopping` until it returns
+            self.log(f"[stop] in-process session {session_id} has not returned after {STOP_TIMEOUT_S}s")
+            return
+        info = self.sessions.get(session_id)
+        target = signal_session(info, signal.SIGKILL) if info else None
+        if target: self.log(f"[stop] session {session_id} ignored SIGTERM for {STOP_TIMEOUT_S}s; SIGKILL to {target}")
+
+    def end_session(self, session_id):
+        info = self.sessions.pop(session_id, None) or {}
+        if info.get("go") is not None:
+            os.close(info["go"])
+        return time.time() - info.get("started_at", time.time())
+
+    # ----- two-phase start -----
+    def on_game_event(self, session_id, ev):
+        """Telemetry from a running game, on the loop (the live stream gets it as well)."""
+        if ev.get("k") != "armed" or session_id not in self.prepared:
+            return
+        payload, launched = self.prepared[session_id]
+        if not self.scheduler.armed(session_id):
+            return
+        arm_ms = round((time.monotonic() - launched) * 1000.0, 1)
+        self.log(f"[game] session {session_id} armed in {arm_ms} ms")
+        if payload.get("replyTopic"):
+            info = {k: v for k, v in ev.items() if k not in ("k", "t")}
+            publish_json(payload["replyTopic"], dict(info, armed=True, sessionId=session_id, armMs=arm_ms,
+                                                     state=self.scheduler.state, ts=now_iso()), qos=1)
+
+    def go_session(self, session_id):
+        """Release an armed session (called by the scheduler on `go`)."""
+        t_cmd = time.monotonic()
+        if self.host is not None:
+            self.host.go(session_id, t_cmd)
+            return
+        info = self.sessions.get(session_id) or {}
+        try:
+            StartGate.send(info["go"], t_cmd)
+        except (KeyError, OSError) as e:
+            self.log(f"[go] session {session_id} could not be released ({e})")
+
+    # ----- beatmap generation -----
+    async def generate_beatmap(self, payload):
+        """Run beatmap_gen.py for a "generate" action and reply with its summary."""
+        cmd, reason = build_gen_cmd(payload.get("params") or {}, self.base_dir)
+        if cmd is None:
+            result = {"ok": False, "error": reason}
+        else:
+            if gen_lock.locked():
+                self.log("[gen] waiting for the running generator")
+            async with gen_lock:
+                self.log(f"[gen] {reason}")
+                summary, rc = None, None
+                try:
+                    proc = await asyncio.create_subprocess_exec(
+                        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, cwd=self.base_dir,
+                        preexec_fn=lambda: os.nice(GEN_NICE), limit=LINE_LIMIT)
+                    async for line in read_lines(proc.stdout):
+                        if line.startswith("{"):
+                            try: summary = json.loads(line)
+                            except ValueError: pass
+                        self.log(f"[gen] {line}")
+                    rc = await proc.wait()
+                except Exception as e:
+                    self.log("[gen] failed to spawn", e)
+                    rc = str(e)
+            result = summary or {"ok": False, "error": f"beatmap_gen.py ended without a summary (rc={rc})"}
+        self.log(f"[gen] {'done' if result.get('ok') else 'failed'}: {result.get('csv') or result.get('error')}")
+        if payload.get("replyTopic"):
+            publish_json(payload["replyTopic"], dict(result, deviceId=self.id, requestId=payload.get("requestId"), ts=now_iso()), qos=1)
+
+    # ----- sessions -----
+    async def run_session(self, session_id, payload, started):
+        """One whole session, run by the scheduler; started() once the game is up."""
+        if payload.get("action") == "prepare":
+            self.prepared[session_id] = (payload, time.monotonic())
+        try:
+            if self.host is not None:
+                await self.launch_hosted(session_id, payload, started)
+            elif self.zygote is not None:
+                await self.launch_zygote(session_id, payload, started)
+            else:
+                await self.launch_subprocess(session_id, payload, started)
+        finally:
+            self.prepared.pop(session_id, None)
+
+    async def launch_hosted(self, session_id, payload, started):
+        argv, reason = build_args_for_payload(payload, self.rig)
+        if argv is None:
+            reject_session(session_id, payload, reason)
+            return
+        self.log(f"[game] starting {payload.get('game')} session {session_id} in-process -> {reason}")
+
+        live = live_publisher(session_id)
+        done = loop.create_future()
+
+        def on_done(rc, result, runtime):       # game thread
+            loop.call_soon_threadsafe(done.set_result, (rc, result, runtime))
+
+        def on_event(ev):                       # game thread
+            live.add(ev)
+            if ev.get("k") == "armed":
+                loop.call_soon_threadsafe(self.on_game_event, session_id, ev)
+
+        try:
+            ok = self.host.start(session_id, payload.get("game"), argv, on_done, on_event=on_event,
+                                 arm=session_id in self.prepared)
+        except Exception as e:
+            reject_session(session_id, payload, str(e))
+            return
+        if not ok:
+            reject_session(session_id, payload, f"busy: session {self.host.session_id} is running")
+            return
+        started()
+        rc, result, runtime = await done
+        final = live.close()
+        publish_result(session_id, payload, rc, runtime, result.get("latency"),
+                       stats=result.get("stats") or final, device_id=self.id)
+
+    async def launch_zygote(self, session_id, payload, started):
+        argv, reason = build_args_for_payload(payload, self.rig)
+        if argv is None:
+            reject_session(session_id, payload, reason)
+            return
+        self.log(f"[game] starting {payload.get('game')} session {session_id} from zygote -> {reason}")
+
+        try:
+            proc, t_cmd = await self.zygote.start(session_id, payload.get("game"), argv, arm=session_id in self.prepared)
+        except Exception as e:
+            self.log("[game] zygote start failed", e)
+            reject_session(session_id, payload, str(e))
+            loop.create_task(self.zygote.warm())
+            return
+
+        info = self.sessions[session_id] = {"proc": proc, "started_at": time.time(), "game": payload.get("game"), "argv": argv,
+                                            "pid": None, "go": proc.go}
+        live = live_publisher(session_id)
+        reader = loop.create_task(pump_telemetry(proc.telemetry, live, lambda ev: self.on_game_event(session_id, ev)))
+
+        latency = None
+        spawn = {}      # fork_ms / first_frame_ms, measured from t_cmd
+        rc = None
+        async for line in read_lines(proc.stdout):
+            msg = parse_zygote_line(line)
+            if msg is None:
+                print(f"[{session_id}] {line}")
+                latency = parse_latency_line(line) or latency
+                continue
+            ev = msg.get("event")
+            if ev == "forked":
+                spawn["fork_ms"] = msg.get("fork_ms")
+                info["pid"] = msg.get("pid")
+                started()
+            elif ev == "done":
+                rc = msg.get("rc")
+                spawn["first_frame_ms"] = msg.get("first_frame_ms")
+            elif ev == "exit":
+                info["pid"] = None
+                if rc is None: rc = msg.get("status")
+        status = await proc.wait()
+        if rc is None: rc = status
+        runtime = self.end_session(session_id)
+        self.log(f"[game] spawn {session_id}: {spawn}")
+        await end_telemetry(reader)
+        final = live.close()
+
+        loop.create_task(self.zygote.warm())      # replacement for the next session
+
+        publish_result(session_id, payload, rc, runtime, latency, spawn, stats=final, device_id=self.id)
+
+    async def launch_subprocess(self, session_id, payload, started):
+        cmd, reason = build_cmd_for_payload(payload, self.base_dir, self.rig)
+        if cmd is None:
+            reject_session(session_id, payload, reason)
+            return
+        self.log(f"[game] starting {payload.get('game')} session {session_id} -> {reason}")
+
+        # live events arrive on their own pipe, apart from the game's stdout
+        tele_r, tele_w = os.pipe()
+        env = dict(os.environ, **self.env); env[TELEMETRY_FD_ENV] = str(tele_w)
+        fds = [tele_w]
+        go_r = go_w = None
+        if session_id in self.prepared:
+            # the game waits at its start line until a line on this pipe
+            go_r, go_w = os.pipe()
+            env[GO_FD_ENV] = str(go_r)
+            fds.append(go_r)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, cwd=self.base_dir,
+                env=env, pass_fds=fds, start_new_session=True, limit=LINE_LIMIT)
+        except Exception as e:
+            self.log("[game] failed to spawn", e)
+            os.close(tele_r)
+            if go_w is not None: os.close(go_w)
+            reject_session(session_id, payload, str(e))
+            return
+        finally:
+            for fd in fds: os.close(fd)
+        live = live_publisher(session_id)
+        reader = loop.create_task(pump_telemetry(os.fdopen(tele_r, "rb", 0), live,
+                                                 lambda ev: self.on_game_event(session_id, ev)))
+
+        # register session
+        self.sessions[session_id] = {"proc": proc, "started_at": time.time(), "game": payload.get("game"), "cmd": cmd,
+                                     "go": go_w}
+        started()
+
+        # echo stdout until the game closes it
+        latency = None   # press->LED histograms from the game's "[latency] {...}" line
+        async for line in read_lines(proc.stdout):
+            print(f"[{session_id}] {line}")
+            latency = parse_latency_line(line) or latency
+
+        # process finished
+        rc = await proc.wait()
+        runtime = self.end_session(session_id)
+        await end_telemetry(reader)
+        final = live.close()
+
+        # publish result to session/{sessionId}/result
+        publish_result(session_id, payload, rc, runtime, latency, stats=final, device_id=self.id)
+
+    async def close(self):
+        # drops pending starts, stops the running session (SIGKILL if it ignores that)
+        await self.scheduler.close()
+        if self.host is not None:
+            await loop.run_in_executor(None, self.host.close)     # joins the game thread
+        if self.zygote is not None:
+            await self.zygote.close()
+        if self.pad_service is not None:
+            self.pad_service.close()
+        for t in self.tasks: t.cancel()
+
 # ---------- main ----------
-def main():
+def use_pidfd_watcher():
+    # before 3.12 asyncio waits for each child on a thread of its own; a pidfd watcher
+    # (Linux 5.3+) reaps from the loop instead (3.12+ does this by itself)
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, "PidfdChildWatcher"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    asyncio.set_child_watcher(watcher)
+
+async def shutdown():
+    await asyncio.gather(*(dev.close() for dev in devices.values()))
+    if len(devices) > 1:
+        # the broker's will covers the launcher topic only; say it per rig while we can
+        for dev in devices.values():
+            offline = {"state": "offline", "deviceId": dev.id, "ts": now_iso()}
+            publish_json(dev.topic_lwt, offline, qos=1, retain=True)
+            publish_json(dev.topic_status, offline, qos=1, retain=True)
+    await asyncio.sleep(0.1)     # let queued publishes (results) go out
+
+async def amain():
+    global loop, spool, gen_lock
+    loop = asyncio.get_running_loop()
+    gen_lock = asyncio.Lock()
+    use_pidfd_watcher()
+    rigs = load_rigs(RIGS_FILE, DEVICE_ID, BASE_DIR)
+    if SPOOL_PATH:
+        spool = PublishSpool(SPOOL_PATH, max_bytes=SPOOL_MAX_BYTES)
+        spool.load()
+    for rig in rigs:
+        devices[rig["deviceId"]] = Device(rig)
+    # with several rigs each gets its own copy of the game modules (their state is module-global)
+    for dev in devices.values():
+        await dev.open(namespace=dev.id if len(devices) > 1 else None)
+    if len(devices) > 1:
+        print(f"[main] driving {len(devices)} rigs: {', '.join(devices)}")
+
     client.username_pw_set(USERNAME, PASSWORD)
     if USE_TLS:
         client.tls_set()
 
+    # one connection has one will: the rig's own LWT topic, or the launcher's listing every rig
+    if len(devices) == 1:
+        dev = next(iter(devices.values()))
+        will_topic, will = dev.topic_lwt, {"state": "offline", "deviceId": dev.id, "ts": now_iso()}
+    else:
+        will_topic, will = LAUNCHER_LWT_TOPIC, {"state": "offline", "launcherId": LAUNCHER_ID, "devices": list(devices), "ts": now_iso()}
     client.will_set(
-        LWT_TOPIC,
-        json.dumps({"state": "offline", "deviceId": DEVICE_ID, "ts": now_iso()}),
+        will_topic,
+        json.dumps(will),
         qos=1,
         retain=True
     )
 
     client.on_connect = on_connect
     client.on_message = on_message
-
-    client.connect(BROKER, PORT, keepalive=30)
+    client.on_publish = on_publish
+
+    stopping = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    tasks = [loop.create_task(AsyncMqtt(client, loop).run(BROKER, PORT, keepalive=30))]
+    if spool is not None:
+        tasks += [loop.create_task(spool.run(loop)), loop.create_task(publish_spool_metrics())]
     try:
-        client.loop_forever()
+        await stopping.wait()
     finally:
-        # attempt to stop running game procs on exit
-        with running_sessions_lock:
-            for sid, info in list(running_sessions.items()):
-                try:
-                    pgid = os.getpgid(info["proc"].pid)
-                    os.killpg(pgid, signal.SIGTERM)
-                except Exception:
-                    pass
+        print("[main] shutting down")
+        await shutdown()
+        for t in tasks: t.cancel()
+        if spool is not None:
+            await spool.close(loop)
+
+def main():
+    asyncio.run(amain())
 
 if __name__ == "__main__":
     main()
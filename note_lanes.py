@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+note_lanes.py
+
+Per-pad note lanes for Rhythm, as index ranges into a compiled beatmap
+(beatmap.py).
+
+The Rhythm loop used to keep a list of note dicts per pad, scan it for the
+first unjudged note and rebuild every list with a comprehension on each
+pass. Here each pad has the beatmap indices of its notes in chart order
+(built once per session) and a live window [head, tail) into them:
+
+  appear(t)     notes whose t_appear <= t join their pad's lane: tail += 1
+  first(pid)    the note a press is judged against (the oldest live one)
+  pop(pid)      that note was judged (hit, late or expired): head += 1
+
+The beatmap is sorted by t_appear and then t_hit, so within a pad notes are
+due in lane order: judging and expiry only ever take the head, and a pass
+costs O(1) per pad plus O(1) per note that appears or ends. Nothing is
+allocated while playing; per-note state (the bar colour layer, and the lit
+pixel count the renderer drew last) lives in arrays sized once per session.
+"""
+
+from array import array
+
+MAX_PAD = 8
+
+
+class NoteLanes:
+    def __init__(self, bm, pads=range(1, MAX_PAD + 1)):
+        self.t_hit, self.t_appear, self.beat, self.pad = bm.t_hit, bm.t_appear, bm.beat, bm.pad
+        self.n = len(bm)
+        self.pads = tuple(pads)
+        self.idx = [array("i") for _ in range(MAX_PAD + 1)]     # pid -> beatmap indices, chart order
+        ok = set(p for p in self.pads if 1 <= p <= MAX_PAD)
+        for i, pid in enumerate(self.pad):
+            if pid in ok: self.idx[pid].append(i)
+        self.head = [0] * (MAX_PAD + 1)
+        self.tail = [0] * (MAX_PAD + 1)
+        self.next = 0                                  # next beatmap index to appear
+        self.live_total = 0                            # live notes over all pads
+        self.layer = bytearray(self.n)                 # bar colour layer (0..2), set on appearance
+        self.lit = array("H", b"\xff\xff" * self.n)    # renderer's last lit count per note
+
+    def appear(self, until):
+        """Notes with t_appear <= until enter their lanes; returns how many did."""
+        i, n, t_appear, pad = self.next, self.n, self.t_appear, self.pad
+        start = i
+        while i < n and t_appear[i] <= until:
+            pid = pad[i]
+            if 1 <= pid <= MAX_PAD and self.idx[pid]:
+                # layer alternates with the number of notes already live on the pad
+                self.layer[i] = (self.tail[pid] - self.head[pid]) % 3
+                self.tail[pid] += 1
+                self.live_total += 1
+            i += 1
+        self.next = i
+        return i - start
+
+    def next_appear(self):
+        """t_appear of the next note to enter a lane, or None."""
+        return self.t_appear[self.next] if self.next < self.n else None
+
+    def live(self, pid):
+        return self.tail[pid] - self.head[pid]
+
+    def first(self, pid):
+        """Beatmap index of the pad's oldest live note, or -1."""
+        h = self.head[pid]
+        return self.idx[pid][h] if h < self.tail[pid] else -1
+
+    def pop(self, pid):
+        self.head[pid] += 1
+        self.live_total -= 1
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+pad_codec.py
+
+Compact, batched encoding for pad presses on device/{id}/btn/batch.
+
+The JSON form (device/{id}/btn, one message per press with an ISO wall-clock
+string) is still the default. With PAD_PUBLISH=compact the launcher collects
+presses for up to PAD_BATCH_MS and sends them as one binary message:
+
+  header   struct "<BBHHHIQQ", 28 bytes
+             version   1
+             n         presses in this batch (1..255)
+             dropped   presses lost before publishing since the last batch
+             late      presses in this batch older than the late threshold
+                       when it was sent
+             epoch     which press sequence seq belongs to (PadInputService.epoch,
+                       new whenever the launcher restarts and seq starts over)
+             seq0      sequence number of the first press
+             t0_us     its monotonic capture time, microseconds
+             wall_ms   the same instant on the wall clock (epoch ms)
+  entries  n x struct "<IHB", 7 bytes
+             dt_us     capture time - t0_us
+             dseq      seq - seq0
+             pad       1..8
+
+Sequence numbers come from PadInputService, so a receiver also sees presses
+lost on the way (gaps) and batches arriving out of order (seq going
+backwards); a new epoch starts the counts over. The receiver is the web backend: index.js decodes the batches
+and keeps those counts per device.
+"""
+
+import struct
+import time
+
+VERSION = 1
+HEADER = struct.Struct("<BBHHHIQQ")
+ENTRY = struct.Struct("<IHB")
+MAX_BATCH = 255
+
+
+def encode(presses, dropped=0, late=0, epoch=0, clock=time.monotonic, wallclock=time.time):
+    """One batch message from up to MAX_BATCH (seq, pad, ts) presses, in seq order."""
+    if not presses or len(presses) > MAX_BATCH:
+        raise ValueError(f"batch needs 1..{MAX_BATCH} presses, got {len(presses)}")
+    seq0, _, ts0 = presses[0]
+    t0_us = int(ts0 * 1e6)
+    wall_ms = int((wallclock() - (clock() - ts0)) * 1000)
+    out = bytearray(HEADER.pack(VERSION, len(presses), min(dropped, 0xFFFF), min(late, 0xFFFF), epoch & 0xFFFF,
+                                seq0 & 0xFFFFFFFF, t0_us, wall_ms))
+    for seq, pad, ts in presses:
+        out += ENTRY.pack(max(0, int(ts * 1e6) - t0_us), (seq - seq0) & 0xFFFF, pad)
+    return bytes(out)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+pad_input.py
+
+Persistent pad input service: the launcher owns the eight pad lines for its
+whole lifetime and fans every press out to whoever is listening.
+
+The launcher used to close its Buttons (and the gpiozero pin factory) before
+each session so the game could claim the pins, which also meant no press
+reached device/{id}/btn while a game ran. Now:
+
+  PadInputService   owns the Buttons; each press gets a sequence number and
+                    the monotonic capture time, then goes to
+                      - in-process listeners: fn(seq, pad, ts)
+                      - asyncio queues (queue(loop)) as (seq, pad, ts)
+                      - socket subscribers on a Unix SOCK_SEQPACKET socket
+  PadSubscriber     client side (used by game_rig.Rig in game processes);
+                    calls on_event(seq, pad, ts) from a reader thread and
+                    counts sequence gaps
+
+Wire format: one 16-byte packet per press, struct "<IB3xd" (seq, pad, ts).
+CLOCK_MONOTONIC is system-wide, so ts is directly comparable in the game.
+Sends never block the GPIO callback: a subscriber whose socket buffer is
+full misses that press (and sees the gap), a dead one is dropped.
+
+The socket path is passed to game processes in FITFIGHTER_PAD_SOCKET.
+"""
+
+import asyncio
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+from hw_backend import Button, DEFAULT_PAD_GPIO
+
+PACKET = struct.Struct("<IB3xd")
+DEBOUNCE_S = 0.03
+ENV_SOCKET = "FITFIGHTER_PAD_SOCKET"
+
+
+class PadInputService:
+    def __init__(self, pad_gpio=DEFAULT_PAD_GPIO, debounce_s=DEBOUNCE_S):
+        self.pad_gpio = dict(pad_gpio)
+        self.listeners = []            # fn(seq, pad, ts), called on the GPIO callback thread
+        self.seq = 0
+        self.epoch = random.SystemRandom().randrange(1, 0x10000)     # new per service: receivers see a restart (seq from 0 again)
+        self.dropped = 0               # packets a subscriber could not take
+        self._lock = threading.Lock()
+        self._subs = []
+        self._server = None
+        self.path = None
+        self.buttons = {}
+        for pid,gpio in self.pad_gpio.items():
+            b = Button(gpio, pull_up=True, bounce_time=debounce_s)
+            b.when_pressed = (lambda p=pid: self._on_press(p))
+            self.buttons[pid] = b
+        print("[pads] input service owns", len(self.buttons), "pads")
+
+    def _on_press(self, pid):
+        ts = time.monotonic()
+        with self._lock:
+            self.seq += 1
+            seq = self.seq
+            subs = list(self._subs)
+        pkt = PACKET.pack(seq & 0xFFFFFFFF, pid, ts)
+        for s in subs:
+            try:
+                s.send(pkt)
+            except BlockingIOError:
+                self.dropped += 1
+            except OSError:
+                self._drop(s)
+        for fn in self.listeners:
+            try: fn(seq, pid, ts)
+            except Exception as e: print("[pads] listener failed", e)
+
+    def queue(self, loop, maxsize=1024):
+        """asyncio.Queue on `loop` fed with (seq, pad, ts); a full queue drops (counted in q.dropped)."""
+        q = asyncio.Queue(maxsize)
+        q.dropped = 0
+
+        def put(item):
+            try: q.put_nowait(item)
+            except asyncio.QueueFull: q.dropped += 1
+
+        def listener(seq, pad, ts):
+            try: loop.call_soon_threadsafe(put, (seq, pad, ts))
+            except RuntimeError: pass          # loop already closed
+
+        self.listeners.append(listener)
+        return q
+
+    # ------------------------------
+    # Socket fan-out
+    # ------------------------------
+    def serve(self, path):
+        """Accept subscribers on a Unix seqpacket socket at `path` (background thread)."""
+        try: os.unlink(path)
+        except FileNotFoundError: pass
+        srv = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        srv.bind(path)
+        srv.listen(8)
+        self._server, self.path = srv, path
+        threading.Thread(target=self._accept_loop, name="pad-input", daemon=True).start()
+        return path
+
+    def _accept_loop(self):
+        while self._server is not None:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            conn.setblocking(False)
+            with self._lock: self._subs.append(conn)
+
+    def _drop(self, s):
+        with self._lock:
+            if s in self._subs: self._subs.remove(s)
+        try: s.close()
+        except OSError: pass
+
+    @property
+    def subscribers(self):
+        return len(self._subs)
+
+    def close(self):
+        srv, self._server = self._server, None
+        if srv is not None:
+            try: srv.close()
+            except OSError: pass
+            try: os.unlink(self.path)
+            except OSError: pass
+        for s in list(self._subs): self._drop(s)
+        for b in self.buttons.values():
+            try: b.when_pressed = None; b.close()
+            except Exception: pass
+        self.buttons = {}
+
+
+class PadSubscriber:
+    def __init__(self, path, on_event):
+        self.on_event = on_event
+        self.gaps = 0                  # presses lost between service and this process
+        self._last = None
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._sock.connect(path)       # raises if no service is listening
+        self._thread = threading.Thread(target=self._read_loop, name="pad-subscriber", daemon=True)
+        self._thread.start()
+
+    def _read_loop(self):
+        sock, size = self._sock, PACKET.size
+        while True:
+            try:
+                data = sock.recv(size)
+            except OSError:
+                break
+            if len(data) != size: break            # service closed
+            seq, pid, ts = PACKET.unpack(data)
+            if self._last is not None and seq != ((self._last + 1) & 0xFFFFFFFF):
+                self.gaps += (seq - self._last - 1) & 0xFFFFFFFF
+            self._last = seq
+            self.on_event(seq, pid, ts)
+
+    def close(self):
+        try: self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+        try: self._sock.close()
+        except OSError: pass
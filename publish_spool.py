@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+publish_spool.py
+
+Disk-backed outbox for the launcher's QoS 1 publishes (results, acks, stop
+replies, status).
+
+publish_json() used to hand everything straight to paho and swallow the
+error, so a broker link that dropped mid-session lost session/{id}/result.
+Now every QoS 1 message is put in the spool first:
+
+  put()        record it in memory (never touches the disk, never blocks)
+  sent()       paho accepted it for sending under message id `mid`
+  acked(mid)   PUBACK arrived; the record is done
+  unsent()     records to (re)publish, in order, after a reconnect
+
+run() is a task on the launcher's loop that appends new records to
+<path> in batches (one write + fsync in the executor every flush_s) and
+keeps <path>.ack, the id up to which everything is acknowledged. A
+restarted launcher replays whatever is still pending. The file is
+rewritten with only the pending records once it grows past twice
+max_bytes (or emptied once everything in it is acknowledged); the pending set itself is capped at max_bytes and drops its
+oldest records (counted) beyond that.
+
+File format: one JSON object per line,
+  {"id": n, "t": <epoch s>, "topic": "...", "qos": 1, "retain": false, "body": "..."}
+
+metrics() reports depth, bytes, oldest age and flush throughput; the
+launcher publishes it on device/{id}/spool.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+
+MAX_BYTES = 4 << 20
+FLUSH_S = 0.2
+COMPACT_EMPTY = 64 << 10         # truncate an all-acknowledged file past this size
+
+
+class PublishSpool:
+    def __init__(self, path, max_bytes=MAX_BYTES, flush_s=FLUSH_S, clock=time.monotonic):
+        self.path = path
+        self.ack_path = path + ".ack"
+        self.max_bytes = max_bytes
+        self.flush_s = flush_s
+        self.clock = clock
+        self.pending = OrderedDict()     # id -> (t_wall, topic, body, qos, retain, line)
+        self.pending_bytes = 0
+        self.inflight = {}               # paho mid -> id
+        self.next_id = 1
+        self.dropped = 0
+        self.replayed = 0
+        self.flushed = 0                 # records written to disk
+        self.flushed_bytes = 0
+        self._buf = []                   # lines not written yet
+        self._writing = None
+        self._ack_written = 0
+        self._file_bytes = 0
+        self._rate = (clock(), 0, 0)     # (t, flushed, flushed_bytes) at the last metrics()
+        self.last_flush_ms = 0.0
+
+    # ------------------------------
+    # Startup
+    # ------------------------------
+    def load(self):
+        """Pending records left by a previous run (call once, before the loop starts publishing)."""
+        acked = 0
+        try:
+            with open(self.ack_path) as f:
+                acked = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            pass
+        last = acked
+        try:
+            with open(self.path, "rb") as f:
+                for raw in f:
+                    self._file_bytes += len(raw)
+                    try:
+                        rec = json.loads(raw)
+                    except ValueError:
+                        continue                 # torn write at the end
+                    last = max(last, rec["id"])
+                    if rec["id"] > acked:
+                        self._add(rec["id"], rec["t"], rec["topic"], rec["body"], rec["qos"], rec["retain"], raw.decode().rstrip("\n"))
+        except FileNotFoundError:
+            pass
+        self.next_id = last + 1
+        self._ack_written = acked
+        if self.pending:
+            print(f"[spool] {len(self.pending)} unsent messages from a previous run")
+        return len(self.pending)
+
+    # ------------------------------
+    # Loop side (no I/O)
+    # ------------------------------
+    def _add(self, rid, t, topic, body, qos, retain, line):
+        size = len(line) + 1
+        while self.pending and self.pending_bytes + size > self.max_bytes:
+            _, old = self.pending.popitem(last=False)
+            self.pending_bytes -= len(old[5]) + 1
+            self.dropped += 1
+        self.pending[rid] = (t, topic, body, qos, retain, line)
+        self.pending_bytes += size
+
+    def put(self, topic, body, qos=1, retain=False):
+        rid, self.next_id = self.next_id, self.next_id + 1
+        t = time.time()
+        line = json.dumps({"id": rid, "t": round(t, 3), "topic": topic, "qos": qos, "retain": retain, "body": body},
+                          separators=(",", ":"))
+        self._add(rid, t, topic, body, qos, retain, line)
+        self._buf.append(line)
+        return rid
+
+    def get(self, rid):
+        rec = self.pending.get(rid)
+        return None if rec is None else rec[1:5]      # topic, body, qos, retain
+
+    def sent(self, rid, mid):
+        self.inflight[mid] = rid
+
+    def acked(self, mid):
+        rid = self.inflight.pop(mid, None)
+        rec = self.pending.pop(rid, None) if rid is not None else None
+        if rec is not None:
+            self.pending_bytes -= len(rec[5]) + 1
+
+    def unsent(self):
+        """Pending ids not currently waiting for a PUBACK, oldest first."""
+        waiting = set(self.inflight.values())
+        out = [rid for rid in self.pending if rid not in waiting]
+        self.replayed += len(out)
+        return out
+
+    @property
+    def acked_upto(self):
+        return next(iter(self.pending)) - 1 if self.pending else self.next_id - 1
+
+    # ------------------------------
+    # Disk (executor)
+    # ------------------------------
+    def _write(self, lines, acked, rewrite):
+        t0 = time.monotonic()
+        if rewrite is not None:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                f.write("".join(l + "\n" for l in rewrite))
+                f.flush(); os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        elif lines:
+            with open(self.path, "a") as f:
+                f.write("".join(l + "\n" for l in lines))
+                f.flush(); os.fsync(f.fileno())
+        tmp = self.ack_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(acked))
+        os.replace(tmp, self.ack_path)
+        return (time.monotonic() - t0) * 1000.0
+
+    async def flush(self, loop):
+        acked = self.acked_upto
+        if not self._buf and acked == self._ack_written:
+            return
+        lines, self._buf = self._buf, []
+        rewrite = None
+        if self._file_bytes > 2 * self.max_bytes or (not self.pending and self._file_bytes > COMPACT_EMPTY):
+            rewrite = [rec[5] for rec in self.pending.values()]     # already includes `lines`
+        self._writing = loop.run_in_executor(None, self._write, lines, acked, rewrite)
+        try:
+            # shielded: a cancelled caller must not leave a write running under close()
+            self.last_flush_ms = await asyncio.shield(self._writing)
+        except OSError as e:
+            print("[spool] write failed", e)
+            self._buf = lines + self._buf
+            return
+        n = sum(len(l) + 1 for l in lines)
+        self.flushed += len(lines)
+        self.flushed_bytes += n
+        self._file_bytes = sum(len(l) + 1 for l in rewrite) if rewrite is not None else self._file_bytes + n
+        self._ack_written = acked
+
+    async def run(self, loop):
+        while True:
+            await asyncio.sleep(self.flush_s)
+            await self.flush(loop)
+
+    async def close(self, loop):
+        """Final flush; call after cancelling run()."""
+        w = self._writing
+        if w is not None and not w.done():
+            try: await w
+            except Exception: pass
+        await self.flush(loop)
+
+    def metrics(self):
+        now = self.clock()
+        t, n, b = self._rate
+        dt = max(1e-3, now - t)
+        self._rate = (now, self.flushed, self.flushed_bytes)
+        oldest = next(iter(self.pending.values()))[0] if self.pending else None
+        return {
+            "depth": len(self.pending),
+            "bytes": self.pending_bytes,
+            "oldestAgeS": round(time.time() - oldest, 1) if oldest is not None else 0,
+            "inflight": len(self.inflight),
+            "dropped": self.dropped,
+            "replayed": self.replayed,
+            "flushedPerS": round((self.flushed - n) / dt, 2),
+            "flushedBytesPerS": round((self.flushed_bytes - b) / dt, 1),
+            "lastFlushMs": round(self.last_flush_ms, 2),
+        }
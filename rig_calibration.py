@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+rig_calibration.py
+
+Per-rig latency offsets for Rhythm, measured by calibrate.py.
+
+Every cabinet hears and sees the game late by its own amount: the audio
+output buffer (ALSA / USB DAC) on one side, the strip transfer and LED
+latency on the other, plus the pad input path on both. The offsets are
+stored per device id in one JSON file (FITFIGHTER_CALIBRATION, default
+~/.config/fitfighter/calibration.json):
+
+  {"pi01": {"audio_ms": 38.5, "visual_ms": 21.0, "audio_taps": 15,
+            "visual_taps": 16, "ts": 1760000000}}
+
+  audio_ms   player taps land this long after the song clock reaches a
+             click (audio output + input latency)
+  visual_ms  taps land this long after show() put a flash on the strip
+             (LED + input latency)
+
+gameMode3 judges against song time minus audio_ms and draws the bars at
+song time minus audio_ms plus visual_ms, so they fill up as the beat is
+heard. An uncalibrated rig gets 0 / 0.
+"""
+
+import bisect
+import json
+import os
+import time
+
+CALIBRATION_FILE = os.getenv("FITFIGHTER_CALIBRATION", os.path.expanduser("~/.config/fitfighter/calibration.json"))
+MIN_TAPS = 8
+MIN_SPREAD_S = 0.015       # outlier band is max(3 x MAD, this)
+
+
+def load_all(path=None):
+    try:
+        with open(path or CALIBRATION_FILE) as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def load(device_id, path=None):
+    """{"audio_ms", "visual_ms", ...} for device_id (zeros if it was never calibrated)."""
+    cal = {"audio_ms": 0.0, "visual_ms": 0.0}
+    cal.update(load_all(path).get(device_id) or {})
+    return cal
+
+
+def save(device_id, path=None, **values):
+    """Merge values into device_id's entry (atomic rewrite of the file)."""
+    path = path or CALIBRATION_FILE
+    data = load_all(path)
+    entry = dict(data.get(device_id) or {}, **values)
+    entry["ts"] = int(time.time())
+    data[device_id] = entry
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+    return entry
+
+
+def estimate(taps, targets, window_s):
+    """Typical tap - target lag, or None with fewer than MIN_TAPS usable taps.
+
+    Each tap is matched to its nearest target; taps more than window_s away
+    are ignored, then the median lag is refined once after dropping taps
+    outside max(3 x MAD, MIN_SPREAD_S) of it.
+    """
+    targets = sorted(targets)
+    if not targets:
+        return None
+    lags = []
+    for tap in taps:
+        k = bisect.bisect_left(targets, tap)
+        near = [targets[j] for j in (k - 1, k) if 0 <= j < len(targets)]
+        target = min(near, key=lambda t: abs(tap - t))
+        if abs(tap - target) <= window_s:
+            lags.append(tap - target)
+    if len(lags) < MIN_TAPS:
+        return None
+    med = _median(lags)
+    mad = _median([abs(x - med) for x in lags])
+    kept = [x for x in lags if abs(x - med) <= max(3.0 * mad, MIN_SPREAD_S)]
+    if len(kept) < MIN_TAPS:
+        return None
+    med = _median(kept)
+    return {"offset_ms": round(med * 1000.0, 1), "spread_ms": round(_median([abs(x - med) for x in kept]) * 1000.0, 1),
+            "taps": len(kept), "rejected": len(taps) - len(kept)}
+
+
+def _median(xs):
+    xs = sorted(xs)
+    n = len(xs)
+    return xs[n // 2] if n % 2 else 0.5 * (xs[n // 2 - 1] + xs[n // 2])
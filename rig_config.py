@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+rig_config.py
+
+Rig definitions for a launcher that drives one or more cabinets.
+
+Without RIGS_FILE the launcher drives a single rig, DEVICE_ID with the
+default wiring. RIGS_FILE names a JSON file listing one definition per
+cabinet:
+
+  {"rigs": [
+    {"deviceId": "pi01", "baseDir": "/home/fitfighter",
+     "padGpio": {"1": 6, "2": 17, "3": 27, "4": 22, "5": 24, "6": 25, "7": 26, "8": 16},
+     "ledPin": 21, "ledChannel": 0, "dma": 10},
+    {"deviceId": "pi02", "baseDir": "/home/fitfighter",
+     "padGpio": {"1": 2, "2": 3, "3": 4, "4": 5, "5": 7, "6": 8, "7": 9, "8": 10},
+     "ledPin": 13, "ledChannel": 1, "dma": 11, "alsaDev": "hw:1,0"}
+  ]}
+
+Missing keys take the single-cabinet defaults (game_rig.py, hw_backend.py).
+Optional per rig: numLeds, brightness, hostMode (overrides GAME_HOST_MODE),
+alsaDev (Rhythm audio output when the start command names none) and
+sessionPolicy / sessionQueueMax (override SESSION_POLICY / SESSION_QUEUE_MAX).
+
+validate() refuses definitions that would make two rigs share hardware: a
+device id, a pad or LED GPIO line, a PWM channel or a DMA channel.
+"""
+
+import json
+
+from game_rig import LED_PIN, CHANNEL, DMA, NUM_LEDS, BRIGHTNESS
+from hw_backend import DEFAULT_PAD_GPIO
+
+
+def normalize(spec, base_dir):
+    """A rig definition with every hardware key filled in."""
+    if not spec.get("deviceId"):
+        raise ValueError("rig definition without deviceId")
+    rig = dict(spec)
+    rig["deviceId"] = str(spec["deviceId"])
+    rig["padGpio"] = {int(p): int(g) for p, g in (spec.get("padGpio") or DEFAULT_PAD_GPIO).items()}
+    for key, default in (("ledPin", LED_PIN), ("ledChannel", CHANNEL), ("dma", DMA),
+                         ("numLeds", NUM_LEDS), ("brightness", BRIGHTNESS)):
+        rig[key] = int(spec.get(key, default))
+    rig["baseDir"] = spec.get("baseDir") or base_dir
+    return rig
+
+
+def validate(rigs):
+    seen = {}
+    def claim(kind, value, device_id):
+        other = seen.setdefault((kind, value), device_id)
+        if other != device_id:
+            raise ValueError(f"rigs {other} and {device_id} share {kind} {value}")
+
+    for rig in rigs:
+        dev = rig["deviceId"]
+        if ("device", dev) in seen:
+            raise ValueError(f"duplicate rig deviceId {dev}")
+        claim("device", dev, dev)
+        if sorted(rig["padGpio"]) != list(range(1, 9)):
+            raise ValueError(f"rig {dev}: padGpio needs pads 1..8")
+        for gpio in rig["padGpio"].values():
+            claim("GPIO", gpio, dev)
+        claim("GPIO", rig["ledPin"], dev)
+        claim("PWM channel", rig["ledChannel"], dev)
+        claim("DMA channel", rig["dma"], dev)
+    return rigs
+
+
+def load_rigs(path=None, device_id="pi01", base_dir="."):
+    """Validated rig definitions from RIGS_FILE `path`, or the single default rig."""
+    if not path:
+        specs = [{"deviceId": device_id}]
+    else:
+        with open(path) as f:
+            data = json.load(f)
+        specs = data.get("rigs") if isinstance(data, dict) else data
+        if not specs:
+            raise ValueError(f"{path}: no rigs defined")
+    return validate([normalize(s, base_dir) for s in specs])
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+session_log.py
+
+Compact binary record of one game session, for replay (session_replay.py).
+
+While a game is attached to its Rig (begin_session .. end_session) the rig
+keeps everything that fed into the session's decisions:
+
+  begin     device id, pads, start time
+  press     every pad event with its monotonic capture timestamp
+  wake      every time the game resumed from its event queue, a sleep or
+            a strip transfer, and whether it was handed an input (the oldest
+            queued press or stop): the times the game actually saw
+  event     every telemetry event (start carries game, params and the RNG
+            seed; hit / miss / score / combo are the scoring decisions;
+            final the stats)
+  go        a prepared start's release (start_gate.py)
+  stop      the launcher's stop
+  player    what the audio player reported (Rhythm: get_time / get_state /
+            get_length), with the call's number, only when it changed
+  info      rig facts a game read (the Rhythm latency calibration)
+
+The records are buffered in memory and written once, when the session
+detaches, to FITFIGHTER_SESSION_LOG_DIR (default
+~/.local/share/fitfighter/sessions; empty disables logging) as
+<time>-<device>-<game>-<pid>.ffsl. The newest SESSION_LOG_KEEP files are
+kept.
+
+File layout: b"FFSL", u16 version, then records of u8 kind + f64 monotonic
+time + a kind-specific payload (u8 pad or flag, i32 call + i32 value, or
+u16 length + compact JSON). Wake-ups dominate: a minute of play is
+typically 50-150 kB.
+"""
+
+import json
+import os
+import struct
+import time
+from queue import Queue, Empty
+
+ENV_DIR = "FITFIGHTER_SESSION_LOG_DIR"
+LOG_DIR = os.getenv(ENV_DIR, os.path.expanduser("~/.local/share/fitfighter/sessions"))
+KEEP = int(os.getenv("SESSION_LOG_KEEP", "500"))
+MAGIC = b"FFSL"
+VERSION = 1
+SUFFIX = ".ffsl"
+
+# record kinds
+BEGIN, PRESS, EVENT, GO, STOP, PLAYER_TIME, PLAYER_STATE, PLAYER_LENGTH, INFO, WAKE = range(1, 11)
+_HEAD = struct.Struct("<Bd")
+_PAD = struct.Struct("<B")
+_READING = struct.Struct("<ii")
+_LEN = struct.Struct("<H")
+# what a wake-up was
+WAKE_IDLE, WAKE_INPUT, WAKE_SHOW = range(3)
+_JSON_KINDS = (BEGIN, EVENT, GO, INFO)
+_INT_KINDS = (PLAYER_TIME, PLAYER_STATE, PLAYER_LENGTH)
+
+
+def _json(obj):
+    return json.dumps(obj, separators=(",", ":"), default=str).encode()
+
+
+class SessionRecorder:
+    def __init__(self, path_dir, device_id, pads, clock=time.monotonic):
+        self.dir = path_dir
+        self.device_id = device_id
+        self.clock = clock
+        self.game = None
+        self.path = None
+        self.closed = False
+        self.buf = bytearray(MAGIC + struct.pack("<H", VERSION))
+        self._json(BEGIN, clock(), {"device": device_id, "pads": list(pads), "wall": time.time()})
+
+    @classmethod
+    def from_env(cls, device_id, pads, clock=time.monotonic):
+        """Recorder for a session on this rig, or None if session logging is off."""
+        return cls(LOG_DIR, device_id, pads, clock) if LOG_DIR else None
+
+    # ------------------------------
+    # Records
+    # ------------------------------
+    def _json(self, kind, t, obj):
+        data = _json(obj)
+        self.buf += _HEAD.pack(kind, t) + _LEN.pack(len(data)) + data
+
+    def press(self, pad, ts):
+        self.buf += _HEAD.pack(PRESS, ts) + _PAD.pack(pad)
+
+    def wake(self, what):
+        self.buf += _HEAD.pack(WAKE, self.clock()) + _PAD.pack(what)
+
+    def event(self, ev):
+        if ev.get("k") == "start" and self.game is None: self.game = ev.get("game")
+        self._json(EVENT, self.clock(), ev)
+
+    def go(self, go_ms):
+        self._json(GO, self.clock(), {"go_ms": go_ms})
+
+    def stop(self):
+        self.buf += _HEAD.pack(STOP, self.clock())
+
+    def info(self, key, value):
+        self._json(INFO, self.clock(), {key: value})
+
+    def player(self, kind, call, value):
+        self.buf += _HEAD.pack(kind, self.clock()) + _READING.pack(call, value)
+
+    # ------------------------------
+    # Output
+    # ------------------------------
+    def close(self):
+        """Write the log (once); returns its path, or None if it could not be written."""
+        if self.closed: return self.path
+        self.closed = True
+        buf = bytes(self.buf)           # a late press from the pad thread just lands in the old buffer
+        name = "-".join((time.strftime("%Y%m%d-%H%M%S"), self.device_id, self.game or "session", str(os.getpid())))
+        path = os.path.join(self.dir, name + SUFFIX)
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(buf)
+            os.replace(tmp, path)
+            prune(self.dir)
+        except OSError as e:
+            print(f"[session_log] could not write {path}: {e}")
+            return None
+        self.path = path
+        return path
+
+
+def prune(path_dir, keep=KEEP):
+    """Drop all but the newest `keep` logs in path_dir."""
+    logs = sorted(n for n in os.listdir(path_dir) if n.endswith(SUFFIX))
+    for name in logs[:max(0, len(logs) - keep)]:
+        try: os.unlink(os.path.join(path_dir, name))
+        except OSError: pass
+
+
+class RecordedQueue(Queue):
+    """A session's pad event queue; with a recorder attached, every get() is logged as a wake-up."""
+
+    recorder = None
+
+    def get(self, block=True, timeout=None):
+        try:
+            item = super().get(block, timeout)
+        except Empty:
+            rec = self.recorder
+            if rec is not None: rec.wake(WAKE_IDLE)
+            raise
+        rec = self.recorder
+        if rec is not None: rec.wake(WAKE_INPUT)
+        return item
+
+
+class RecordedPlayer:
+    """Audio player proxy that logs the readings a game takes (get_time / get_state / get_length)."""
+
+    def __init__(self, player, recorder):
+        self._player = player
+        self._rec = recorder
+        self._last = {}
+        self._calls = {}
+
+    def _read(self, kind, value):
+        v = -1 if value is None else int(getattr(value, "value", value))     # python-vlc State is a ctypes enum
+        n = self._calls.get(kind, 0)
+        self._calls[kind] = n + 1
+        if self._last.get(kind) != v:
+            self._last[kind] = v
+            self._rec.player(kind, n, v)
+        return value
+
+    def get_time(self): return self._read(PLAYER_TIME, self._player.get_time())
+    def get_state(self): return self._read(PLAYER_STATE, self._player.get_state())
+    def get_length(self): return self._read(PLAYER_LENGTH, self._player.get_length())
+
+    def __getattr__(self, name):
+        return getattr(self._player, name)
+
+
+# ------------------------------
+# Reading
+# ------------------------------
+class SessionLog:
+    """A parsed log: begin, presses [(t, pad)], events, go, stops, player readings, info."""
+
+    def __init__(self, path):
+        self.path = path
+        self.begin = None
+        self.t0 = None
+        self.presses = []
+        self.inputs = []           # (t, "press" | "stop", pad) in the order they were queued
+        self.wakes = []            # (t, WAKE_*)
+        self.events = []           # (t, ev)
+        self.go = None             # (t, go_ms)
+        self.stops = []
+        self.player = {PLAYER_TIME: [], PLAYER_STATE: [], PLAYER_LENGTH: []}    # kind -> [(call, value)]
+        self.info = {}
+        self.t_end = None
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != MAGIC:
+            raise ValueError(f"{path}: not a session log")
+        version, = struct.unpack_from("<H", data, 4)
+        if version != VERSION:
+            raise ValueError(f"{path}: session log version {version}, expected {VERSION}")
+        self._parse(data, 6)
+
+    def _parse(self, data, off):
+        n = len(data)
+        while off + _HEAD.size <= n:
+            kind, t = _HEAD.unpack_from(data, off); off += _HEAD.size
+            if kind in _JSON_KINDS:
+                size, = _LEN.unpack_from(data, off); off += _LEN.size
+                obj = json.loads(data[off:off + size]); off += size
+            elif kind in (PRESS, WAKE):
+                obj, = _PAD.unpack_from(data, off); off += _PAD.size
+            elif kind in _INT_KINDS:
+                obj = _READING.unpack_from(data, off); off += _READING.size
+            elif kind == STOP:
+                obj = None
+            else:
+                raise ValueError(f"{self.path}: unknown record kind {kind} at byte {off - _HEAD.size}")
+            self.t_end = t if self.t_end is None else max(self.t_end, t)
+            if kind == BEGIN: self.begin, self.t0 = obj, t
+            elif kind == PRESS: self.presses.append((t, obj)); self.inputs.append((t, "press", obj))
+            elif kind == WAKE: self.wakes.append((t, obj))
+            elif kind == EVENT: self.events.append((t, obj))
+            elif kind == GO: self.go = (t, obj.get("go_ms"))
+            elif kind == STOP: self.stops.append(t); self.inputs.append((t, "stop", 0))
+            elif kind == INFO: self.info.update(obj)
+            else: self.player[kind].append(obj)
+        if self.begin is None:
+            raise ValueError(f"{self.path}: no begin record")
+
+    def start(self):
+        """The session's start event (game, params, seed), or None."""
+        for _, ev in self.events:
+            if ev.get("k") == "start": return ev
+        return None
+
+    def final(self):
+        for _, ev in reversed(self.events):
+            if ev.get("k") == "final": return ev
+        return None
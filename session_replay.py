@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+session_replay.py
+
+Re-run recorded sessions (session_log.py) and report where they diverge.
+
+USAGE
+  python3 session_replay.py LOG|DIR [LOG|DIR ...] [--json] [--tolerance-ms 5]
+                            [--max-report 5] [--verbose]
+
+Each log is replayed in this process on the virtual backend (hw_backend.py)
+through the game's own run(params, rig), with a ReplayRig standing in for
+the cabinet:
+
+  rig.clock     a VirtualClock starting at the recording's begin time; it
+                only moves when the game waits (GameRuntime.wait, rig.sleep),
+                so a session replays as fast as the CPU allows
+  wake-ups      each wait, sleep and strip transfer resumes at the recorded
+                wake-up it corresponds to, so the game sees the times it saw
+                on the rig, and is handed the recorded press or stop when it
+                was handed one
+  go / stop     at their recorded times
+  audio         the player readings the game took (Rhythm), by call; the
+                chart and audio still have to exist at their recorded paths
+  RNG           params (with the seed) from the start event
+
+A wait matches the next recorded wake-up if that came no more than
+MAX_LATE_S after the wait's own deadline; recorded wake-ups the replayed
+code no longer asks for are skipped, and deadlines it has that the
+recording does not are served on virtual time. That keeps a replay of
+changed code in step with the recording as long as the game decides the
+same things.
+
+The replayed telemetry is compared event by event with the recorded one:
+kinds, pads, judgements, scores and every other field must match, except
+the timestamp "t"; floats (reaction times, judge deltas, durations) may
+differ by --tolerance-ms or 0.1%. A replay that needs more than OVERRUN_S
+past the end of the recording is stopped and reported. A recording without
+a final event (the game process was killed) is replayed up to its last
+record and compared up to there.
+
+Exit status: 0 every log replayed identically, 1 some diverged, 2 some
+could not be replayed.
+"""
+
+import argparse
+import bisect
+import contextlib
+import importlib
+import io
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from queue import Empty
+
+# replays never touch the hardware, the launcher's pipes or a press script
+os.environ["FITFIGHTER_BACKEND"] = "virtual"
+os.environ["FITFIGHTER_VIRTUAL_FRAMES"] = "1"
+for _name in ("FITFIGHTER_PRESS_SCRIPT", "FITFIGHTER_BUTTON_SOCKET", "FITFIGHTER_VIRTUAL_SHOW_MS",
+              "FITFIGHTER_PAD_SOCKET", "FITFIGHTER_TELEMETRY_FD", "FITFIGHTER_GO_FD", "FITFIGHTER_RIG"):
+    os.environ.pop(_name, None)
+
+from hw_backend import DEFAULT_PAD_GPIO, vlc
+from game_rig import Rig
+from game_runtime import GameStopped
+from game_host import GAME_PLUGINS, _env_plugins
+from telemetry import Telemetry
+import rig_calibration
+import session_log
+from session_log import SessionLog, PLAYER_TIME, PLAYER_STATE, PLAYER_LENGTH, WAKE_INPUT, WAKE_SHOW
+
+TOLERANCE_S = 0.005
+REL_TOL = 1e-3
+OVERRUN_S = 30.0
+MAX_REPORT = 5
+MAX_LATE_S = 0.050         # a recorded wake-up this far past a deadline is that deadline's
+WAKE_EPS_S = 0.002         # ... and this far before it still counts (clock reads within an iteration)
+
+
+# ------------------------------
+# Virtual time and inputs
+# ------------------------------
+class VirtualClock:
+    def __init__(self, t0):
+        self.t = t0
+
+    def __call__(self):
+        return self.t
+
+    def advance_to(self, t):
+        if t > self.t: self.t = t
+
+    def sleep(self, dt):
+        self.advance_to(self.t + max(0.0, dt))
+
+
+class ReplayQueue:
+    """The session's pad event queue on virtual time, following the recorded wake-ups."""
+
+    def __init__(self, rig):
+        log = rig.log
+        self.rig = rig
+        self.clock = rig.clock
+        self.items = deque()                        # put() by the rig (stop wake-ups)
+        self.inputs = deque(log.inputs)
+        self.wakes = log.wakes
+        self.k = 0
+        self.killed = log.final() is None           # the game process was killed: replay up to where it ends
+        self.t_last = log.t_end if self.killed else log.t_end + OVERRUN_S
+        self.stops = deque(sorted(log.stops) + [self.t_last])
+
+    def put(self, item):
+        self.items.append(item)
+
+    def _stops_due(self):
+        now = self.clock()
+        while self.stops and self.stops[0] <= now:
+            if self.stops.popleft() == self.t_last:
+                if self.killed: self.rig.cut = len(self.rig.events)
+                else: self.rig.overran = True
+            self.rig.request_stop()
+
+    def resume(self, deadline, deliver=True):
+        """Advance to the wake-up for a wait until `deadline`; True if the recording handed over an input there."""
+        clock, wakes = self.clock, self.wakes
+        while self.k < len(wakes):
+            t, what = wakes[self.k]
+            if what == WAKE_SHOW:
+                self.k += 1                     # a frame this code did not show
+                continue
+            if what == WAKE_INPUT:
+                if not deliver or t > deadline + MAX_LATE_S: break
+                self.k += 1
+                clock.advance_to(t)
+                return True
+            if t < deadline - WAKE_EPS_S:
+                self.k += 1                     # a wake-up this code does not have
+                continue
+            if t <= deadline + MAX_LATE_S:
+                self.k += 1
+                clock.advance_to(t)
+                return False
+            break
+        if math.isinf(deadline): deadline = max(clock(), self.t_last)
+        clock.advance_to(deadline)
+        return False
+
+    def shown(self):
+        """A frame went out: take the time its transfer took on the rig."""
+        if self.k < len(self.wakes):
+            t, what = self.wakes[self.k]
+            if what == WAKE_SHOW and t <= self.clock() + MAX_LATE_S:
+                self.k += 1
+                self.clock.advance_to(t)
+
+    def get(self, block=True, timeout=None):
+        clock = self.clock
+        if self.items:
+            return self.items.popleft()
+        deadline = clock() if not block else (math.inf if timeout is None else clock() + timeout)
+        delivered = self.resume(deadline)
+        self._stops_due()
+        if delivered and self.inputs:
+            t, kind, pad = self.inputs.popleft()
+            if kind == "stop": self.rig.request_stop()
+            return (kind, pad, t)
+        if self.items:
+            return self.items.popleft()
+        raise Empty
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+
+class ReplayGate:
+    """A prepared start's gate: go comes at its recorded time (or the recorded stop while armed)."""
+
+    def __init__(self, rig):
+        self.rig = rig
+
+    def wait(self, stop=None):
+        log, clock = self.rig.log, self.rig.clock
+        if log.go is not None:
+            clock.advance_to(log.go[0])
+            return log.go[1]
+        clock.advance_to(min(log.stops) if log.stops else log.t_end)
+        self.rig.request_stop()
+        raise GameStopped()
+
+
+class ReplayPlayer:
+    """Audio player answering each call with the reading the recorded session got on that call."""
+
+    DEFAULTS = {PLAYER_TIME: -1, PLAYER_STATE: vlc.State.NothingSpecial, PLAYER_LENGTH: 0}
+
+    def __init__(self, log):
+        self.series = {kind: ([n for n, _ in rows], [v for _, v in rows]) for kind, rows in log.player.items()}
+        self.calls = dict.fromkeys(self.series, 0)
+
+    def _read(self, kind):
+        n = self.calls[kind]
+        self.calls[kind] = n + 1
+        calls, values = self.series[kind]
+        if not values: return self.DEFAULTS[kind]
+        return values[max(0, bisect.bisect_right(calls, n) - 1)]
+
+    def get_time(self): return self._read(PLAYER_TIME)
+    def get_state(self): return self._read(PLAYER_STATE)
+    def get_length(self): return self._read(PLAYER_LENGTH)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: 0        # set_media, play, set_pause, audio_set_volume, stop, ...
+
+
+class ReplayRig(Rig):
+    def __init__(self, log):
+        pads = [int(p) for p in log.begin.get("pads") or DEFAULT_PAD_GPIO]
+        super().__init__(pad_gpio={p: DEFAULT_PAD_GPIO.get(p, 100 + p) for p in pads},
+                         device_id=log.begin.get("device"))
+        self.log = log
+        self.events = []
+        self.overran = False
+        self.cut = None                 # events replayed before a killed recording's end
+        self.replaying = True
+        self.upload = False             # the session was saved when it was played
+        self.clock = VirtualClock(log.t0)
+        self.telemetry = Telemetry(self.events.append, clock=self.clock)
+        armed = any(ev.get("k") == "armed" for _, ev in log.events)
+        self.gate = ReplayGate(self) if armed else None
+
+    def event_queue(self):
+        return ReplayQueue(self)
+
+    def attach(self, event_q, record=True):
+        super().attach(event_q, record=False)
+
+    def sleep(self, dt):
+        q = self._event_q
+        if q is None: self.clock.sleep(dt)
+        else: q.resume(self.clock() + max(0.0, dt), deliver=False)
+
+    def _shown(self):
+        q = self._event_q
+        if q is not None: q.shown()
+
+    def media_player(self, inst):
+        return ReplayPlayer(self.log)
+
+    def calibration(self):
+        cal = self.log.info.get("calibration")
+        return dict(cal) if cal is not None else rig_calibration.load(self.device_id)
+
+
+# ------------------------------
+# Comparison
+# ------------------------------
+def _diff(a, b, tol, path=""):
+    """Field paths where recorded a and replayed b differ."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        out = []
+        for k in sorted(set(a) | set(b)):
+            if not path and k == "t": continue
+            out += _diff(a.get(k), b.get(k), tol, f"{path}.{k}" if path else k)
+        return out
+    if isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        out = []
+        for i, (x, y) in enumerate(zip(a, b)):
+            out += _diff(x, y, tol, f"{path}[{i}]")
+        return out
+    if isinstance(a, float) or isinstance(b, float):
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool) and not isinstance(b, bool) \
+                and math.isclose(a, b, rel_tol=REL_TOL, abs_tol=tol):
+            return []
+        return [path]
+    return [] if a == b else [path]
+
+
+def compare(recorded, replayed, t0, tol=TOLERANCE_S, max_report=MAX_REPORT):
+    """Event-by-event comparison; returns (number of diverging events, the first max_report of them)."""
+    n = max(len(recorded), len(replayed))
+    count, shown = 0, []
+    for i in range(n):
+        a = recorded[i][1] if i < len(recorded) else None
+        b = replayed[i] if i < len(replayed) else None
+        fields = ["missing" if b is None else "extra"] if a is None or b is None else _diff(a, b, tol)
+        if not fields: continue
+        count += 1
+        if len(shown) < max_report:
+            t = recorded[i][0] if a is not None else None
+            shown.append({"index": i, "t": round(t - t0, 4) if t is not None else None,
+                          "fields": fields, "recorded": a, "replayed": b})
+    return count, shown
+
+
+# ------------------------------
+# Replay
+# ------------------------------
+def replay(path, tol=TOLERANCE_S, max_report=MAX_REPORT, verbose=False):
+    """Replay one log; returns its report dict."""
+    log = SessionLog(path)
+    start = log.start()
+    if start is None:
+        raise ValueError(f"{path}: no start event")
+    game = start.get("game")
+    plugins = dict(GAME_PLUGINS); plugins.update(_env_plugins())
+    if game not in plugins:
+        raise ValueError(f"{path}: unknown game {game!r}")
+    mod = importlib.import_module(plugins[game])
+    params = dict(start.get("params") or {})
+
+    rig = ReplayRig(log)
+    t_wall = time.perf_counter()
+    out = sys.stdout if verbose else io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            mod.run(params, rig)
+    except GameStopped:
+        pass
+    finally:
+        rig.close()
+    wall_s = time.perf_counter() - t_wall
+
+    replayed = rig.events if rig.cut is None else rig.events[:rig.cut]
+    count, shown = compare(log.events, replayed, log.t0, tol, max_report)
+    rec_final, rep_final = log.final(), next((ev for ev in reversed(rig.events) if ev.get("k") == "final"), None)
+    session_s = rig.clock() - log.t0
+    return {
+        "log": path, "game": game, "seed": start.get("seed"),
+        "identical": count == 0 and not rig.overran,
+        "overran": rig.overran,
+        "events": len(log.events), "replayed": len(replayed),
+        "score": [(rec_final or {}).get("score"), (rep_final or {}).get("score")],
+        "divergences": count, "first": shown,
+        "session_s": round(session_s, 3), "wall_s": round(wall_s, 3),
+        "speedup": round(session_s / wall_s, 1) if wall_s > 0 else None,
+    }
+
+
+def _logs(paths):
+    for p in paths:
+        if os.path.isdir(p):
+            for name in sorted(os.listdir(p)):
+                if name.endswith(session_log.SUFFIX): yield os.path.join(p, name)
+        else:
+            yield p
+
+
+def _brief(ev):
+    if ev is None: return "-"
+    return " ".join([ev.get("k", "?")] + [f"{k}={v}" for k, v in ev.items() if k not in ("k", "t")])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay recorded FitFighter sessions and report divergences.")
+    ap.add_argument("logs", nargs="+", help="session logs or directories of them")
+    ap.add_argument("--json", action="store_true", help="print the reports as JSON")
+    ap.add_argument("--tolerance-ms", type=float, default=TOLERANCE_S * 1000.0)
+    ap.add_argument("--max-report", type=int, default=MAX_REPORT)
+    ap.add_argument("--verbose", action="store_true", help="show the game's own output")
+    args = ap.parse_args(argv)
+
+    reports, rc = [], 0
+    for path in _logs(args.logs):
+        try:
+            rep = replay(path, args.tolerance_ms / 1000.0, args.max_report, args.verbose)
+        except (OSError, ValueError) as e:
+            reports.append({"log": path, "error": str(e)}); rc = 2
+            if not args.json: print(f"{os.path.basename(path)}  ERROR {e}")
+            continue
+        reports.append(rep)
+        if not rep["identical"]: rc = max(rc, 1)
+        if args.json: continue
+        print(f"{os.path.basename(path)}  {rep['game']}  {rep['session_s']:.1f} s in {rep['wall_s']:.2f} s "
+              f"({rep['speedup']}x)  events {rep['replayed']}/{rep['events']}  "
+              f"score {rep['score'][1]}/{rep['score'][0]}  {'OK' if rep['identical'] else 'DIVERGED'}")
+        if rep["overran"]:
+            print(f"  replay ran more than {OVERRUN_S:g} s past the recording and was stopped")
+        for d in rep["first"]:
+            print(f"  #{d['index']} at +{d['t']} s [{', '.join(d['fields'])}]")
+            print(f"    recorded: {_brief(d['recorded'])}")
+            print(f"    replayed: {_brief(d['replayed'])}")
+        if rep["divergences"] > len(rep["first"]):
+            print(f"  ... {rep['divergences'] - len(rep['first'])} more")
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
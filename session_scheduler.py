@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+session_scheduler.py
+
+Per-rig admission control for start / stop commands.
+
+A rig runs one session at a time. The launcher used to start whatever
+arrived: a second start raced the first for the pads and the strip (or was
+turned away by a busy GameHost). Each rig now has a SessionScheduler, an
+explicit state machine on the launcher's asyncio loop:
+
+  idle      nothing running; the next pending start is launched at once
+  arming    launched, the game is not up yet (spawn / fork / host start)
+  armed     a prepared session has loaded everything and waits for go()
+  running   the game said it is up (started()), or a prepared one got go
+  stopping  a stop was sent; after stop_timeout_s kill() is called
+
+A start submitted with prepare=True (the `prepare` control action) stays
+in arming after started() until the game reports armed(); go() then hands
+it go_fn and it is running. A go that arrives while it is still arming is
+kept and applied as soon as it is armed. An armed session that gets no go
+within arm_timeout_s is stopped, so a kiosk that went away cannot hold the
+rig.
+
+Starts that arrive while the rig is busy are handled by the policy:
+
+  reject    turned away ("busy")
+  queue     appended to a bounded FIFO of max_pending starts, else turned away
+  preempt   the running session is stopped and the new one goes first
+
+A sessionId that is running, pending or among the last RECENT finished ones
+is rejected as a duplicate. Stopping a pending session just removes it.
+
+Every change is reported through on_change(snapshot): state, the current and
+pending session ids, and queue wait times (submit -> launch). The launcher
+publishes it retained on device/{id}/sessions.
+
+The rig side is four callables:
+
+  run(session_id, payload, started)   coroutine for one whole session; calls
+                                      started() once the game is up
+  stop(session_id)                    ask the session to end (SIGTERM / stop flag)
+  kill(session_id)                    after stop_timeout_s (SIGKILL)
+  go(session_id)                      release an armed session (prepare only)
+"""
+
+import asyncio
+import time
+import traceback
+from collections import deque
+
+IDLE, ARMING, ARMED, RUNNING, STOPPING = "idle", "arming", "armed", "running", "stopping"
+POLICIES = ("reject", "queue", "preempt")
+RECENT = 64
+WAIT_WINDOW = 32
+
+
+class SessionScheduler:
+    def __init__(self, run, stop, kill, go=None, policy="queue", max_pending=4, stop_timeout_s=5.0,
+                 arm_timeout_s=60.0, on_change=None, clock=time.monotonic):
+        if policy not in POLICIES:
+            raise ValueError(f"session policy '{policy}' (expected {'|'.join(POLICIES)})")
+        self.run = run
+        self.stop_fn = stop
+        self.kill_fn = kill
+        self.go_fn = go
+        self.policy = policy
+        self.max_pending = max_pending
+        self.stop_timeout_s = stop_timeout_s
+        self.arm_timeout_s = arm_timeout_s
+        self.on_change = on_change
+        self.clock = clock
+        self.state = IDLE
+        self.current = None              # session id
+        self.prepared = False            # current session came from prepare
+        self.go_requested = False        # ... and go arrived before it was armed
+        self.armed_at = None
+        self.pending = deque()           # (session_id, payload, submitted_at, prepare)
+        self.recent = deque(maxlen=RECENT)
+        self.waits_ms = deque(maxlen=WAIT_WINDOW)
+        self.rejected = 0
+        self.preempted = 0
+        self.stop_timeouts = 0
+        self.arm_timeouts = 0
+        self._task = None
+        self._stop_timer = None
+        self._arm_timer = None
+
+    # ------------------------------
+    # Commands
+    # ------------------------------
+    def submit(self, session_id, payload, prepare=False):
+        """Admit a start; returns (accepted, detail) where detail is "starting", "queued" or the reason.
+
+        prepare=True holds the session at its start line (armed) until go().
+        """
+        if session_id == self.current or session_id in self.recent or any(p[0] == session_id for p in self.pending):
+            return self._reject(f"duplicate sessionId {session_id}")
+        busy = self.state != IDLE or self.pending
+        if busy:
+            if self.policy == "reject":
+                return self._reject(f"busy: session {self.current} is {self.state}")
+            if len(self.pending) >= self.max_pending:
+                return self._reject(f"queue full ({self.max_pending} pending)")
+        item = (session_id, payload, self.clock(), prepare)
+        if self.policy == "preempt" and self.state in (ARMING, ARMED, RUNNING):
+            self.pending.appendleft(item)
+            self.preempted += 1
+            self.stop(self.current)
+        elif self.policy == "preempt":
+            self.pending.appendleft(item)
+        else:
+            self.pending.append(item)
+        self._next()
+        self._changed()
+        return True, ("starting" if self.current == session_id else "queued")
+
+    def stop(self, session_id):
+        """Stop a running session or drop a pending one; False if it is neither."""
+        for item in self.pending:
+            if item[0] == session_id:
+                self.pending.remove(item)
+                self.recent.append(session_id)
+                self._changed()
+                return True
+        if session_id != self.current or self.state == IDLE:
+            return False
+        if self.state != STOPPING:
+            self._cancel_arm_timer()
+            self.state = STOPPING
+            self._stop_timer = asyncio.get_running_loop().call_later(self.stop_timeout_s, self._stop_timed_out, session_id)
+            self._changed()
+        self.stop_fn(session_id)
+        return True
+
+    def go(self, session_id):
+        """Start a prepared session; returns (ok, detail) where detail is the state or the reason."""
+        if session_id != self.current or not self.prepared:
+            return False, f"session {session_id} is not prepared"
+        if self.state == ARMED:
+            self._release(session_id)
+            return True, RUNNING
+        if self.state == ARMING:
+            self.go_requested = True
+            return True, "go when armed"
+        return False, f"session {session_id} is {self.state}"
+
+    def armed(self, session_id):
+        """The prepared session is at its start line; False if that is news to nobody."""
+        if session_id != self.current or not self.prepared or self.state != ARMING:
+            return False
+        self.armed_at = self.clock()
+        if self.go_requested:
+            self._release(session_id)
+            return True
+        self.state = ARMED
+        self._arm_timer = asyncio.get_running_loop().call_later(self.arm_timeout_s, self._arm_timed_out, session_id)
+        self._changed()
+        return True
+
+    async def close(self):
+        """Drop pending starts, stop the current session and wait for it."""
+        self.pending.clear()
+        if self.current is not None:
+            self.stop(self.current)
+        task = self._task
+        if task is not None:
+            try: await asyncio.wait_for(asyncio.shield(task), self.stop_timeout_s + 1.0)
+            except Exception: pass
+
+    # ------------------------------
+    # State machine
+    # ------------------------------
+    def _reject(self, reason):
+        self.rejected += 1
+        self._changed()
+        return False, reason
+
+    def _next(self):
+        if self.state != IDLE or not self.pending:
+            return
+        session_id, payload, submitted, prepare = self.pending.popleft()
+        self.waits_ms.append((self.clock() - submitted) * 1000.0)
+        self.state, self.current = ARMING, session_id
+        self.prepared, self.go_requested, self.armed_at = prepare, False, None
+        self._task = asyncio.get_running_loop().create_task(self._run(session_id, payload))
+
+    async def _run(self, session_id, payload):
+        def started():
+            if self.current != session_id: return
+            if self.state == ARMING and not self.prepared:
+                self.state = RUNNING
+                self._changed()
+            elif self.state == STOPPING:
+                self.stop_fn(session_id)       # stop arrived while it was still arming
+        try:
+            await self.run(session_id, payload, started)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self._finished(session_id)
+
+    def _release(self, session_id):
+        self._cancel_arm_timer()
+        self.state = RUNNING
+        self.go_fn(session_id)            # first: the game is waiting on it
+        self._changed()
+
+    def _cancel_arm_timer(self):
+        if self._arm_timer is not None:
+            self._arm_timer.cancel()
+            self._arm_timer = None
+
+    def _arm_timed_out(self, session_id):
+        self._arm_timer = None
+        if self.current == session_id and self.state == ARMED:
+            self.arm_timeouts += 1
+            print(f"[sched] session {session_id} armed for {self.arm_timeout_s}s without go; stopping it")
+            self.stop(session_id)
+
+    def _finished(self, session_id):
+        if self._stop_timer is not None:
+            self._stop_timer.cancel()
+            self._stop_timer = None
+        self._cancel_arm_timer()
+        self.recent.append(session_id)
+        self.state, self.current, self._task = IDLE, None, None
+        self.prepared = self.go_requested = False
+        self._next()
+        self._changed()
+
+    def _stop_timed_out(self, session_id):
+        self._stop_timer = None
+        if self.current == session_id and self.state == STOPPING:
+            self.stop_timeouts += 1
+            print(f"[sched] session {session_id} still running {self.stop_timeout_s}s after stop")
+            self.kill_fn(session_id)
+
+    # ------------------------------
+    # Reporting
+    # ------------------------------
+    def snapshot(self):
+        now = self.clock()
+        waits = sorted(self.waits_ms)
+        return {
+            "state": self.state,
+            "sessionId": self.current,
+            "prepared": self.prepared,
+            "policy": self.policy,
+            "pending": [p[0] for p in self.pending],
+            "depth": len(self.pending),
+            "oldestWaitMs": round((now - self.pending[0][2]) * 1000.0, 1) if self.pending else 0,
+            "waitP50Ms": round(waits[len(waits) // 2], 1) if waits else None,
+            "waitMaxMs": round(waits[-1], 1) if waits else None,
+            "rejected": self.rejected,
+            "preempted": self.preempted,
+            "stopTimeouts": self.stop_timeouts,
+            "armTimeouts": self.arm_timeouts,
+        }
+
+    def _changed(self):
+        if self.on_change is not None:
+            try: self.on_change(self.snapshot())
+            except Exception as e: print("[sched] on_change failed", e)
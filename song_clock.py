@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+song_clock.py
+
+Smoothed song position for Rhythm, disciplined by the audio player's clock.
+
+gameMode3 used to take one reading of player.get_time() after the startup
+settle and run the whole song off perf_counter from there. The audio device
+clock and the CPU clock drift apart (tens of ppm is normal, more on cheap USB
+DACs), so on a four-minute track the notes slide against the music by about
+as much as the Perfect window.
+
+SongClock keeps sampling get_time() (at most every sample_s) and runs a
+second-order PLL on the error between the player and its own estimate.
+VLC's time advances in steps, so a reading that moved since the previous
+poll belongs to some instant between the two polls: the error is taken as
+zero if the estimate passed through the reading in that window, else as the
+distance to the nearer end of it. That keeps stale readings from dragging
+the clock back without biasing it when readings are fresh.
+
+
+  rate   += ki * err * dt          frequency: the player's speed vs perf_counter
+  slew    = clamp(kp * err, +-max_slew)
+  now()   = pos + (perf - t) * (rate + slew)
+
+so phase errors are bled out by running up to max_slew faster or slower
+(the song position never jumps or runs backwards) while the integrator
+learns the drift. A reading more than outlier_s off is ignored, unless
+resync_after of them arrive in a row (seek, xrun, device change): then the
+clock jumps to the player and says so.
+
+summary() / stats() give the drift in ppm, how far the song position moved
+away from a plain perf_counter clock, and the residual error of the readings
+after the first settle_s.
+"""
+
+import math
+import time
+
+KP = 0.5            # 1/s: a 20 ms error runs the clock 1 % fast / slow
+KI = 0.05           # 1/s^2
+MAX_SLEW = 0.01     # at most 10 ms of correction per second
+SAMPLE_S = 0.05
+OUTLIER_S = 0.15
+RESYNC_AFTER = 5
+SETTLE_S = 3.0
+
+
+class SongClock:
+    def __init__(self, get_time_ms, clock=time.perf_counter, kp=KP, ki=KI, max_slew=MAX_SLEW,
+                 sample_s=SAMPLE_S, outlier_s=OUTLIER_S, resync_after=RESYNC_AFTER, settle_s=SETTLE_S):
+        self.get_time_ms = get_time_ms
+        self.clock = clock
+        self.kp, self.ki, self.max_slew = kp, ki, max_slew
+        self.sample_s, self.outlier_s, self.resync_after, self.settle_s = sample_s, outlier_s, resync_after, settle_s
+        self.t = self.pos = None         # estimate: song position `pos` at perf time `t`
+        self.rate = 1.0
+        self.slew = 0.0
+        self.t_lock = self.pos_lock = None
+        self.last_ms = None
+        self.next_sample = 0.0
+        self.t_poll = None
+        self.outliers = 0
+        self.resyncs = 0
+        self.samples = 0
+        self._run = 0                    # consecutive outliers
+        self._err_n = 0
+        self._err_sq = 0.0
+        self._err_max = 0.0
+        self.last_err = 0.0
+
+    def lock(self, t_ms, t=None):
+        """Start at song position t_ms (a get_time() reading taken at perf time t)."""
+        t = self.clock() if t is None else t
+        self.t, self.pos = t, t_ms / 1000.0
+        self.t_lock, self.pos_lock = self.t, self.pos
+        self.last_ms = t_ms
+        self.t_poll = t
+        self.next_sample = t + self.sample_s
+
+    def now(self, t=None):
+        """Song position in seconds."""
+        t = self.clock() if t is None else t
+        return self.pos + (t - self.t) * (self.rate + self.slew)
+
+    def until(self, pos):
+        """perf_counter seconds from now until the song reaches pos."""
+        return (pos - self.now()) / (self.rate + self.slew)
+
+    def update(self, t=None):
+        """Take a player reading if one is due; returns the song position."""
+        t = self.clock() if t is None else t
+        if t < self.next_sample:
+            return self.now(t)
+        self.next_sample = t + self.sample_s
+        t_prev, self.t_poll = self.t_poll, t
+        t_ms = self.get_time_ms()
+        if t_ms is None or t_ms < 0 or t_ms == self.last_ms:
+            return self.now(t)
+        self.last_ms = t_ms
+        est = self.now(t)
+        # the reading became current somewhere in (t_prev, t]
+        lo = t_ms / 1000.0 - est
+        hi = t_ms / 1000.0 - self.now(t_prev) if t_prev is not None else lo
+        err = lo if lo > 0 else (hi if hi < 0 else 0.0)
+        if abs(err) > self.outlier_s:
+            self.outliers += 1
+            self._run += 1
+            if self._run < self.resync_after:
+                return est
+            # the player really moved: follow it
+            print(f"[clock] resync by {err * 1000.0:+.1f} ms")
+            self.resyncs += 1
+            self._run = 0
+            self.t, self.pos, self.slew = t, t_ms / 1000.0, 0.0
+            return self.pos
+        self._run = 0
+        self.samples += 1
+        # rebase so the new rate/slew apply from here on (keeps now() continuous)
+        dt = t - self.t
+        self.t, self.pos = t, est
+        self.rate += self.ki * err * dt
+        self.slew = max(-self.max_slew, min(self.max_slew, self.kp * err))
+        self.last_err = err
+        if t - self.t_lock >= self.settle_s:
+            self._err_n += 1
+            self._err_sq += err * err
+            self._err_max = max(self._err_max, abs(err))
+        return est
+
+    # ------------------------------
+    # Reporting
+    # ------------------------------
+    def stats(self, t=None):
+        t = self.clock() if t is None else t
+        naive = self.pos_lock + (t - self.t_lock) if self.t_lock is not None else 0.0
+        return {
+            "drift_ppm": round((self.rate - 1.0) * 1e6, 1),
+            "offset_ms": round((self.now(t) - naive) * 1000.0, 2) if self.t_lock is not None else 0.0,
+            "residual_rms_ms": round(math.sqrt(self._err_sq / self._err_n) * 1000.0, 2) if self._err_n else None,
+            "residual_max_ms": round(self._err_max * 1000.0, 2) if self._err_n else None,
+            "samples": self.samples,
+            "outliers": self.outliers,
+            "resyncs": self.resyncs,
+        }
+
+    def summary(self):
+        s = self.stats()
+        rms = "n/a" if s["residual_rms_ms"] is None else f"{s['residual_rms_ms']}ms"
+        return (f"drift={s['drift_ppm']:+.1f}ppm offset={s['offset_ms']:+.2f}ms residual rms={rms} "
+                f"max={s['residual_max_ms']}ms samples={s['samples']} outliers={s['outliers']} resyncs={s['resyncs']}")
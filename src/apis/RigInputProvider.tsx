@@ -15,7 +15,7 @@ type Listener = (e: PadEvent) => void;
 
 /**
  * useRigInput: enhanced listener hook
- * - listens to socket events (pad, device:btn, device/<id>/btn)
+ * - listens to socket events (pad, pad:batch, device:btn, device/<id>/btn)
  * - listens to window.postMessage({ type: 'pad:input', payload })
  * - listens to window.mqttClient messages as fallback
  */
@@ -63,10 +63,21 @@ export function useRigInput() {
       listenersRef.current.forEach((fn) => fn(padEvent));
     };
 
+    // compact pad batches (index.js, PAD_PUBLISH=compact on the Pi): one
+    // socket event carries several presses; hand them on one by one, in seq order
+    const dispatchPadBatch = (batch: any) => {
+      const presses: PadEvent[] = Array.isArray(batch?.presses)
+        ? [...batch.presses]
+        : [];
+      presses.sort((a, b) => (a.seq ?? 0) - (b.seq ?? 0));
+      presses.forEach((p) => dispatchPad({ deviceId: batch.deviceId, ...p }));
+    };
+
     // socket listeners — listen to a variety of event names your bridge may emit
     s.on("connect", onConnect);
     s.on("disconnect", onDisconnect);
     s.on("pad", dispatchPad);
+    s.on("pad:batch", dispatchPadBatch);
     s.on("device:btn", dispatchPad);
     s.on("device/pi01/btn", dispatchPad);
     s.onAny &&
@@ -116,6 +127,7 @@ export function useRigInput() {
       s.off("connect", onConnect);
       s.off("disconnect", onDisconnect);
       s.off("pad", dispatchPad);
+      s.off("pad:batch", dispatchPadBatch);
       s.off("device:btn", dispatchPad);
       s.off("device/pi01/btn", dispatchPad);
       if (s.offAny) {
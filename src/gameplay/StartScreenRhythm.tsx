@@ -199,7 +199,7 @@ export default function StartScreenRhythm() {
         difficulty: song.difficulty,
         audio: audioPath,
         csv: csvPath,
-        csvOffset: song.csvOffset ?? 0,
+        csvOffset: song.csvOffset ?? null,
         bpm: song.bpm ?? null,
       },
     };
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+start_gate.py
+
+The start line of a prepared session (two-phase start).
+
+A plain `start` runs a game from the top: the launcher builds the command,
+the game loads its assets and only then starts to play, while the player
+has been told to go already. With `prepare` the game does all of that up
+front (Rhythm: parse the beatmap, open the audio device and pre-roll the
+song paused; Combo / Friend-or-Foe: presets and a seeded RNG; every mode:
+a blank strip), calls rig.armed(), which emits an "armed" telemetry event,
+and blocks in StartGate.wait() until the launcher's `go`.
+
+How go gets to the game depends on who runs it:
+
+  in-process (GameHost)   go(t_cmd) sets a threading.Event
+  game process            FITFIGHTER_GO_FD=<fd>: the launcher writes one
+                          line with its monotonic t_cmd to that pipe
+  plain start             no gate; rig.armed() returns at once
+
+CLOCK_MONOTONIC is system-wide, so the game can tell how long go took to
+reach it (go_ms) from the t_cmd it is given. A stop while waiting raises
+GameStopped (in-process) or arrives as the usual SIGTERM (game process).
+"""
+
+import os
+import select
+import threading
+import time
+
+from game_runtime import GameStopped
+
+ENV_FD = "FITFIGHTER_GO_FD"
+POLL_S = 0.05       # how often a waiting gate looks at the stop flag
+
+
+class StartGate:
+    def __init__(self, fd=None, clock=time.monotonic):
+        self.fd = fd
+        self.clock = clock
+        self._go = threading.Event()
+        self.t_cmd = None
+        self.armed_at = None
+        self.go_at = None
+
+    @classmethod
+    def from_env(cls):
+        fd = os.getenv(ENV_FD)
+        return cls(int(fd)) if fd else None
+
+    def go(self, t_cmd=None):
+        """Release the session (in-process); t_cmd is when the launcher got the go."""
+        self.t_cmd = t_cmd
+        self._go.set()
+
+    def wait(self, stop=None):
+        """Block until go; returns go_ms (launcher go -> here), or None if unknown."""
+        self.armed_at = self.clock()
+        if self.fd is not None:
+            self._wait_fd(stop)
+        else:
+            while not self._go.wait(POLL_S):
+                if stop is not None and stop.is_set():
+                    raise GameStopped()
+        self.go_at = self.clock()
+        return round((self.go_at - self.t_cmd) * 1000.0, 3) if self.t_cmd is not None else None
+
+    def _wait_fd(self, stop):
+        buf = b""
+        while b"\n" not in buf:
+            if stop is not None and stop.is_set():
+                raise GameStopped()
+            ready, _, _ = select.select([self.fd], [], [], POLL_S)
+            if not ready:
+                continue
+            chunk = os.read(self.fd, 64)
+            if not chunk:
+                raise GameStopped()      # launcher went away before go
+            buf += chunk
+        try:
+            self.t_cmd = float(buf.split(b"\n", 1)[0])
+        except ValueError:
+            self.t_cmd = None
+
+    @staticmethod
+    def send(fd, t_cmd=None):
+        """Launcher side: release a game process waiting on the other end of fd."""
+        os.write(fd, (f"{time.monotonic() if t_cmd is None else t_cmd:.6f}\n").encode())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+telemetry.py
+
+Structured live telemetry from the game modes to the launcher.
+
+Games used to report only through print(): the launcher echoed the lines
+and the published result carried no score. Now each session emits typed
+events, one JSON object per line with the kind in "k" and a monotonic
+timestamp in "t":
+
+  start   game, params
+  hit     pad, d (score delta), score, combo, plus per-mode fields
+          (rt, judge, role, ...)
+  miss    pad, reason, score, combo, lives
+  score   score change that is not a hit (e.g. a friend spared): pad, d,
+          reason, score
+  combo   a Combo sequence finished: n, time
+  final   the end-of-session stats (the same numbers the game prints)
+
+Where the events go is decided by whoever runs the game:
+
+  in-process (GameHost)   Telemetry(callback): the launcher gets the dicts
+  game process            FITFIGHTER_TELEMETRY_FD=<fd>: JSON lines written
+                          to that pipe, separate from stdout
+  standalone              nothing (emit() is a no-op)
+
+Independently of the sink, the rig taps the events into its session log
+while a game is attached (session_log.py).
+
+On the launcher side LivePublisher batches events and publishes at most
+LIVE_HZ updates per second to session/{id}/live; the final stats end up in
+session/{id}/result.
+"""
+
+import json
+import os
+import threading
+import time
+
+ENV_FD = "FITFIGHTER_TELEMETRY_FD"
+LIVE_HZ = float(os.getenv("FITFIGHTER_LIVE_HZ", "4"))
+MAX_BATCH = 256
+STATE_KEYS = ("score", "combo", "lives")
+
+
+class _FdSink:
+    def __init__(self, fd):
+        self.fd = fd
+
+    def __call__(self, ev):
+        if self.fd is None: return
+        try:
+            os.write(self.fd, (json.dumps(ev, separators=(",", ":")) + "\n").encode())
+        except OSError:
+            self.fd = None            # launcher went away; keep playing
+
+
+class Telemetry:
+    def __init__(self, sink=None, clock=time.monotonic):
+        self.sink = sink
+        self.clock = clock
+        self.tap = None         # also gets every event (the rig's session log, session_log.py)
+
+    @classmethod
+    def from_env(cls):
+        fd = os.getenv(ENV_FD)
+        return cls(_FdSink(int(fd)) if fd else None)
+
+    def emit(self, kind, **fields):
+        sink, tap = self.sink, self.tap
+        if sink is None and tap is None: return
+        ev = {"k": kind, "t": round(self.clock(), 4)}
+        ev.update(fields)
+        if tap is not None: tap(ev)
+        if sink is not None: sink(ev)
+
+
+def parse_event(line):
+    """Launcher side: the event dict on one JSON line (str or bytes), else None."""
+    try:
+        ev = json.loads(line)
+    except ValueError:
+        return None
+    return ev if isinstance(ev, dict) else None
+
+
+def read_stream(f, on_event):
+    """Launcher side: parse JSON lines from a pipe until EOF."""
+    for line in f:
+        ev = parse_event(line)
+        if ev is not None: on_event(ev)
+
+
+def _thread_timer(delay, fn):
+    t = threading.Timer(delay, fn)
+    t.daemon = True
+    t.start()
+
+
+class LivePublisher:
+    """Batches one session's events into rate-limited session/{id}/live updates."""
+
+    def __init__(self, session_id, publish, hz=LIVE_HZ, clock=time.monotonic, schedule=None):
+        self.session_id = session_id
+        self.publish = publish                 # publish(topic, payload)
+        self.schedule = schedule or _thread_timer   # schedule(delay, fn): call fn once, later
+        self.topic = f"session/{session_id}/live"
+        self.period = 1.0 / max(0.1, hz)
+        self.clock = clock
+        self.state = {}
+        self.final = None
+        self.updates = 0
+        self._batch = []
+        self._dropped = 0
+        self._last = 0.0
+        self._pending = False
+        self._lock = threading.Lock()
+
+    def add(self, ev):
+        with self._lock:
+            for k in STATE_KEYS:
+                if ev.get(k) is not None: self.state[k] = ev[k]
+            if ev.get("k") == "final": self.final = {k: v for k, v in ev.items() if k not in ("k", "t")}
+            if len(self._batch) < MAX_BATCH: self._batch.append(ev)
+            else: self._dropped += 1
+            wait = self._last + self.period - self.clock()
+            if wait > 0:
+                if not self._pending:
+                    self._pending = True
+                    self.schedule(wait, self.flush)
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._pending = False
+            if not self._batch: return
+            batch, self._batch = self._batch, []
+            dropped, self._dropped = self._dropped, 0
+            self._last = self.clock()
+            self.updates += 1
+            payload = {"sessionId": self.session_id, "seq": self.updates,
+                       "state": dict(self.state), "events": batch}
+            if dropped: payload["dropped"] = dropped
+        self.publish(self.topic, payload)
+
+    def close(self):
+        self.flush()                           # a flush still scheduled finds nothing to send
+        return self.final